@@ -0,0 +1,785 @@
+import argparse
+import asyncio
+import csv
+import itertools
+import json
+import math
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+import final1
+
+
+DEPARTMENTS = ['Engineering', 'Sales', 'Finance', 'HR', 'Operations', 'Support', 'Marketing', 'Legal']
+POSITIONS = ['Intern', 'Associate', 'Engineer', 'Senior Engineer', 'Manager', 'Director', 'Analyst', 'Clerk']
+LOAD_CHUNK_SIZE = 100_000  # rows per transaction when building a synthetic database
+
+
+def synthetic_names(names, count, label):
+    # The built-in names first, then numbered ones when more are asked for
+    return names[:count] + [f"{label} {i}" for i in range(len(names), count)]
+
+
+def skewed_weights(count, skew):
+    # Cumulative Zipf weights: the i-th name is picked in proportion to 1 / i ** skew, so 0 is uniform
+    return list(itertools.accumulate(1 / (i + 1) ** skew for i in range(count)))
+
+
+def make_synthetic_rows(count, seed=0, skew=0.0, departments=len(DEPARTMENTS), positions=len(POSITIONS), start=0):
+    # Bank accounts, mobiles and emails are numbered from `start`, so rows added to a database built
+    # from the first `start` rows do not repeat them
+    rng = random.Random(seed)
+    department_names = synthetic_names(DEPARTMENTS, departments, 'Department')
+    position_names = synthetic_names(POSITIONS, positions, 'Position')
+    department_weights = skewed_weights(len(department_names), skew)
+    position_weights = skewed_weights(len(position_names), skew)
+    for i in range(start, start + count):
+        yield (f"Employee {i}", rng.choices(position_names, cum_weights=position_weights)[0],
+               rng.choices(department_names, cum_weights=department_weights)[0],
+               round(rng.uniform(15000, 250000), 2), "2020-01-01", rng.randint(0, 40),
+               "State Bank", f"{10000000000 + i}", "SBIN0001234", f"9{i:09d}"[-10:], f"employee{i}@example.com")
+
+
+def create_synthetic_db(path, count, seed=0, skew=0.0, departments=len(DEPARTMENTS), positions=len(POSITIONS),
+                        progress=None):
+    # Rows are generated and committed a chunk at a time, so any size fits in memory
+    final1.set_database(path)
+    final1.create_employee_table()
+    rows = make_synthetic_rows(count, seed, skew, departments, positions)
+    loaded = 0
+    while loaded < count:
+        with final1.transaction() as cursor:
+            cursor.executemany(final1.INSERT_EMPLOYEE_SQL, itertools.islice(rows, LOAD_CHUNK_SIZE))
+        loaded = min(count, loaded + LOAD_CHUNK_SIZE)
+        if progress:
+            progress(loaded, count)
+
+
+def timed(func):
+    start = time.perf_counter()
+    result = func()
+    return result, time.perf_counter() - start
+
+
+def bench_payroll(sizes):
+    print(f"{'employees':>10} {'per-employee (s)':>17} {'batch (s)':>10} {'sql (s)':>8} {'speedup':>8}")
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            create_synthetic_db(os.path.join(tmp, 'bench.db'), size)
+            expected, loop_time = timed(final1.compute_payroll_by_employee)
+            result, batch_time = timed(final1.compute_payroll_batch)
+            aggregates, sql_time = timed(final1.fetch_payroll_aggregates)
+            final1.close_db()
+        if result[0] != expected[0]:
+            raise AssertionError(f"batch payroll differs from calculate_net_salary at {size} employees")
+        for totals, expected_totals in zip(aggregates, expected[1:]):
+            if totals.keys() != expected_totals.keys() or not all(
+                    math.isclose(totals[key], expected_totals[key]) for key in totals):
+                raise AssertionError(f"SQL aggregates differ from calculate_net_salary at {size} employees")
+        print(f"{size:>10} {loop_time:>17.3f} {batch_time:>10.3f} {sql_time:>8.3f} {loop_time / batch_time:>7.1f}x")
+
+
+class LegacyEmployee:
+    # The Employee layout before __slots__: a per-instance __dict__ and two fresh dicts per employee
+    def __init__(self, emp_id, name, position, department, basic_salary, doj, overtime_hours=0,
+                 bank_name="", bank_account_number="", ifsc_code="", mobile_number="", email=""):
+        self.emp_id = emp_id
+        self.name = name
+        self.position = position
+        self.department = department
+        self.basic_salary = float(basic_salary)
+        self.doj = doj
+        self.overtime_hours = int(overtime_hours)
+        self.allowances = {'Travel Allowance': 1000, 'Medical Allowance': 500}
+        self.deductions = {'Tax': 500, 'Insurance': 200}
+        self.bank_name = bank_name
+        self.bank_account_number = bank_account_number
+        self.ifsc_code = ifsc_code
+        self.mobile_number = mobile_number
+        self.email = email
+
+
+def measure_memory(build, count):
+    # Rows are generated inside the traced region, so the text each representation keeps is counted
+    tracemalloc.start()
+    result = build((i + 1,) + row for i, row in enumerate(make_synthetic_rows(count)))
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return current / count
+
+
+def build_employee_table(rows):
+    table = final1.EmployeeTable()
+    for row in rows:
+        table.append(row)
+    return table
+
+
+def bench_memory(count):
+    plan = final1.PayPlan.from_defaults()
+    layouts = [
+        ('legacy Employee (__dict__)', lambda rows: [LegacyEmployee(*row) for row in rows]),
+        ('Employee (__slots__)', lambda rows: [final1.employee_from_row(row, plan) for row in rows]),
+        ('EmployeeTable (columnar)', build_employee_table),
+    ]
+    print(f"{count} employees")
+    for label, build in layouts:
+        print(f"{label:>28}: {measure_memory(build, count):8.1f} bytes/employee")
+
+
+def bench_startup(repeats):
+    # Wall-clock time for fresh interpreter runs of the command-line entry point
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'payroll.py')
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'bench.db')
+        create_synthetic_db(db_path, 1000)
+        final1.close_db()
+        commands = [
+            ('payroll --help', [script, '--help']),
+            ('payroll run', [script, '--db', db_path, 'run', '--aggregation', 'sql']),
+        ]
+        for label, args in commands:
+            timings = []
+            for _ in range(repeats):
+                start = time.perf_counter()
+                subprocess.run([sys.executable] + args, check=True, stdout=subprocess.DEVNULL)
+                timings.append(time.perf_counter() - start)
+            print(f"{label:>15}: median {statistics.median(timings) * 1000:7.1f} ms, "
+                  f"min {min(timings) * 1000:7.1f} ms")
+    check = "import sys, final1; print(' '.join(m for m in ('numpy', 'matplotlib', 'reportlab') if m in sys.modules))"
+    heavy = subprocess.run([sys.executable, '-c', check], capture_output=True, text=True, check=True,
+                           cwd=os.path.dirname(script)).stdout.strip()
+    print(f"heavy modules loaded by 'import final1': {heavy or 'none'}")
+
+
+REPORT_CHILD = """
+import resource, sys, time, final1
+final1.set_database(sys.argv[1])
+start = time.perf_counter()
+pages = final1.write_employee_list_pdf(sys.argv[2])
+print(pages, time.perf_counter() - start, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+"""
+
+
+def bench_report(sizes):
+    # Each export runs in a fresh interpreter so its peak RSS is not inflated by building the database
+    print(f"{'employees':>10} {'pages':>8} {'seconds':>8} {'pages/s':>9} {'peak RSS (MB)':>14}")
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            db_path = os.path.join(tmp, 'bench.db')
+            create_synthetic_db(db_path, size)
+            final1.close_db()
+            output = subprocess.run([sys.executable, '-c', REPORT_CHILD, db_path, os.path.join(tmp, 'employees.pdf')],
+                                    capture_output=True, text=True, check=True,
+                                    cwd=os.path.dirname(os.path.abspath(__file__))).stdout.split()
+        pages, seconds, max_rss_kb = int(output[0]), float(output[1]), int(output[2])
+        print(f"{size:>10} {pages:>8} {seconds:>8.2f} {pages / seconds:>9.0f} {max_rss_kb / 1024:>14.1f}")
+
+
+def soak_totals(opens, change_every):
+    # Department and position totals as Payroll Analysis would see them, changing every few opens
+    rng = random.Random(0)
+    departments = {name: rng.uniform(1e6, 1e7) for name in DEPARTMENTS}
+    positions = {name: rng.uniform(1e6, 1e7) for name in POSITIONS}
+    for i in range(opens):
+        if i and i % change_every == 0:
+            name = rng.choice(DEPARTMENTS)
+            departments[name] += 1000.0
+            positions[rng.choice(POSITIONS)] += 1000.0
+        yield dict(departments), dict(positions)
+
+
+def bench_charts(opens, change_every):
+    # Tk needs a display, so an Agg canvas stands in for FigureCanvasTkAgg; the figure work is the same
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    plt.rcParams['figure.max_open_warning'] = 0  # the pile-up is what is being measured
+
+    def legacy_open(department_wise_salary, position_wise_salary):
+        # What every click used to do: a new pyplot figure that is never closed
+        fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(4, 4))
+        ax1.bar(list(department_wise_salary), list(department_wise_salary.values()))
+        ax2.bar(list(position_wise_salary), list(position_wise_salary.values()))
+        fig.tight_layout()
+        fig.canvas.draw()
+
+    chart = final1.PayrollChart()
+    canvas = FigureCanvasAgg(chart.figure)
+
+    def cached_open(department_wise_salary, position_wise_salary):
+        if chart.update(department_wise_salary, position_wise_salary):
+            canvas.draw()
+
+    print(f"{opens} opens, totals change every {change_every}")
+    for label, open_window in (('new figure per open', legacy_open), ('reused PayrollChart', cached_open)):
+        tracemalloc.start()
+        start = time.perf_counter()
+        for i, totals in enumerate(soak_totals(opens, change_every), start=1):
+            open_window(*totals)
+            if i == 10:
+                warm, _ = tracemalloc.get_traced_memory()
+        current, _ = tracemalloc.get_traced_memory()
+        elapsed = time.perf_counter() - start
+        tracemalloc.stop()
+        print(f"{label:>22}: {elapsed / opens * 1000:7.2f} ms/open, traced memory after 10 opens "
+              f"{warm / 2**20:7.1f} MB, after {opens} {current / 2**20:7.1f} MB")
+    plt.close('all')
+
+
+SUITE_OPERATIONS = ['fetch_all_employees', 'calculate_net_salary', 'payroll_employee', 'payroll_batch',
+                    'payroll_sql', 'payroll_incremental', 'fetch_employee_by_id', 'payslip_pdf', 'insert_employee']
+
+
+def percentile(sorted_values, percent):
+    return sorted_values[min(len(sorted_values) - 1, round(percent / 100 * (len(sorted_values) - 1)))]
+
+
+def measure(operation, calls, items_per_call):
+    # One untimed warm-up call (imports, caches, first snapshot build), then the timed calls; peak memory
+    # comes from one more call under tracemalloc, which would skew timings
+    operation(calls)
+    latencies = []
+    for call in range(calls):
+        start = time.perf_counter()
+        operation(call)
+        latencies.append(time.perf_counter() - start)
+    tracemalloc.start()
+    operation(calls + 1)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    latencies.sort()
+    seconds = sum(latencies)
+    return {
+        'calls': calls,
+        'items': calls * items_per_call,
+        'seconds': seconds,
+        'items_per_second': calls * items_per_call / seconds if seconds else None,
+        'latency_ms': {name: percentile(latencies, percent) * 1000
+                       for name, percent in (('p50', 50), ('p95', 95), ('p99', 99), ('max', 100))},
+        'peak_memory_bytes': peak,
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def bench_suite(rows, repeats, sample, seed, skew, operations, db_path=None):
+    # Whole-table operations run `repeats` times; per-employee ones `sample` times, one employee per call
+    with tempfile.TemporaryDirectory() as tmp:
+        if db_path is None:
+            db_path = os.path.join(tmp, 'bench.db')
+            create_synthetic_db(db_path, rows, seed, skew)
+        else:
+            final1.set_database(db_path)
+            final1.create_employee_table()
+            rows = final1.db_cursor().execute('SELECT COUNT(*) FROM employees').fetchone()[0]
+        rng = random.Random(seed)
+        sample_ids = [rng.randint(1, rows) for _ in range(sample)]
+        employees = final1.fetch_all_employees() if 'calculate_net_salary' in operations else None
+        timesheet_overtime = final1.fetch_timesheet_overtime()
+        new_employees = [final1.employee_from_record(dict(zip(final1.IMPORT_FIELDS, row)))
+                         for row in make_synthetic_rows(sample + 2, seed + 1, skew, start=rows)]
+
+        def payslip(call):
+            employee = final1.fetch_employee_by_id(sample_ids[call % sample])
+            payslip_text = final1.build_payslip_text(employee, timesheet_overtime)
+            final1.write_payslip_pdf(os.path.join(tmp, 'payslip.pdf'), payslip_text)
+
+        def net_salaries(call):
+            return [final1.calculate_net_salary(emp, final1.paid_overtime_hours(emp, timesheet_overtime))
+                    for emp in employees]
+
+        def lookup(call):
+            # The cache is cleared so each call measures the database read, not a cache hit
+            final1.employee_cache.clear()
+            final1.fetch_employee_by_id(sample_ids[call % sample])
+
+        available = {
+            'fetch_all_employees': (repeats, rows, lambda call: final1.fetch_all_employees()),
+            'calculate_net_salary': (repeats, rows, net_salaries),
+            'payroll_employee': (repeats, rows, lambda call: final1.compute_payroll('employee')),
+            'payroll_batch': (repeats, rows, lambda call: final1.compute_payroll('batch')),
+            'payroll_sql': (repeats, rows, lambda call: final1.compute_payroll('sql')),
+            'payroll_incremental': (repeats, rows, lambda call: final1.compute_payroll('incremental')),
+            'fetch_employee_by_id': (sample, 1, lookup),
+            'payslip_pdf': (sample, 1, payslip),
+            'insert_employee': (sample, 1, lambda call: final1.insert_employee_record(new_employees[call])),
+        }
+        results = {}
+        for name in operations:
+            calls, items_per_call, operation = available[name]
+            results[name] = measure(operation, calls, items_per_call)
+            result = results[name]
+            print(f"{name:>22}: {result['items_per_second']:>12,.0f} items/s  "
+                  f"p50 {result['latency_ms']['p50']:9.2f} ms  p95 {result['latency_ms']['p95']:9.2f} ms  "
+                  f"p99 {result['latency_ms']['p99']:9.2f} ms  peak {result['peak_memory_bytes'] / 2**20:8.1f} MB")
+        del employees
+        final1.close_db()
+    return {
+        'meta': {'rows': rows, 'repeats': repeats, 'sample': sample, 'seed': seed, 'skew': skew,
+                 'revision': git_revision(), 'python': platform.python_version(), 'sqlite': sqlite3.sqlite_version,
+                 'platform': platform.platform(), 'recorded_at': time.strftime('%Y-%m-%dT%H:%M:%S')},
+        'results': results,
+    }
+
+
+def compare_results(baseline_path, candidate_path, tolerance):
+    # A regression is a throughput drop or a p95 latency rise of more than `tolerance`
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    with open(candidate_path) as f:
+        candidate = json.load(f)
+    print(f"baseline {baseline['meta'].get('revision')} ({baseline['meta']['rows']} rows), "
+          f"candidate {candidate['meta'].get('revision')} ({candidate['meta']['rows']} rows)")
+    print(f"{'operation':>22} {'throughput':>11} {'p95':>8} {'peak mem':>9}")
+    regressions = []
+    for name, new in candidate['results'].items():
+        old = baseline['results'].get(name)
+        if old is None:
+            continue
+        throughput = new['items_per_second'] / old['items_per_second']
+        p95 = new['latency_ms']['p95'] / old['latency_ms']['p95']
+        memory = new['peak_memory_bytes'] / max(old['peak_memory_bytes'], 1)
+        flag = ''
+        if throughput < 1 - tolerance or p95 > 1 + tolerance:
+            regressions.append(name)
+            flag = '  REGRESSION'
+        print(f"{name:>22} {throughput:>10.2f}x {p95:>7.2f}x {memory:>8.2f}x{flag}")
+    return regressions
+
+
+def bench_instrumentation(calls):
+    # Cached employee lookups are the cheapest instrumented call, so they show the per-call overhead best
+    with tempfile.TemporaryDirectory() as tmp:
+        create_synthetic_db(os.path.join(tmp, 'bench.db'), 1000)
+        variants = [
+            ('uninstrumented', final1.fetch_employee_by_id.__wrapped__, None),
+            ('metrics off', final1.fetch_employee_by_id, None),
+            ('metrics on', final1.fetch_employee_by_id, os.path.join(tmp, 'metrics.prom')),
+        ]
+        print(f"{calls} cached fetch_employee_by_id calls")
+        for label, fetch, metrics_path in variants:
+            final1.configure_metrics(metrics_path)
+            fetch(1)
+            start = time.perf_counter()
+            for _ in range(calls):
+                fetch(1)
+            elapsed = time.perf_counter() - start
+            print(f"{label:>16}: {elapsed / calls * 1e9:8.0f} ns/call")
+        final1.configure_metrics(None)
+        final1.close_db()
+
+
+# Rows broken behind the validator's back: (emp_id, column overrides, fields that must be reported)
+VALIDATION_CASES = [
+    (2, {'doj': '2020-02-30'}, {'doj'}),
+    (3, {'doj': '2999-01-01'}, {'doj'}),
+    (4, {'doj': 20200101}, {'doj'}),
+    (5, {'ifsc_code': 'sbin0001234'}, {'ifsc_code'}),
+    (6, {'mobile_number': '12345'}, {'mobile_number'}),
+    (7, {'email': 'not-an-email'}, {'email'}),
+    (8, {'name': '  ', 'basic_salary': -5, 'overtime_hours': -1}, {'name', 'basic_salary', 'overtime_hours'}),
+    (9, {'basic_salary': 'lots'}, {'basic_salary'}),
+    (10, {'basic_salary': float('inf')}, {'basic_salary'}),
+    (11, {'bank_account_number': '12ab', 'position': ''}, {'bank_account_number', 'position'}),
+    (12, {'mobile_number': '', 'email': ''}, set()),
+    (13, {'email': 'EMPLOYEE13@Example.com'}, {'email'}),  # employee 14's address in other case
+    (14, {}, {'email'}),
+    (15, {'bank_account_number': '10000000015'}, {'bank_account_number'}),  # employee 16's account
+    (16, {}, {'bank_account_number'}),
+    (17, {'overtime_hours': ''}, {'overtime_hours'}),  # stored as text, payroll cannot read it
+    (18, {'overtime_hours': 2.5}, {'overtime_hours'}),
+    (19, {'basic_salary': '5000'}, set()),  # the column's REAL affinity stores a number
+]
+
+
+def check_import_validation(tmp, rows):
+    # (line, record) pairs written as a CSV and imported, and the fields each rejected line must report.
+    # The new rows are numbered after the database's, employees 1 and 2 are existing rows
+    new = [dict(zip(final1.IMPORT_FIELDS, row)) for row in make_synthetic_rows(6, 1, start=rows)]
+    records = [
+        (new[0], None),
+        (dict(new[1], email=new[0]['email'].upper()), {'email'}),  # repeats line 2, in other case
+        (dict(new[2], email='EMPLOYEE0@EXAMPLE.COM'), {'email'}),  # employee 1's, in other case
+        (dict(new[3], bank_account_number='10000000001'), {'bank_account_number'}),  # employee 2's
+        (dict(new[4], name='', mobile_number='555', ifsc_code='SBIN1234567', doj='01/02/2020'),
+         {'name', 'mobile_number', 'ifsc_code', 'doj'}),
+        # A rejected line is not remembered, so repeating its account number is fine
+        (dict(new[5], bank_account_number=new[4]['bank_account_number']), None),
+    ]
+    path = os.path.join(tmp, 'employees.csv')
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, final1.IMPORT_FIELDS)
+        writer.writeheader()
+        writer.writerows(record for record, _ in records)
+    summary = final1.import_employees(path)
+    with open(summary['reject_path'], encoding='utf-8') as f:
+        rejected = {entry['line']: {error['field'] for error in entry['errors']} for entry in map(json.loads, f)}
+    expected = {line: fields for line, (_, fields) in enumerate(records, start=2) if fields}
+    if rejected != expected or summary['imported'] != len(records) - len(expected):
+        raise AssertionError(f"import rejected {rejected}, expected {expected}")
+
+
+def bench_validation(rows):
+    # Breaks known rows, then checks that validate_employees finds exactly those and the same errors as
+    # running stored_employee_errors on every row (the column screening must never miss one), and that
+    # imports reject repeats within the file and values already in the table
+    with tempfile.TemporaryDirectory() as tmp:
+        create_synthetic_db(os.path.join(tmp, 'bench.db'), rows)
+        with final1.transaction() as cursor:
+            for emp_id, overrides, _ in VALIDATION_CASES:
+                for column, value in overrides.items():
+                    cursor.execute(f'UPDATE employees SET {column} = ? WHERE emp_id = ?', (value, emp_id))
+        report_path = os.path.join(tmp, 'report.jsonl')
+        summary, seconds = timed(lambda: final1.validate_employees(report_path))
+        with open(report_path, encoding='utf-8') as f:
+            reported = {entry['emp_id']: entry for entry in map(json.loads, f)}
+        expected = {emp_id: fields for emp_id, _, fields in VALIDATION_CASES if fields}
+        found = {emp_id: {error['field'] for error in entry['errors']} for emp_id, entry in reported.items()}
+        if found != expected:
+            raise AssertionError(f"validate reported {found}, expected {expected}")
+
+        cursor = final1.db_cursor()
+        today = final1.date.today().isoformat()
+        duplicates = final1.find_table_duplicates(cursor)
+        cursor.execute(f"SELECT emp_id, {', '.join(final1.IMPORT_FIELDS)} FROM employees")
+        every_row = {}
+        for row in cursor.fetchall():
+            errors = final1.stored_employee_errors(dict(zip(final1.IMPORT_FIELDS, row[1:])), today)
+            errors += duplicates.get(row[0], [])
+            if errors:
+                every_row[row[0]] = errors
+        if every_row != dict(final1.iter_employee_errors()):
+            raise AssertionError("screened validation differs from checking every row")
+        check_import_validation(tmp, rows)
+        final1.close_db()
+    print(f"{rows} employees validated in {seconds:.2f} s ({rows / seconds:,.0f} rows/s), "
+          f"{summary['invalid']} invalid as expected; import duplicate checks as expected")
+
+
+def bench_sharded(rows, worker_counts, shard_by):
+    # Sharded payroll against the single-process batch result at each worker count
+    with tempfile.TemporaryDirectory() as tmp:
+        create_synthetic_db(os.path.join(tmp, 'bench.db'), rows)
+        expected, batch_time = timed(final1.compute_payroll_batch)
+        print(f"{rows} employees, batch {batch_time:.3f} s ({rows / batch_time:,.0f} rows/s), {os.cpu_count()} cores")
+        print(f"{'workers':>8} {'seconds':>8} {'rows/s':>12} {'vs batch':>9}")
+        for workers in worker_counts:
+            result, seconds = timed(lambda: final1.compute_payroll_sharded(workers, shard_by))
+            if result[0] != expected[0]:
+                raise AssertionError(f"sharded net salaries differ from batch with {workers} workers")
+            for totals, expected_totals in zip(result[1:], expected[1:]):
+                if totals.keys() != expected_totals.keys() or not all(
+                        math.isclose(totals[key], expected_totals[key]) for key in totals):
+                    raise AssertionError(f"sharded totals differ from batch with {workers} workers")
+            print(f"{workers:>8} {seconds:>8.3f} {rows / seconds:>12,.0f} {batch_time / seconds:>8.2f}x")
+        final1.close_db()
+
+
+def bench_snapshot(rows, snapshot_format):
+    # Export time, then opening the snapshot and payroll totals from it against the batch path over SQLite
+    with tempfile.TemporaryDirectory() as tmp:
+        create_synthetic_db(os.path.join(tmp, 'bench.db'), rows)
+        snapshot_path = os.path.join(tmp, 'snapshot')
+        manifest, export_time = timed(lambda: final1.export_payroll_snapshot(snapshot_path, snapshot_format))
+        print(f"{rows} employees, {manifest['format']} snapshot exported in {export_time:.2f} s")
+        snapshot, open_time = timed(lambda: final1.PayrollSnapshot(snapshot_path))
+        _, columns_time = timed(lambda: [snapshot[name] for name, _ in final1.SNAPSHOT_NUMERIC_COLUMNS])
+        result, snapshot_time = timed(lambda: final1.compute_payroll_from_snapshot(snapshot_path))
+        expected, batch_time = timed(final1.compute_payroll_batch)
+        final1.close_db()
+        if dict(zip(snapshot['emp_id'].tolist(), snapshot['net_salary'].tolist())) != expected[0]:
+            raise AssertionError("snapshot net salaries differ from batch")
+        for totals, expected_totals in zip(result[1:], expected[1:]):
+            if totals.keys() != expected_totals.keys() or not all(
+                    math.isclose(totals[key], expected_totals[key]) for key in totals):
+                raise AssertionError("snapshot totals differ from batch")
+    print(f"open {open_time * 1000:.2f} ms, map numeric columns {columns_time * 1000:.2f} ms")
+    print(f"payroll totals: snapshot {snapshot_time * 1000:.1f} ms, batch over SQLite {batch_time * 1000:.1f} ms")
+
+
+def write_timesheet_events(path, rows, events, rng):
+    # One shift per line for random employees on random days of this month, mostly 7 to 10 hours
+    period = final1.current_period()
+    with open(path, 'w', newline='') as f:
+        f.write('emp_id,clock_in,clock_out\n')
+        for _ in range(events):
+            start = rng.randrange(6 * 60, 11 * 60)
+            end = start + rng.randrange(7 * 60, 10 * 60)
+            day = f"{period}-{rng.randint(1, 28):02d}"
+            f.write(f"{rng.randint(1, rows)},{day} {start // 60:02d}:{start % 60:02d},"
+                    f"{day} {end // 60:02d}:{end % 60:02d}\n")
+
+
+# (emp_id, overtime hours entered, minutes of the one shift this period or None, overtime hours paid)
+TIMESHEET_OVERTIME_CASES = [
+    (1, 16, 3 * 60, 0),  # timesheets without overtime pay none, not the hours entered
+    (2, 16, 8 * 60 + 29, 0),
+    (3, 0, 8 * 60 + 30, 1),  # half an hour rounds up
+    (4, 0, 10 * 60 + 20, 2),
+    (5, 7, None, 7),  # no timesheets: the hours entered
+]
+
+
+def check_timesheet_overtime(tmp):
+    # The overtime hours each case is paid, in calculate_net_salary and in the SQL of the batch and
+    # incremental modes
+    emp_ids = [emp_id for emp_id, _, _, _ in TIMESHEET_OVERTIME_CASES]
+    with final1.transaction() as cursor:
+        cursor.executemany('UPDATE employees SET overtime_hours = ? WHERE emp_id = ?',
+                           [(entered, emp_id) for emp_id, entered, _, _ in TIMESHEET_OVERTIME_CASES])
+    final1.employee_cache.clear()
+    path = os.path.join(tmp, 'overtime-cases.csv')
+    clock_in = datetime.fromisoformat(f"{final1.current_period()}-01 08:00")
+    with open(path, 'w', newline='') as f:
+        f.write('emp_id,clock_in,clock_out\n')
+        for emp_id, _, minutes, _ in TIMESHEET_OVERTIME_CASES:
+            if minutes is not None:
+                f.write(f"{emp_id},{clock_in},{clock_in + timedelta(minutes=minutes)}\n")
+    final1.import_timesheets(path)
+    timesheet_overtime = final1.fetch_timesheet_overtime(emp_ids=emp_ids)
+    employees = final1.fetch_employees_by_ids(emp_ids)
+    expected = {}
+    for employee, (emp_id, _, _, paid) in zip(employees, TIMESHEET_OVERTIME_CASES):
+        hours = final1.paid_overtime_hours(employee, timesheet_overtime)
+        if hours != paid:
+            raise AssertionError(f"employee {emp_id} is paid {hours} overtime hours, expected {paid}")
+        expected[emp_id] = final1.calculate_net_salary(employee, paid)
+    for aggregation in ('employee', 'batch', 'incremental'):
+        payroll_data, _, _ = final1.compute_payroll(aggregation, per_employee=True)
+        wrong = {emp_id: payroll_data[emp_id] for emp_id, net_salary in expected.items()
+                 if not math.isclose(payroll_data[emp_id], net_salary, rel_tol=1e-9)}
+        if wrong:
+            raise AssertionError(f"{aggregation} payroll pays {wrong}, expected {expected}")
+
+
+def bench_timesheets(rows, events, arrivals):
+    # Ingestion rate of clock-in/clock-out events arriving in several files, and the payroll run after each:
+    # it should stay flat however many events are stored, since only the rollups are read
+    rng = random.Random(0)
+    with tempfile.TemporaryDirectory() as tmp:
+        create_synthetic_db(os.path.join(tmp, 'bench.db'), rows)
+        _, payroll_time = timed(final1.compute_payroll)
+        print(f"{rows} employees, payroll run before any timesheets {payroll_time * 1000:.1f} ms")
+        check_timesheet_overtime(tmp)
+        for arrival in range(1, arrivals + 1):
+            path = os.path.join(tmp, f"events-{arrival}.csv")
+            write_timesheet_events(path, rows, events, rng)
+            summary = final1.import_timesheets(path)
+            _, payroll_time = timed(final1.compute_payroll)
+            print(f"  {arrival * events:>10} events stored: ingested at {summary['rows_per_second']:.0f} events/s, "
+                  f"payroll run {payroll_time * 1000:.1f} ms")
+        mismatches = final1.verify_payroll_snapshot()
+        final1.close_db()
+        if mismatches:
+            raise AssertionError(f"incremental payroll differs from a full recompute: {mismatches[:5]}")
+
+
+SERVICE_SCENARIOS = ['lookup', 'hot-lookup', 'insert', 'payroll', 'page', 'mixed']
+
+
+def service_request(scenario, rng, rows, new_rows):
+    # (method, path, body) for one request of the scenario; new_rows numbers the inserted employees
+    if scenario == 'mixed':
+        scenario = rng.choices(['lookup', 'insert', 'page', 'payroll'], cum_weights=[90, 97, 99, 100])[0]
+    if scenario == 'lookup':
+        return 'GET', f"/employees/{rng.randint(1, rows)}", b''
+    if scenario == 'hot-lookup':
+        # A small set of popular employees, so identical lookups overlap and are coalesced
+        return 'GET', f"/employees/{rng.randint(1, 50)}", b''
+    if scenario == 'insert':
+        row = next(make_synthetic_rows(1, rng.random(), start=next(new_rows)))
+        return 'POST', '/employees', json.dumps(dict(zip(final1.IMPORT_FIELDS, row))).encode()
+    if scenario == 'payroll':
+        return 'GET', '/payroll?aggregation=incremental', b''
+    return 'GET', f"/employees?after={rng.randint(0, rows)}&limit=100", b''
+
+
+async def http_request(reader, writer, method, path, body=b''):
+    writer.write(f"{method} {path} HTTP/1.1\r\nHost: bench\r\nContent-Length: {len(body)}\r\n\r\n".encode() + body)
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    headers = {}
+    while (line := await reader.readline()) not in (b'\r\n', b''):
+        name, _, value = line.decode().partition(':')
+        headers[name.strip().lower()] = value.strip()
+    if headers.get('transfer-encoding') == 'chunked':
+        data = []
+        while size := int(await reader.readline(), 16):
+            data.append(await reader.readexactly(size + 2))
+        await reader.readline()
+        return status, b''.join(chunk[:-2] for chunk in data)
+    return status, await reader.readexactly(int(headers['content-length']))
+
+
+async def service_load(host, port, scenario, connections, requests, rows, new_rows):
+    # Closed loop: every connection sends its next request as soon as the previous answer arrives
+    remaining = requests
+    latencies = []
+    errors = 0
+
+    async def client(seed):
+        nonlocal remaining, errors
+        rng = random.Random(seed)
+        reader, writer = await asyncio.open_connection(host, port)
+        try:
+            while remaining > 0:
+                remaining -= 1
+                method, path, body = service_request(scenario, rng, rows, new_rows)
+                start = time.perf_counter()
+                status, _ = await http_request(reader, writer, method, path, body)
+                latencies.append(time.perf_counter() - start)
+                if status >= 400:
+                    errors += 1
+        finally:
+            writer.close()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client(seed) for seed in range(connections)))
+    return time.perf_counter() - start, sorted(latencies), errors
+
+
+def bench_service(rows, scenarios, connections, requests, workers):
+    # Starts the service as a separate process on a synthetic database and drives it over loopback
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'payroll.py')
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'bench.db')
+        create_synthetic_db(db_path, rows)
+        final1.close_db()
+        server = subprocess.Popen([sys.executable, script, '--db', db_path, 'serve', '--port', '0',
+                                   '--workers', str(workers)], stdout=subprocess.PIPE, text=True)
+        try:
+            address = server.stdout.readline().split('http://')[1].split()[0]
+            host, port = address.rsplit(':', 1)
+            print(f"{rows} employees, {connections} connections, {workers} DB workers, {os.cpu_count()} cores")
+            print(f"{'scenario':>11} {'requests':>9} {'req/s':>9} {'p50 ms':>8} {'p99 ms':>8} {'errors':>7}")
+            new_rows = itertools.count(rows)
+            for scenario in scenarios:
+                seconds, latencies, errors = asyncio.run(service_load(host, int(port), scenario, connections,
+                                                                     requests, rows, new_rows))
+                print(f"{scenario:>11} {len(latencies):>9} {len(latencies) / seconds:>9,.0f} "
+                      f"{percentile(latencies, 50) * 1000:>8.2f} {percentile(latencies, 99) * 1000:>8.2f} {errors:>7}")
+        finally:
+            server.terminate()
+            server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks for the payroll hot paths in final1.py")
+    subparsers = parser.add_subparsers(dest='benchmark', required=True)
+    payroll_parser = subparsers.add_parser('payroll', help="per-employee vs batch vs SQL payroll computation")
+    payroll_parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    memory_parser = subparsers.add_parser('memory', help="bytes per employee for each Employee representation")
+    memory_parser.add_argument('--count', type=int, default=1_000_000)
+    startup_parser = subparsers.add_parser('startup', help="start-up time of the command-line entry point")
+    startup_parser.add_argument('--repeats', type=int, default=10)
+    report_parser = subparsers.add_parser('report', help="pages/s and peak RSS of the all-employees PDF export")
+    report_parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000])
+    charts_parser = subparsers.add_parser('charts', help="soak test of repeated Payroll Analysis chart opens")
+    charts_parser.add_argument('--opens', type=int, default=300)
+    charts_parser.add_argument('--change-every', type=int, default=10, help="opens between changes to the totals")
+    generate_parser = subparsers.add_parser('generate', help="build a synthetic employee database")
+    generate_parser.add_argument('path')
+    generate_parser.add_argument('--rows', type=int, default=1_000_000)
+    generate_parser.add_argument('--seed', type=int, default=0)
+    generate_parser.add_argument('--skew', type=float, default=0.0,
+                                 help="Zipf exponent for department and position sizes (0 = uniform)")
+    generate_parser.add_argument('--departments', type=int, default=len(DEPARTMENTS))
+    generate_parser.add_argument('--positions', type=int, default=len(POSITIONS))
+    suite_parser = subparsers.add_parser('suite', help="throughput, latency percentiles and peak memory of the hot paths")
+    suite_parser.add_argument('--rows', type=int, default=100_000)
+    suite_parser.add_argument('--db', help="benchmark an existing database instead of generating one")
+    suite_parser.add_argument('--repeats', type=int, default=5, help="runs of each whole-table operation")
+    suite_parser.add_argument('--sample', type=int, default=200, help="calls of each per-employee operation")
+    suite_parser.add_argument('--seed', type=int, default=0)
+    suite_parser.add_argument('--skew', type=float, default=0.0)
+    suite_parser.add_argument('--operations', nargs='+', choices=SUITE_OPERATIONS, default=SUITE_OPERATIONS)
+    suite_parser.add_argument('--output', help="write the results to this JSON file")
+    compare_parser = subparsers.add_parser('compare', help="compare two suite result files")
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('candidate')
+    compare_parser.add_argument('--tolerance', type=float, default=0.1)
+    instrumentation_parser = subparsers.add_parser('instrumentation', help="per-call cost of the metrics hooks")
+    instrumentation_parser.add_argument('--calls', type=int, default=200_000)
+    validation_parser = subparsers.add_parser('validation', help="check the employee validation rules and time them")
+    validation_parser.add_argument('--rows', type=int, default=100_000)
+    sharded_parser = subparsers.add_parser('sharded', help="sharded payroll throughput by number of worker processes")
+    sharded_parser.add_argument('--rows', type=int, default=1_000_000)
+    sharded_parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+    sharded_parser.add_argument('--shard-by', choices=['emp_id', 'department'], default='emp_id')
+    snapshot_parser = subparsers.add_parser('snapshot', help="columnar snapshot export and load times")
+    snapshot_parser.add_argument('--rows', type=int, default=1_000_000)
+    snapshot_parser.add_argument('--format', choices=['arrow', 'npy'])
+    service_parser = subparsers.add_parser('service', help="requests/s and latency of the HTTP service under load")
+    service_parser.add_argument('--rows', type=int, default=100_000)
+    service_parser.add_argument('--scenarios', nargs='+', choices=SERVICE_SCENARIOS, default=SERVICE_SCENARIOS)
+    service_parser.add_argument('--connections', type=int, default=50)
+    service_parser.add_argument('--requests', type=int, default=10_000, help="requests per scenario")
+    service_parser.add_argument('--workers', type=int, default=final1.SERVICE_WORKERS)
+    timesheets_parser = subparsers.add_parser('timesheets', help="timesheet ingestion rate and payroll runs after it")
+    timesheets_parser.add_argument('--rows', type=int, default=100_000)
+    timesheets_parser.add_argument('--events', type=int, default=1_000_000, help="events per arriving file")
+    timesheets_parser.add_argument('--arrivals', type=int, default=3)
+    args = parser.parse_args()
+
+    if args.benchmark == 'payroll':
+        bench_payroll(args.sizes)
+    elif args.benchmark == 'memory':
+        bench_memory(args.count)
+    elif args.benchmark == 'startup':
+        bench_startup(args.repeats)
+    elif args.benchmark == 'report':
+        bench_report(args.sizes)
+    elif args.benchmark == 'charts':
+        bench_charts(args.opens, args.change_every)
+    elif args.benchmark == 'instrumentation':
+        bench_instrumentation(args.calls)
+    elif args.benchmark == 'validation':
+        bench_validation(args.rows)
+    elif args.benchmark == 'sharded':
+        bench_sharded(args.rows, args.workers, args.shard_by)
+    elif args.benchmark == 'snapshot':
+        bench_snapshot(args.rows, args.format)
+    elif args.benchmark == 'service':
+        bench_service(args.rows, args.scenarios, args.connections, args.requests, args.workers)
+    elif args.benchmark == 'timesheets':
+        bench_timesheets(args.rows, args.events, args.arrivals)
+    elif args.benchmark == 'generate':
+        def report_progress(done, total):
+            print(f"\r{done}/{total} rows", end='', file=sys.stderr, flush=True)
+
+        start = time.perf_counter()
+        create_synthetic_db(args.path, args.rows, args.seed, args.skew, args.departments, args.positions,
+                            report_progress)
+        final1.close_db()
+        print(file=sys.stderr)
+        print(f"{args.rows} rows in {time.perf_counter() - start:.1f} s")
+    elif args.benchmark == 'suite':
+        results = bench_suite(args.rows, args.repeats, args.sample, args.seed, args.skew, args.operations, args.db)
+        if args.output:
+            with open(args.output, 'w') as f:
+                json.dump(results, f, indent=2)
+    elif args.benchmark == 'compare':
+        if compare_results(args.baseline, args.candidate, args.tolerance):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
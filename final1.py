@@ -1,22 +1,362 @@
-import tkinter as tk
-from tkinter import simpledialog, messagebox
 import sqlite3
-import matplotlib.pyplot as plt
-from datetime import datetime
-import tkinter.font as font
-from reportlab.lib.pagesizes import letter
-from reportlab.pdfgen import canvas
-from tkinter import filedialog
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
-from tkinter import scrolledtext
+import csv
+import io
+import json
+import math
+import re
+import time
+import argparse
+import os
+import sys
+import shutil
+import signal
+import tempfile
+import zipfile
+import atexit
+import functools
+import threading
+import queue
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait, FIRST_COMPLETED
+from array import array
+from collections import defaultdict, namedtuple, OrderedDict
+from types import MappingProxyType
+from contextlib import contextmanager
+from datetime import date, datetime
+from http import HTTPStatus
+from urllib.parse import quote, urlsplit, parse_qs
+# NumPy, matplotlib, reportlab and asyncio are imported inside the functions that use them, so the
+# command-line tools start quickly; Tk is optional for the same reason
+try:
+    import tkinter as tk
+    from tkinter import messagebox
+    import tkinter.font as font
+    from tkinter import filedialog
+    from tkinter import scrolledtext
+    from tkinter import ttk
+except ImportError:
+    tk = None
 
 
 
-# SQLite database setup
-conn = sqlite3.connect('employee_payroll.db')
-cursor = conn.cursor()
+# SQLite database setup; the path can be overridden with PAYROLL_DB or set_database()
+DB_PATH = os.environ.get('PAYROLL_DB', 'employee_payroll.db')
+DB_TIMEOUT = 30  # seconds a writer waits for another writer before giving up
+DB_STATEMENT_CACHE_SIZE = 256  # compiled statements kept per connection for reuse
+
+# Every thread (and every process) lazily opens its own connection on first use
+db_local = threading.local()
+
+def set_database(path):
+    global DB_PATH
+    DB_PATH = path
+    employee_cache.clear()
+
+def open_connection(path):
+    conn = sqlite3.connect(path, timeout=DB_TIMEOUT, cached_statements=DB_STATEMENT_CACHE_SIZE)
+    if metrics is not None:
+        conn.set_trace_callback(metrics.trace_statement)
+    # WAL lets readers keep reading while a writer commits
+    conn.execute('PRAGMA journal_mode = WAL')
+    conn.execute('PRAGMA synchronous = NORMAL')
+    return conn
+
+def current_db():
+    key = (DB_PATH, os.getpid())
+    if getattr(db_local, 'key', None) != key:
+        close_db()
+        db_local.conn = open_connection(DB_PATH)
+        db_local.cursor = db_local.conn.cursor()
+        db_local.key = key
+        db_local.savepoints = 0
+        db_local.data_version = None
+    return db_local.conn, db_local.cursor
+
+def db_cursor():
+    return current_db()[1]
+
+def close_db():
+    # A connection inherited from a parent process is left alone, it still belongs to the parent
+    conn = getattr(db_local, 'conn', None)
+    if conn is not None and db_local.key[1] == os.getpid():
+        conn.close()
+    db_local.conn = None
+    db_local.key = None
+
+@contextmanager
+def transaction():
+    conn, cursor = current_db()
+    if conn.in_transaction:
+        # Nested use becomes a savepoint, so an inner failure only undoes the inner block
+        db_local.savepoints += 1
+        name = f"nested_{db_local.savepoints}"
+        cursor.execute(f'SAVEPOINT {name}')
+        try:
+            yield cursor
+        except BaseException:
+            cursor.execute(f'ROLLBACK TO {name}')
+            cursor.execute(f'RELEASE {name}')
+            raise
+        else:
+            cursor.execute(f'RELEASE {name}')
+        finally:
+            db_local.savepoints -= 1
+        return
+    cursor.execute('BEGIN IMMEDIATE')
+    try:
+        yield cursor
+    except BaseException:
+        conn.rollback()
+        raise
+    else:
+        conn.commit()
+
+@contextmanager
+def read_transaction():
+    # A consistent view of the database for a long read; under WAL it does not block writers
+    conn, cursor = current_db()
+    cursor.execute('BEGIN')
+    try:
+        yield cursor
+    finally:
+        conn.rollback()
+
+# Instrumentation, off unless PAYROLL_METRICS names a file: .prom for Prometheus text, anything else
+# for JSON lines. PAYROLL_EXPLAIN=1 also records EXPLAIN QUERY PLAN for the statements seen, and
+# PAYROLL_PROFILE=cprofile,tracemalloc profiles the whole run into PAYROLL_PROFILE_PATH.*
+METRICS_EVENT_BUFFER = 1000  # span events written to a JSON-lines file at a time
+EXPLAIN_MAX_STATEMENTS = 200
+EXPLAINABLE_SQL = re.compile(r'\s*(SELECT|UPDATE|DELETE|WITH)\b', re.IGNORECASE)
+PROFILE_PATH = os.environ.get('PAYROLL_PROFILE_PATH', 'payroll-profile')
+
+class Span:
+    __slots__ = ('name', 'start', 'rows', 'statements')
+
+    def __init__(self, name):
+        self.name = name
+        self.start = time.perf_counter()
+        self.rows = None
+        self.statements = 0
+
+class NullSpan:
+    # Shared stand-in when metrics are off; setting rows on it does nothing
+    rows = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def __setattr__(self, name, value):
+        pass
+
+NULL_SPAN = NullSpan()
+
+def normalize_sql(sql):
+    # Literals replaced so statements differing only in their values are explained once
+    sql = re.sub(r"'(?:[^']|'')*'", '?', sql)
+    sql = re.sub(r'\b\d+(?:\.\d+)?(?:e[-+]?\d+)?\b', '?', sql, flags=re.IGNORECASE)
+    sql = re.sub(r'\?(?:\s*,\s*\?)+', '?, ...', sql)
+    return ' '.join(sql.split())
+
+class Metrics:
+    def __init__(self, path, explain=False):
+        self.path = path
+        self.pid = os.getpid()
+        self.prometheus = path.endswith('.prom')
+        self.explain = explain
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.totals = {}  # span name -> [calls, seconds, max seconds, rows, statements]
+        self.events = []
+        self.plans = {}  # normalized SQL -> (SQL as executed, database path)
+
+    def stack(self):
+        stack = getattr(self.local, 'stack', None)
+        if stack is None:
+            stack = self.local.stack = []
+        return stack
+
+    @contextmanager
+    def span(self, name):
+        current = Span(name)
+        if os.getpid() != self.pid:
+            # Worker processes inherit the object but do not report; their parent times the whole job
+            yield current
+            return
+        stack = self.stack()
+        stack.append(current)
+        try:
+            yield current
+        finally:
+            stack.pop()
+            seconds = time.perf_counter() - current.start
+            with self.lock:
+                totals = self.totals.setdefault(name, [0, 0.0, 0.0, 0, 0])
+                totals[0] += 1
+                totals[1] += seconds
+                totals[2] = max(totals[2], seconds)
+                totals[3] += current.rows or 0
+                totals[4] += current.statements
+                if not self.prometheus:
+                    self.events.append({'type': 'span', 'name': name, 'at': time.time() - seconds,
+                                        'seconds': seconds, 'rows': current.rows, 'statements': current.statements,
+                                        'thread': threading.current_thread().name})
+                    if len(self.events) >= METRICS_EVENT_BUFFER:
+                        self.write_events()
+
+    def trace_statement(self, sql):
+        # sqlite3 trace callback: counts statements against the innermost open span
+        if sql.startswith('--'):
+            return  # statements run by triggers
+        stack = self.stack()
+        if stack:
+            stack[-1].statements += 1
+        else:
+            with self.lock:
+                totals = self.totals.setdefault('untracked', [0, 0.0, 0.0, 0, 0])
+                totals[4] += 1
+        if self.explain and EXPLAINABLE_SQL.match(sql):
+            key = normalize_sql(sql)
+            with self.lock:
+                if key not in self.plans and len(self.plans) < EXPLAIN_MAX_STATEMENTS:
+                    self.plans[key] = (sql, DB_PATH)
+
+    def write_events(self):
+        with open(self.path, 'a', encoding='utf-8') as f:
+            for event in self.events:
+                f.write(json.dumps(event) + '\n')
+        self.events.clear()
+
+    def query_plans(self):
+        # Explained on a separate connection once the run is over, never inside the trace callback
+        plans = []
+        connections = {}
+        for key, (sql, path) in self.plans.items():
+            if path not in connections:
+                connections[path] = sqlite3.connect(path, timeout=DB_TIMEOUT)
+            try:
+                rows = connections[path].execute('EXPLAIN QUERY PLAN ' + sql).fetchall()
+            except sqlite3.Error as e:
+                rows = [(None, None, None, f"not explained: {e}")]
+            plans.append({'type': 'query_plan', 'sql': key, 'plan': [row[3] for row in rows]})
+        for conn in connections.values():
+            conn.close()
+        return plans
+
+    def flush(self):
+        if os.getpid() != self.pid:
+            return
+        with self.lock:
+            if self.prometheus:
+                self.write_prometheus()
+            else:
+                summary = [{'type': 'summary', 'name': name, 'calls': calls, 'seconds': seconds,
+                            'max_seconds': max_seconds, 'rows': rows, 'statements': statements}
+                           for name, (calls, seconds, max_seconds, rows, statements) in sorted(self.totals.items())]
+                self.events.extend(summary + self.query_plans())
+                self.write_events()
+
+    def write_prometheus(self):
+        series = [
+            ('payroll_span_calls_total', 'counter', "Calls of each instrumented span.", 0),
+            ('payroll_span_seconds_total', 'counter', "Seconds spent in each instrumented span.", 1),
+            ('payroll_span_seconds_max', 'gauge', "Slowest single call of each instrumented span.", 2),
+            ('payroll_span_rows_total', 'counter', "Rows handled by each instrumented span.", 3),
+            ('payroll_sqlite_statements_total', 'counter', "SQLite statements run directly in each span, not in spans nested in it.", 4),
+        ]
+        lines = []
+        for metric, kind, help_text, index in series:
+            lines.append(f"# HELP {metric} {help_text}")
+            lines.append(f"# TYPE {metric} {kind}")
+            for name, totals in sorted(self.totals.items()):
+                label = name.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+                lines.append(f'{metric}{{span="{label}"}} {totals[index]}')
+        if self.explain:
+            lines.append("# HELP payroll_query_plan Query plan seen for a statement, in the plan label.")
+            lines.append("# TYPE payroll_query_plan gauge")
+            for plan in self.query_plans():
+                labels = {'sql': plan['sql'], 'plan': ' | '.join(plan['plan'])}
+                labels = ','.join(f'{key}="' + value.replace('\\', '\\\\').replace('"', '\\"') + '"'
+                                  for key, value in labels.items())
+                lines.append(f"payroll_query_plan{{{labels}}} 1")
+        temp_path = self.path + '.part'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            f.write('\n'.join(lines) + '\n')
+        os.replace(temp_path, self.path)
+
+metrics = Metrics(os.environ['PAYROLL_METRICS'], os.environ.get('PAYROLL_EXPLAIN') == '1') \
+    if os.environ.get('PAYROLL_METRICS') else None
+
+def configure_metrics(path, explain=False):
+    # Connections opened from now on count their statements; this thread's is reopened
+    global metrics
+    if metrics is not None:
+        metrics.flush()
+    metrics = Metrics(path, explain) if path else None
+    close_db()
+
+def span(name):
+    return metrics.span(name) if metrics is not None else NULL_SPAN
+
+def instrumented(name, rows=None):
+    # Times each call as a span; with metrics off the only cost is one extra function call
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if metrics is None:
+                return func(*args, **kwargs)
+            with metrics.span(name) as current:
+                result = func(*args, **kwargs)
+                if rows is not None:
+                    current.rows = rows(result)
+                return result
+        return wrapper
+    return decorate
+
+def start_profiling(modes):
+    # Profiles until the interpreter exits; results go to PROFILE_PATH.prof and PROFILE_PATH.tracemalloc.txt
+    modes = {mode.strip() for mode in modes.split(',') if mode.strip()}
+    unknown = modes - {'cprofile', 'tracemalloc'}
+    if unknown:
+        raise ValueError(f"Unknown profiling mode(s): {', '.join(sorted(unknown))}.")
+    profiler = None
+    if 'cprofile' in modes:
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+    if 'tracemalloc' in modes:
+        import tracemalloc
+        tracemalloc.start(25)
+
+    def stop_profiling():
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(PROFILE_PATH + '.prof')
+        if 'tracemalloc' in modes:
+            import tracemalloc
+            snapshot = tracemalloc.take_snapshot()
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            with open(PROFILE_PATH + '.tracemalloc.txt', 'w', encoding='utf-8') as f:
+                f.write(f"peak traced memory: {peak / 2**20:.1f} MB\n")
+                for stat in snapshot.statistics('lineno')[:50]:
+                    f.write(f"{stat}\n")
+
+    atexit.register(stop_profiling)
+
+def flush_metrics():
+    if metrics is not None:
+        metrics.flush()
+
+atexit.register(flush_metrics)
 
 def create_employee_table():
+    with transaction() as cursor:
+        create_employee_schema(cursor)
+
+def create_employee_schema(cursor):
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS employees (
             emp_id INTEGER PRIMARY KEY,
@@ -33,11 +373,579 @@ def create_employee_table():
             email TEXT NOT NULL
         )
     ''')
-    conn.commit()
+    # Covering index so payroll aggregation never has to touch the table rows
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_employees_payroll
+        ON employees (department, position, basic_salary, overtime_hours)
+    ''')
+    # Duplicate email checks compare case-insensitively (bank accounts use idx_employees_bank_account_number)
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_employees_email ON employees (lower(email))')
+    # Bank disbursement files read the employees grouped by bank code (IFSC prefix)
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_employees_bank
+        ON employees (substr(ifsc_code, 1, 4), emp_id)
+    ''')
+    create_payroll_snapshot_tables(cursor)
+    create_payroll_history_tables(cursor)
+    create_pay_rule_tables(cursor)
+    create_employee_search_tables(cursor)
+    create_employee_audit_tables(cursor)
+    create_timesheet_tables(cursor)
+
+def create_employee_audit_tables(cursor):
+    # One row per bulk update, and the old and new value of every employee it changed
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS employee_audit_log (
+            audit_id INTEGER PRIMARY KEY,
+            changed_at TEXT NOT NULL,
+            action TEXT NOT NULL,
+            value REAL NOT NULL,
+            filter TEXT NOT NULL,
+            rows INTEGER NOT NULL,
+            note TEXT
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS employee_audit_changes (
+            audit_id INTEGER NOT NULL,
+            emp_id INTEGER NOT NULL,
+            old_value REAL,
+            new_value REAL,
+            PRIMARY KEY (audit_id, emp_id)
+        ) WITHOUT ROWID
+    ''')
+
+def create_timesheet_tables(cursor):
+    # Clock-in/clock-out events are only ever appended. Each ingested batch adds its worked minutes to
+    # timesheet_days and the overtime they make to timesheet_overtime, so payroll reads one row per employee
+    # and period instead of the events
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS timesheet_entries (
+            entry_id INTEGER PRIMARY KEY,
+            emp_id INTEGER NOT NULL,
+            work_date TEXT NOT NULL,
+            clock_in TEXT NOT NULL,
+            clock_out TEXT NOT NULL,
+            minutes INTEGER NOT NULL
+        )
+    ''')
+    for event in ('UPDATE', 'DELETE'):
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_timesheet_entries_{event.lower()} BEFORE {event} ON timesheet_entries
+            BEGIN
+                SELECT RAISE(ABORT, 'timesheet entries are append-only');
+            END
+        ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS timesheet_days (
+            emp_id INTEGER NOT NULL,
+            work_date TEXT NOT NULL,
+            minutes INTEGER NOT NULL,
+            PRIMARY KEY (emp_id, work_date)
+        ) WITHOUT ROWID
+    ''')
+    # Every employee with timesheets in a period has a row, however little overtime it comes to; payroll
+    # pays the others the hours entered
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS timesheet_overtime (
+            period TEXT NOT NULL,
+            emp_id INTEGER NOT NULL,
+            overtime_minutes INTEGER NOT NULL,
+            PRIMARY KEY (period, emp_id)
+        ) WITHOUT ROWID
+    ''')
+    # A changed rollup of the period the stored payroll was built for changes that employee's net salary.
+    # The rollups are written by upserts, whose conflict handling would override an OR IGNORE here
+    for event in ('INSERT', 'UPDATE'):
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_timesheet_overtime_payroll_{event.lower()} AFTER {event} ON timesheet_overtime
+            WHEN NEW.period = (SELECT period FROM payroll_snapshot)
+            BEGIN
+                INSERT INTO payroll_changes (emp_id) VALUES (NEW.emp_id) ON CONFLICT DO NOTHING;
+            END
+        ''')
+
+def create_employee_search_tables(cursor):
+    # Exact and prefix lookups on the numbers clerks quote
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_employees_mobile_number ON employees (mobile_number)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_employees_bank_account_number ON employees (bank_account_number)')
+    # Full-text index over the text fields, stored as an external-content table on top of employees
+    if cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'employees_fts'").fetchone() is not None:
+        return
+    try:
+        cursor.execute('''
+            CREATE VIRTUAL TABLE employees_fts USING fts5(
+                name, email, position, department,
+                content='employees', content_rowid='emp_id',
+                tokenize='unicode61 remove_diacritics 2', prefix='1 2 3 4'
+            )
+        ''')
+    except sqlite3.OperationalError:
+        # SQLite built without FTS5: search_employees() falls back to LIKE
+        return
+    cursor.execute("INSERT INTO employees_fts (employees_fts) VALUES ('rebuild')")
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_employees_fts_insert AFTER INSERT ON employees
+        BEGIN
+            INSERT INTO employees_fts (rowid, name, email, position, department)
+            VALUES (NEW.emp_id, NEW.name, NEW.email, NEW.position, NEW.department);
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_employees_fts_update
+        AFTER UPDATE OF emp_id, name, email, position, department ON employees
+        BEGIN
+            INSERT INTO employees_fts (employees_fts, rowid, name, email, position, department)
+            VALUES ('delete', OLD.emp_id, OLD.name, OLD.email, OLD.position, OLD.department);
+            INSERT INTO employees_fts (rowid, name, email, position, department)
+            VALUES (NEW.emp_id, NEW.name, NEW.email, NEW.position, NEW.department);
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_employees_fts_delete AFTER DELETE ON employees
+        BEGIN
+            INSERT INTO employees_fts (employees_fts, rowid, name, email, position, department)
+            VALUES ('delete', OLD.emp_id, OLD.name, OLD.email, OLD.position, OLD.department);
+        END
+    ''')
+
+def create_payroll_history_tables(cursor):
+    # One row per pay period, and one line per employee per period
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS payroll_runs (
+            run_id INTEGER PRIMARY KEY,
+            period TEXT NOT NULL UNIQUE,
+            run_at TEXT NOT NULL,
+            employees INTEGER NOT NULL,
+            total_gross REAL NOT NULL,
+            total_net REAL NOT NULL
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS payroll_lines (
+            period TEXT NOT NULL,
+            emp_id INTEGER NOT NULL,
+            run_id INTEGER NOT NULL REFERENCES payroll_runs (run_id),
+            department TEXT NOT NULL,
+            position TEXT NOT NULL,
+            basic_salary REAL NOT NULL,
+            overtime_pay REAL NOT NULL,
+            allowances REAL NOT NULL,
+            gross REAL NOT NULL,
+            deductions REAL NOT NULL,
+            net REAL NOT NULL,
+            PRIMARY KEY (period, emp_id)
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_payroll_lines_period_department
+        ON payroll_lines (period, department)
+    ''')
+
+def create_payroll_snapshot_tables(cursor):
+    # Persisted payroll results that process_payroll() keeps current by applying only the changed rows
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS payroll_net_salaries (
+            emp_id INTEGER PRIMARY KEY,
+            department TEXT NOT NULL,
+            position TEXT NOT NULL,
+            net_salary REAL NOT NULL
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS payroll_totals (
+            kind TEXT NOT NULL,
+            name TEXT NOT NULL,
+            total REAL NOT NULL,
+            employees INTEGER NOT NULL,
+            PRIMARY KEY (kind, name)
+        )
+    ''')
+    # period: the pay period whose timesheet overtime the stored results include
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS payroll_snapshot (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            built_at TEXT NOT NULL,
+            period TEXT NOT NULL
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS payroll_changes (
+            emp_id INTEGER PRIMARY KEY
+        )
+    ''')
+    # Changes are only tracked once a snapshot exists; until then the next run is a full rebuild anyway
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_employees_payroll_insert AFTER INSERT ON employees
+        WHEN EXISTS (SELECT 1 FROM payroll_snapshot)
+        BEGIN
+            INSERT OR IGNORE INTO payroll_changes (emp_id) VALUES (NEW.emp_id);
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_employees_payroll_update
+        AFTER UPDATE OF emp_id, department, position, basic_salary, overtime_hours ON employees
+        WHEN EXISTS (SELECT 1 FROM payroll_snapshot)
+        BEGIN
+            INSERT OR IGNORE INTO payroll_changes (emp_id) VALUES (OLD.emp_id);
+            INSERT OR IGNORE INTO payroll_changes (emp_id) VALUES (NEW.emp_id);
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_employees_payroll_delete AFTER DELETE ON employees
+        WHEN EXISTS (SELECT 1 FROM payroll_snapshot)
+        BEGIN
+            INSERT OR IGNORE INTO payroll_changes (emp_id) VALUES (OLD.emp_id);
+        END
+    ''')
+
+def create_pay_rule_tables(cursor):
+    # Allowances and deductions as data; a rule applies to everyone unless narrowed by department,
+    # position or emp_id. amount is the fixed amount or the percentage of basic salary, and slab rules
+    # keep their brackets as JSON [[from_salary, percent], ...]
+    seed = cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'pay_rules'").fetchone() is None
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS pay_rules (
+            rule_id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            kind TEXT NOT NULL CHECK (kind IN ('allowance', 'deduction')),
+            method TEXT NOT NULL CHECK (method IN ('fixed', 'percent_of_basic', 'slab')),
+            amount REAL NOT NULL DEFAULT 0,
+            slabs TEXT,
+            department TEXT,
+            position TEXT,
+            emp_id INTEGER
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS pay_rules_version (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            version INTEGER NOT NULL
+        )
+    ''')
+    cursor.execute('INSERT OR IGNORE INTO pay_rules_version (id, version) VALUES (1, 0)')
+    # Any rule change invalidates compiled plans and forces the stored payroll to be rebuilt
+    for event in ('INSERT', 'UPDATE', 'DELETE'):
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_pay_rules_{event.lower()} AFTER {event} ON pay_rules
+            BEGIN
+                UPDATE pay_rules_version SET version = version + 1;
+                DELETE FROM payroll_snapshot;
+            END
+        ''')
+    if seed:
+        cursor.executemany('INSERT INTO pay_rules (name, kind, method, amount) VALUES (?, ?, ?, ?)',
+                           [(name, 'allowance', 'fixed', amount) for name, amount in DEFAULT_ALLOWANCES.items()] +
+                           [(name, 'deduction', 'fixed', amount) for name, amount in DEFAULT_DEDUCTIONS.items()])
+
+# Pay components seeded into pay_rules, and used by Employee objects built outside a pay plan;
+# read-only so one table can back all of them
+DEFAULT_ALLOWANCES = MappingProxyType({'Travel Allowance': 1000, 'Medical Allowance': 500})
+DEFAULT_DEDUCTIONS = MappingProxyType({'Tax': 500, 'Insurance': 200})
+OVERTIME_HOURS_PER_MONTH = 173
+
+# How Payroll Analysis computes its totals: 'incremental' (stored totals updated with the rows
+# changed since the last run), 'sql' (aggregated inside SQLite), 'batch' (NumPy over all rows),
+# 'sharded' (batch split across worker processes), 'snapshot' (read from an exported columnar
+# snapshot, as of its export) or 'employee' (one Employee object per row)
+PAYROLL_AGGREGATION = 'incremental'
+PAYROLL_CHANGE_CHUNK_SIZE = 500
+
+# Columnar snapshot for analytics: where 'snapshot' payroll reads it, and employees exported per batch
+PAYROLL_SNAPSHOT_PATH = os.environ.get('PAYROLL_SNAPSHOT', 'payroll-snapshot')
+SNAPSHOT_BATCH_SIZE = 50000
+
+# 'sharded' payroll: worker processes (None for one per core), and whether the employees are split
+# into emp_id ranges or into groups of whole departments
+PAYROLL_SHARD_WORKERS = None
+PAYROLL_SHARD_BY = 'emp_id'
+
+# Bulk import: rows per executemany call, and chunks committed per transaction
+IMPORT_CHUNK_SIZE = 5000
+IMPORT_CHUNKS_PER_TRANSACTION = 20
+IMPORT_CACHE_SIZE_KB = 65536  # page cache used while a bulk import runs
+IMPORT_FIELDS = ['name', 'position', 'department', 'basic_salary', 'doj', 'overtime_hours',
+                 'bank_name', 'bank_account_number', 'ifsc_code', 'mobile_number', 'email']
+
+# Timesheets: events per ingestion transaction, and the worked minutes in a day beyond which it is overtime
+TIMESHEET_BATCH_SIZE = 10000
+TIMESHEET_STANDARD_DAY_MINUTES = 8 * 60
+TIMESHEET_MAX_SHIFT_MINUTES = 24 * 60
+# A period's overtime minutes, paid in whole hours rounded to the nearest (half an hour rounds up)
+TIMESHEET_OVERTIME_HOURS_SQL = '(overtime_minutes + 30) / 60'
+TIMESHEET_FIELDS = ['emp_id', 'clock_in', 'clock_out']
+
+# Bulk updates: the column each action changes and the SQL giving its new value from the action's value.
+# Above BULK_UPDATE_REBUILD_ROWS changed rows the stored payroll is rebuilt on the next run instead of
+# tracking every changed employee
+BULK_UPDATE_ACTIONS = {
+    'raise_salary': ('basic_salary', 'ROUND(basic_salary * (1 + ? / 100.0), 2)'),
+    'set_overtime': ('overtime_hours', '?'),
+}
+BULK_UPDATE_REBUILD_ROWS = 10000
+# Largest accepted values: a tenfold raise, and every hour of a 31-day month
+BULK_UPDATE_MAX_RAISE_PERCENT = 1000
+BULK_UPDATE_MAX_OVERTIME_HOURS = 31 * 24
+
+# Read-through cache in front of fetch_employee_by_id
+EMPLOYEE_CACHE_SIZE = 1024
+EMPLOYEE_CACHE_TTL = 300  # seconds
+
+# Background jobs: worker threads for DB/export work, and how often Tk polls for their results
+BACKGROUND_WORKERS = 2
+BACKGROUND_POLL_MS = 50
+BACKGROUND_PROGRESS_INTERVAL = 0.1  # seconds between progress updates sent to the UI
+BACKGROUND_CANCEL_CHECK_OPS = 10000  # SQLite VM instructions between checks for a cancel request
+
+# Rows fetched per page by the employee list, more are loaded as the user scrolls
+EMPLOYEE_PAGE_SIZE = 100
+
+# Employees fetched per query while streaming the all-employees PDF
+EMPLOYEE_REPORT_BATCH_SIZE = 1000
+# TrueType fonts tried for the PDF reports, first found wins; PAYROLL_PDF_FONT names another
+PDF_FONT_PATHS = [os.environ.get('PAYROLL_PDF_FONT'), '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf',
+                  '/Library/Fonts/Arial Unicode.ttf', 'C:\\Windows\\Fonts\\arial.ttf']
+
+# Employee search: matches shown, and the pause in typing before the search runs
+EMPLOYEE_SEARCH_LIMIT = 20
+EMPLOYEE_SEARCH_DELAY_MS = 150
+
+# Bank disbursement files: transfers per bank batch, rows fetched per query, and the write buffer
+DISBURSEMENT_BATCH_SIZE = 5000
+DISBURSEMENT_FETCH_SIZE = 10000
+DISBURSEMENT_WRITE_BUFFER = 1024 * 1024
+
+# HTTP service: DB worker threads, how long requests are collected into one batch, the largest
+# batch, employees per streamed page, and the largest request body accepted
+SERVICE_HOST = '127.0.0.1'
+SERVICE_PORT = 8080
+SERVICE_WORKERS = 4
+SERVICE_BATCH_DELAY = 0.002  # seconds
+SERVICE_BATCH_SIZE = 500
+SERVICE_PAGE_SIZE = 1000
+SERVICE_MAX_BODY = 1024 * 1024
+
+# Employee validation: formats checked on every field (optional ones only when filled in), and the
+# fields that must not repeat across employees
+DOJ_PATTERN = re.compile(r'\d{4}-\d{2}-\d{2}')
+IFSC_PATTERN = re.compile(r'[A-Z]{4}0[A-Z0-9]{6}')
+BANK_ACCOUNT_PATTERN = re.compile(r'\d{9,18}')
+MOBILE_PATTERN = re.compile(r'(?:\+91)?[6-9]\d{9}')
+EMAIL_PATTERN = re.compile(r"[A-Za-z0-9.!#$%&'*+/=?^_`{|}~-]+@[A-Za-z0-9-]+(?:\.[A-Za-z0-9-]+)*\.[A-Za-z]{2,}")
+OPTIONAL_FIELD_FORMATS = [
+    ('bank_account_number', BANK_ACCOUNT_PATTERN, "Bank account number must be 9 to 18 digits."),
+    ('ifsc_code', IFSC_PATTERN, "IFSC code must be 4 letters, a 0 and 6 letters or digits."),
+    ('mobile_number', MOBILE_PATTERN, "Mobile number must be 10 digits starting with 6-9."),
+    ('email', EMAIL_PATTERN, "Email address is not valid."),
+]
+# field -> (SQL expression it is compared by, label); both have an index
+UNIQUE_EMPLOYEE_FIELDS = {
+    'bank_account_number': ('bank_account_number', "Bank account number"),
+    'email': ('lower(email)', "Email address"),
+}
+VALIDATION_BATCH_SIZE = 10000
+VALIDATION_QUERY_CHUNK_SIZE = 500  # values per IN (...) lookup of existing duplicates
+
+@functools.lru_cache(maxsize=4096)
+def doj_error(doj, today):
+    # Cached: a table has few distinct joining dates
+    if not DOJ_PATTERN.fullmatch(doj):
+        return "Date of joining must be YYYY-MM-DD."
+    try:
+        date.fromisoformat(doj)
+    except ValueError:
+        return "Date of joining is not a valid date."
+    if doj > today:
+        return "Date of joining is in the future."
+    return None
+
+def employee_field_errors(values, today=None):
+    # Every format problem in one employee's fields (a dict keyed by IMPORT_FIELDS), as (field, message)
+    errors = []
+    for field, label in (('name', "Name"), ('position', "Position"), ('department', "Department")):
+        value = values.get(field)
+        if not isinstance(value, str) or not value.strip():
+            errors.append((field, f"{label} cannot be empty."))
+    try:
+        basic_salary = float(values.get('basic_salary'))
+        if not math.isfinite(basic_salary):
+            errors.append(('basic_salary', "Basic salary must be a number."))
+        elif basic_salary < 0:
+            errors.append(('basic_salary', "Basic salary cannot be negative."))
+    except (TypeError, ValueError):
+        errors.append(('basic_salary', "Basic salary must be a number."))
+    overtime_hours = values.get('overtime_hours')
+    if overtime_hours not in (None, ''):
+        try:
+            if int(overtime_hours) < 0:
+                errors.append(('overtime_hours', "Overtime hours cannot be negative."))
+        except (TypeError, ValueError):
+            errors.append(('overtime_hours', "Overtime hours must be a whole number."))
+    doj = values.get('doj')
+    if not isinstance(doj, str) or not doj:
+        errors.append(('doj', "Date of joining cannot be empty."))
+    else:
+        message = doj_error(doj, today or date.today().isoformat())
+        if message:
+            errors.append(('doj', message))
+    for field, pattern, message in OPTIONAL_FIELD_FORMATS:
+        value = values.get(field)
+        if value and not (isinstance(value, str) and pattern.fullmatch(value)):
+            errors.append((field, message))
+    return errors
+
+def unique_field_value(field, value):
+    # The form a unique field is compared in, or None when it is empty
+    if not isinstance(value, str) or not value.strip():
+        return None
+    value = value.strip()
+    return value.lower() if field == 'email' else value
+
+def find_existing_duplicates(cursor, items, exclude_emp_id=None):
+    # {key: [(field, message)]} for the (key, values) items whose unique fields already belong to an employee
+    errors = {}
+    for field, (expression, label) in UNIQUE_EMPLOYEE_FIELDS.items():
+        keys = {}
+        for key, values in items:
+            value = unique_field_value(field, values.get(field))
+            if value is not None:
+                keys.setdefault(value, []).append(key)
+        pending = list(keys)
+        for start in range(0, len(pending), VALIDATION_QUERY_CHUNK_SIZE):
+            chunk = pending[start:start + VALIDATION_QUERY_CHUNK_SIZE]
+            params = chunk + ([] if exclude_emp_id is None else [exclude_emp_id])
+            cursor.execute(f"SELECT {expression}, MIN(emp_id) FROM employees "
+                           f"WHERE {expression} IN ({', '.join('?' * len(chunk))})"
+                           f"{'' if exclude_emp_id is None else ' AND emp_id != ?'} GROUP BY {expression}", params)
+            for value, emp_id in cursor.fetchall():
+                for key in keys[value]:
+                    errors.setdefault(key, []).append((field, f"{label} already belongs to employee {emp_id}."))
+    return errors
+
+def check_employee_duplicates(cursor, employee, emp_id=None):
+    values = {field: getattr(employee, field) for field in UNIQUE_EMPLOYEE_FIELDS}
+    errors = find_existing_duplicates(cursor, [(None, values)], emp_id).get(None)
+    if errors:
+        raise ValueError(' '.join(message for _, message in errors))
+
+class EmployeeValidator:
+    # One pass over a stream of records, e.g. an import file: format checks per record, and unique fields
+    # repeated within the stream. Only records that passed are remembered, so one bad line does not
+    # also fail the good line that repeats its value
+    def __init__(self):
+        self.today = date.today().isoformat()
+        self.seen = {field: {} for field in UNIQUE_EMPLOYEE_FIELDS}
+
+    def record_errors(self, key, values):
+        errors = employee_field_errors(values, self.today)
+        unique_values = []
+        for field, (_, label) in UNIQUE_EMPLOYEE_FIELDS.items():
+            value = unique_field_value(field, values.get(field))
+            if value is None:
+                continue
+            first = self.seen[field].get(value)
+            if first is not None:
+                errors.append((field, f"{label} repeats line {first}."))
+            unique_values.append((field, value))
+        if not errors:
+            for field, value in unique_values:
+                self.seen[field][value] = key
+        return errors
+
+def find_table_duplicates(cursor):
+    # {emp_id: [(field, message)]} for employees sharing a unique field; each GROUP BY walks that field's index
+    errors = {}
+    for field, (expression, label) in UNIQUE_EMPLOYEE_FIELDS.items():
+        cursor.execute(f"SELECT group_concat(emp_id) FROM employees WHERE {expression} != '' "
+                       f"GROUP BY {expression} HAVING COUNT(*) > 1")
+        for (emp_ids,) in cursor.fetchall():
+            emp_ids = [int(emp_id) for emp_id in emp_ids.split(',')]
+            for emp_id in emp_ids:
+                others = [str(other) for other in emp_ids if other != emp_id]
+                shown = ', '.join(others[:5]) + (f" and {len(others) - 5} more" if len(others) > 5 else '')
+                errors.setdefault(emp_id, []).append((field, f"{label} is shared with employee {shown}."))
+    return errors
+
+def screen_employee_rows(rows, today):
+    # Indexes of the rows that may have a format error, checked a column at a time over one batch of
+    # (emp_id, *IMPORT_FIELDS) rows. It may flag valid rows, never misses an invalid one; only the flagged
+    # rows go through employee_field_errors
+    columns = dict(zip(IMPORT_FIELDS, list(zip(*rows))[1:]))
+    flagged = set()
+    for field in ('name', 'position', 'department'):
+        flagged.update(i for i, value in enumerate(columns[field]) if type(value) is not str or not value.strip())
+    flagged.update(i for i, value in enumerate(columns['basic_salary'])
+                   if type(value) not in (float, int) or not 0 <= value < math.inf)
+    flagged.update(i for i, value in enumerate(columns['overtime_hours']) if type(value) is not int or value < 0)
+    # Joining dates repeat a lot, so each distinct value is checked once
+    bad_dojs = {value for value in set(columns['doj']) if type(value) is not str or not value or doj_error(value, today)}
+    if bad_dojs:
+        flagged.update(i for i, value in enumerate(columns['doj']) if value in bad_dojs)
+    for field, pattern, _ in OPTIONAL_FIELD_FORMATS:
+        values = columns[field]
+        if all(type(value) is str for value in values):
+            flagged.update(i for i, match in enumerate(map(pattern.fullmatch, values)) if match is None and values[i])
+        else:
+            flagged.update(range(len(values)))
+    return sorted(flagged)
+
+def stored_employee_errors(values, today):
+    # employee_field_errors for a row of the table, where payroll also needs the numbers stored as numbers:
+    # the salary as INTEGER or REAL, the overtime as INTEGER ('' or 2.5 are accepted from a form, not here)
+    errors = employee_field_errors(values, today)
+    fields = {field for field, _ in errors}
+    if 'basic_salary' not in fields and type(values['basic_salary']) not in (float, int):
+        errors.append(('basic_salary', "Basic salary is not stored as a number."))
+    if 'overtime_hours' not in fields and type(values['overtime_hours']) is not int:
+        errors.append(('overtime_hours', "Overtime hours are not stored as a whole number."))
+    return errors
+
+def iter_employee_errors(batch_size=VALIDATION_BATCH_SIZE):
+    # (emp_id, [(field, message)]) for every invalid employee in the table, in emp_id order
+    today = date.today().isoformat()
+    with read_transaction() as cursor:
+        duplicates = find_table_duplicates(cursor)
+        cursor.execute(f"SELECT emp_id, {', '.join(IMPORT_FIELDS)} FROM employees ORDER BY emp_id")
+        for rows in iter(lambda: cursor.fetchmany(batch_size), []):
+            candidates = set(screen_employee_rows(rows, today))
+            if duplicates:
+                candidates.update(i for i, row in enumerate(rows) if row[0] in duplicates)
+            for i in sorted(candidates):
+                row = rows[i]
+                errors = stored_employee_errors(dict(zip(IMPORT_FIELDS, row[1:])), today) + duplicates.get(row[0], [])
+                if errors:
+                    yield row[0], errors
+
+@instrumented('validate_employees', rows=lambda summary: summary['employees'])
+def validate_employees(report_path=None):
+    # Validates the whole table; every invalid employee with all its errors goes to report_path as JSON lines
+    start = time.perf_counter()
+    invalid = 0
+    fields = {}
+    report = open(report_path, 'w', encoding='utf-8') if report_path else None
+    try:
+        for emp_id, errors in iter_employee_errors():
+            invalid += 1
+            for field, _ in errors:
+                fields[field] = fields.get(field, 0) + 1
+            if report:
+                report.write(json.dumps({'emp_id': emp_id, 'errors': [{'field': field, 'message': message}
+                                                                      for field, message in errors]}) + '\n')
+    finally:
+        if report:
+            report.close()
+    employees = db_cursor().execute('SELECT COUNT(*) FROM employees').fetchone()[0]
+    return {'employees': employees, 'invalid': invalid, 'errors_by_field': fields,
+            'seconds': time.perf_counter() - start}
 
 class Employee:
+    __slots__ = ('emp_id', 'name', 'position', 'department', 'basic_salary', 'doj', 'overtime_hours',
+                 'allowances', 'deductions', 'bank_name', 'bank_account_number', 'ifsc_code',
+                 'mobile_number', 'email')
+
     def __init__(self, emp_id, name, position, department, basic_salary, doj, overtime_hours=0,
-                 bank_name="", bank_account_number="", ifsc_code="", mobile_number="", email=""):
+                 bank_name="", bank_account_number="", ifsc_code="", mobile_number="", email="",
+                 allowances=None, deductions=None):
         self.emp_id = emp_id
         self.name = name
         self.position = position
@@ -45,8 +953,8 @@ class Employee:
         self.basic_salary = float(basic_salary)
         self.doj = doj
         self.overtime_hours = int(overtime_hours)
-        self.allowances = {'Travel Allowance': 1000, 'Medical Allowance': 500}
-        self.deductions = {'Tax': 500, 'Insurance': 200}
+        self.allowances = DEFAULT_ALLOWANCES if allowances is None else allowances
+        self.deductions = DEFAULT_DEDUCTIONS if deductions is None else deductions
         self.bank_name = bank_name
         self.bank_account_number = bank_account_number
         self.ifsc_code = ifsc_code
@@ -54,100 +962,1045 @@ class Employee:
         self.email = email
 
     def validate_employee_data(self):
-        if not self.name:
-            raise ValueError("Name cannot be empty.")
-        if not self.position:
-            raise ValueError("Position cannot be empty.")
-        if not self.department:
-            raise ValueError("Department cannot be empty.")
-        if self.basic_salary < 0:
-            raise ValueError("Basic salary cannot be negative.")
+        # Raises with every problem found, not just the first
+        errors = [message for _, message in employee_field_errors({field: getattr(self, field)
+                                                                   for field in IMPORT_FIELDS})]
         for allowance_name, allowance_amount in self.allowances.items():
             if allowance_amount < 0:
-                raise ValueError(f"Allowance '{allowance_name}' cannot be negative.")
+                errors.append(f"Allowance '{allowance_name}' cannot be negative.")
         for deduction_name, deduction_amount in self.deductions.items():
             if deduction_amount < 0:
-                raise ValueError(f"Deduction '{deduction_name}' cannot be negative.")
+                errors.append(f"Deduction '{deduction_name}' cannot be negative.")
+        if errors:
+            raise ValueError(' '.join(errors))
+
+class EmployeeCache:
+    # Bounded LRU of Employee objects by emp_id; entries expire after ttl seconds
+    def __init__(self, maxsize=EMPLOYEE_CACHE_SIZE, ttl=EMPLOYEE_CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, emp_id):
+        with self.lock:
+            entry = self.entries.get(emp_id)
+            if entry is not None:
+                employee, expires_at = entry
+                if time.monotonic() < expires_at:
+                    self.entries.move_to_end(emp_id)
+                    self.hits += 1
+                    return employee
+                del self.entries[emp_id]
+            self.misses += 1
+            return None
+
+    def put(self, emp_id, employee, generation=None):
+        # generation is read before the SELECT; a write committed since then means the row may be stale
+        if self.maxsize <= 0:
+            return
+        with self.lock:
+            if generation is not None and generation != self.generation:
+                return
+            self.entries[emp_id] = (employee, time.monotonic() + self.ttl)
+            self.entries.move_to_end(emp_id)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def invalidate(self, emp_id):
+        with self.lock:
+            self.generation += 1
+            self.entries.pop(emp_id, None)
+
+    def clear(self):
+        with self.lock:
+            self.generation += 1
+            self.entries.clear()
+
+    def stats(self):
+        with self.lock:
+            return {'size': len(self.entries), 'hits': self.hits, 'misses': self.misses}
+
+employee_cache = EmployeeCache()
+
+def check_employee_cache():
+    # Writes through this process invalidate what they change. A commit by any other connection (another
+    # process, or another thread here) moves this connection's data_version, and may have changed any
+    # employee or the pay rules, so the cache is dropped; likewise the first time a connection looks
+    conn = current_db()[0]
+    (version,) = conn.execute('PRAGMA data_version').fetchone()
+    if version != db_local.data_version:
+        employee_cache.clear()
+        db_local.data_version = version
+
+INSERT_EMPLOYEE_SQL = '''
+    INSERT INTO employees (name, position, department, basic_salary, doj, overtime_hours,
+                           bank_name, bank_account_number, ifsc_code, mobile_number, email)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+'''
+
+def employee_insert_params(employee):
+    return (employee.name, employee.position, employee.department, employee.basic_salary, employee.doj,
+            employee.overtime_hours, employee.bank_name, employee.bank_account_number,
+            employee.ifsc_code, employee.mobile_number, employee.email)
+
+@instrumented('db.insert_employee')
+def insert_employee_record(employee):
+    employee.validate_employee_data()
+    with transaction() as cursor:
+        check_employee_duplicates(cursor, employee)
+        cursor.execute(INSERT_EMPLOYEE_SQL, employee_insert_params(employee))
+        emp_id = cursor.lastrowid
+    employee_cache.invalidate(emp_id)
+    return emp_id
+
+@instrumented('db.insert_employees', rows=len)
+def insert_employee_records(employees):
+    # One transaction for the batch; each row is its own savepoint, so a failing row gets its error
+    # back (in place of its emp_id) without undoing the others
+    results = []
+    with transaction():
+        for employee in employees:
+            try:
+                with transaction() as cursor:
+                    check_employee_duplicates(cursor, employee)
+                    cursor.execute(INSERT_EMPLOYEE_SQL, employee_insert_params(employee))
+                    results.append(cursor.lastrowid)
+            except (sqlite3.Error, ValueError) as e:
+                results.append(e)
+    for result in results:
+        if not isinstance(result, Exception):
+            employee_cache.invalidate(result)
+    return results
 
 def insert_employee(employee):
     try:
-        employee.validate_employee_data()
-        cursor.execute('''
-            INSERT INTO employees (name, position, department, basic_salary, doj, overtime_hours,
-                                   bank_name, bank_account_number, ifsc_code, mobile_number, email)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (employee.name, employee.position, employee.department, employee.basic_salary, employee.doj,
-              employee.overtime_hours, employee.bank_name, employee.bank_account_number,
-              employee.ifsc_code, employee.mobile_number, employee.email))
-        conn.commit()
+        insert_employee_record(employee)
         messagebox.showinfo("Success", "Employee added successfully.")
-    except sqlite3.Error as e:
+    except (sqlite3.Error, ValueError) as e:
         messagebox.showerror("Error", str(e))
 
+def read_import_records(file_path):
+    # Yields (line_number, record, error) so unparsable lines can be rejected without stopping the import
+    if file_path.lower().endswith(('.jsonl', '.ndjson')):
+        with open(file_path, encoding='utf-8') as f:
+            for line_number, line in enumerate(f, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    yield line_number, json.loads(line), None
+                except json.JSONDecodeError as e:
+                    yield line_number, line.rstrip('\n'), f"Invalid JSON: {e}"
+    else:
+        with open(file_path, newline='', encoding='utf-8') as f:
+            reader = csv.DictReader(f)
+            for record in reader:
+                yield reader.line_num, record, None
+
+def record_values(record):
+    if not isinstance(record, dict):
+        raise ValueError("Record must be an object.")
+    return {field: record.get(field) for field in IMPORT_FIELDS}
+
+def employee_from_values(values):
+    # values must already have passed employee_field_errors; missing optional fields get their defaults
+    values = dict(values)
+    for field, value in values.items():
+        if value is None or (field == 'overtime_hours' and value == ''):
+            values[field] = 0 if field == 'overtime_hours' else ""
+    return Employee(None, **values)
+
+def employee_from_record(record):
+    values = record_values(record)
+    errors = employee_field_errors(values)
+    if errors:
+        raise ValueError(' '.join(message for _, message in errors))
+    return employee_from_values(values)
+
+@instrumented('import_employees', rows=lambda summary: summary['imported'])
+def import_employees(file_path, reject_path=None, chunk_size=IMPORT_CHUNK_SIZE,
+                     chunks_per_transaction=IMPORT_CHUNKS_PER_TRANSACTION):
+    cursor = db_cursor()
+    reject_path = reject_path or file_path + '.rejects.jsonl'
+    imported = 0
+    rejected = 0
+    start = time.perf_counter()
+
+    def reject(line_number, record, errors):
+        # errors: every (field, message) found for the line
+        nonlocal rejected
+        rejects.write(json.dumps({'line': line_number, 'error': ' '.join(message for _, message in errors),
+                                  'errors': [{'field': field, 'message': message} for field, message in errors],
+                                  'record': record}) + '\n')
+        rejected += 1
+
+    def checked(batch):
+        # Unique fields already held by an employee in the database are looked up once per chunk
+        duplicates = find_existing_duplicates(cursor, [(line_number, values) for line_number, _, values in batch])
+        rows = []
+        for line_number, record, values in batch:
+            if line_number in duplicates:
+                reject(line_number, record, duplicates[line_number])
+            else:
+                rows.append((line_number, record, employee_insert_params(employee_from_values(values))))
+        return rows
+
+    def read_chunks():
+        validator = EmployeeValidator()
+        batch = []
+        for line_number, record, error in read_import_records(file_path):
+            if error is None:
+                try:
+                    values = record_values(record)
+                    errors = validator.record_errors(line_number, values)
+                except ValueError as e:
+                    errors = [(None, str(e))]
+                if errors:
+                    reject(line_number, record, errors)
+                else:
+                    batch.append((line_number, record, values))
+            else:
+                reject(line_number, record, [(None, error)])
+            if len(batch) >= chunk_size:
+                yield checked(batch)
+                batch = []
+        if batch:
+            yield checked(batch)
+
+    def insert_chunk(batch):
+        nonlocal imported
+        # Each chunk is a savepoint, so a failing chunk can be retried row by row without losing the transaction
+        try:
+            with transaction() as chunk_cursor:
+                chunk_cursor.executemany(INSERT_EMPLOYEE_SQL, [params for _, _, params in batch])
+            imported += len(batch)
+        except sqlite3.Error:
+            for line_number, record, params in batch:
+                try:
+                    with transaction() as row_cursor:
+                        row_cursor.execute(INSERT_EMPLOYEE_SQL, params)
+                    imported += 1
+                except sqlite3.Error as e:
+                    reject(line_number, record, [(None, str(e))])
+
+    cache_size = cursor.execute('PRAGMA cache_size').fetchone()[0]
+    cursor.execute(f'PRAGMA cache_size = {-IMPORT_CACHE_SIZE_KB}')
+    try:
+        with open(reject_path, 'w', encoding='utf-8') as rejects:
+            chunks = read_chunks()
+            finished = False
+            while not finished:
+                with transaction():
+                    for _ in range(chunks_per_transaction):
+                        batch = next(chunks, None)
+                        if batch is None:
+                            finished = True
+                            break
+                        insert_chunk(batch)
+    finally:
+        cursor.execute(f'PRAGMA cache_size = {cache_size}')
+
+    elapsed = time.perf_counter() - start
+    return {'imported': imported, 'rejected': rejected, 'reject_path': reject_path, 'seconds': elapsed,
+            'rows_per_second': (imported + rejected) / elapsed if elapsed else 0.0}
+
+def parse_clock_time(value, label):
+    try:
+        return datetime.fromisoformat(value.strip())
+    except (AttributeError, ValueError):
+        raise ValueError(f"{label} must be a date and time like 2024-05-01 09:00.") from None
+
+def timesheet_entry(record):
+    # (emp_id, work_date, clock_in, clock_out, minutes) for one clock-in/clock-out record; a shift counts
+    # towards the day it started on
+    if not isinstance(record, dict):
+        raise ValueError("Record must be an object.")
+    try:
+        emp_id = int(record.get('emp_id'))
+    except (TypeError, ValueError):
+        raise ValueError("Employee ID must be a whole number.") from None
+    clock_in = parse_clock_time(record.get('clock_in'), "Clock-in")
+    clock_out = parse_clock_time(record.get('clock_out'), "Clock-out")
+    try:
+        minutes = int((clock_out - clock_in).total_seconds()) // 60
+    except TypeError:
+        raise ValueError("Clock-in and clock-out must both have a time zone or both have none.") from None
+    if not 0 < minutes <= TIMESHEET_MAX_SHIFT_MINUTES:
+        raise ValueError("Clock-out must be after clock-in and at most 24 hours later.")
+    return emp_id, clock_in.date().isoformat(), clock_in.isoformat(sep=' '), clock_out.isoformat(sep=' '), minutes
+
+def existing_emp_ids(cursor, emp_ids, chunk_size=VALIDATION_QUERY_CHUNK_SIZE):
+    emp_ids = list(emp_ids)
+    found = set()
+    for start in range(0, len(emp_ids), chunk_size):
+        chunk = emp_ids[start:start + chunk_size]
+        cursor.execute(f"SELECT emp_id FROM employees WHERE emp_id IN ({', '.join('?' * len(chunk))})", chunk)
+        found.update(emp_id for (emp_id,) in cursor.fetchall())
+    return found
+
+def add_timesheet_entries(cursor, entries):
+    # Appends the entries and folds them into the rollups: the batch is summed per employee and day first,
+    # then each day it touched adds the overtime it gained (after minus before) to the employee's period
+    cursor.executemany('''
+        INSERT INTO timesheet_entries (emp_id, work_date, clock_in, clock_out, minutes) VALUES (?, ?, ?, ?, ?)
+    ''', entries)
+    day_minutes = defaultdict(int)
+    for emp_id, work_date, _, _, minutes in entries:
+        day_minutes[emp_id, work_date] += minutes
+    cursor.execute('''
+        CREATE TEMP TABLE IF NOT EXISTS timesheet_batch (
+            emp_id INTEGER NOT NULL,
+            work_date TEXT NOT NULL,
+            minutes INTEGER NOT NULL,
+            PRIMARY KEY (emp_id, work_date)
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute('DELETE FROM temp.timesheet_batch')
+    cursor.executemany('INSERT INTO temp.timesheet_batch (emp_id, work_date, minutes) VALUES (?, ?, ?)',
+                       ((emp_id, work_date, minutes) for (emp_id, work_date), minutes in day_minutes.items()))
+    cursor.execute('''
+        INSERT INTO timesheet_overtime (period, emp_id, overtime_minutes)
+        SELECT substr(b.work_date, 1, 7), b.emp_id,
+               SUM(MAX(IFNULL(d.minutes, 0) + b.minutes - :standard, 0) - MAX(IFNULL(d.minutes, 0) - :standard, 0))
+        FROM temp.timesheet_batch AS b
+        LEFT JOIN timesheet_days AS d ON d.emp_id = b.emp_id AND d.work_date = b.work_date
+        WHERE true
+        GROUP BY substr(b.work_date, 1, 7), b.emp_id
+        ON CONFLICT (period, emp_id) DO UPDATE SET overtime_minutes = overtime_minutes + excluded.overtime_minutes
+    ''', {'standard': TIMESHEET_STANDARD_DAY_MINUTES})
+    cursor.execute('''
+        INSERT INTO timesheet_days (emp_id, work_date, minutes)
+        SELECT emp_id, work_date, minutes FROM temp.timesheet_batch WHERE true
+        ON CONFLICT (emp_id, work_date) DO UPDATE SET minutes = minutes + excluded.minutes
+    ''')
+
+@instrumented('import_timesheets', rows=lambda summary: summary['imported'])
+def import_timesheets(file_path, reject_path=None, batch_size=TIMESHEET_BATCH_SIZE):
+    # Each batch of events commits together with its rollup changes, which payroll reads for the period
+    reject_path = reject_path or file_path + '.rejects.jsonl'
+    imported = 0
+    rejected = 0
+    start = time.perf_counter()
+
+    def reject(line_number, record, error):
+        nonlocal rejected
+        rejects.write(json.dumps({'line': line_number, 'error': error, 'record': record}) + '\n')
+        rejected += 1
+
+    def read_batches():
+        batch = []
+        for line_number, record, error in read_import_records(file_path):
+            if error is None:
+                try:
+                    batch.append((line_number, record, timesheet_entry(record)))
+                except ValueError as e:
+                    reject(line_number, record, str(e))
+            else:
+                reject(line_number, record, error)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    cursor = db_cursor()
+    cache_size = cursor.execute('PRAGMA cache_size').fetchone()[0]
+    cursor.execute(f'PRAGMA cache_size = {-IMPORT_CACHE_SIZE_KB}')
+    try:
+        with open(reject_path, 'w', encoding='utf-8') as rejects:
+            for batch in read_batches():
+                with transaction():
+                    known = existing_emp_ids(cursor, {entry[0] for _, _, entry in batch})
+                    entries = []
+                    for line_number, record, entry in batch:
+                        if entry[0] in known:
+                            entries.append(entry)
+                        else:
+                            reject(line_number, record, f"No employee with ID {entry[0]}.")
+                    add_timesheet_entries(cursor, entries)
+                imported += len(entries)
+    finally:
+        cursor.execute(f'PRAGMA cache_size = {cache_size}')
+
+    elapsed = time.perf_counter() - start
+    return {'imported': imported, 'rejected': rejected, 'reject_path': reject_path, 'seconds': elapsed,
+            'rows_per_second': (imported + rejected) / elapsed if elapsed else 0.0}
+
+def intern_text(value):
+    return sys.intern(value) if type(value) is str else value
+
+def employee_from_row(row, plan=None):
+    emp_id, name, position, department, basic_salary, doj, overtime_hours, bank_name, \
+    bank_account_number, ifsc_code, mobile_number, email = row
+    # Values repeated across many rows share one string object
+    position, department, bank_name = intern_text(position), intern_text(department), intern_text(bank_name)
+    allowances, deductions = (plan or current_pay_plan()).components_for(emp_id, department, position,
+                                                                          float(basic_salary))
+    return Employee(emp_id, name, position, department, basic_salary, doj, overtime_hours, bank_name,
+                    bank_account_number, ifsc_code, mobile_number, email, allowances, deductions)
+
+@instrumented('db.fetch_employee_by_id')
 def fetch_employee_by_id(emp_id):
+    cursor = db_cursor()
+    check_employee_cache()
+    employee = employee_cache.get(emp_id)
+    if employee is not None:
+        return employee
+    generation = employee_cache.generation
     cursor.execute('SELECT * FROM employees WHERE emp_id = ?', (emp_id,))
     row = cursor.fetchone()
     if row:
-        emp_id, name, position, department, basic_salary, doj, overtime_hours, bank_name, \
-        bank_account_number, ifsc_code, mobile_number, email = row
-        return Employee(emp_id, name, position, department, basic_salary, doj, overtime_hours, bank_name,
-                        bank_account_number, ifsc_code, mobile_number, email)
+        employee = employee_from_row(row)
+        employee_cache.put(emp_id, employee, generation)
+        return employee
     return None
 
+@instrumented('db.fetch_employees_by_ids', rows=len)
+def fetch_employees_by_ids(emp_ids, chunk_size=500):
+    # Employees in the order of emp_ids, None for the missing ones; cache misses are read with one IN query per chunk
+    cursor = db_cursor()
+    check_employee_cache()
+    found = {}
+    missing = []
+    for emp_id in emp_ids:
+        employee = employee_cache.get(emp_id)
+        if employee is not None:
+            found[emp_id] = employee
+        else:
+            missing.append(emp_id)
+    if missing:
+        plan = current_pay_plan()
+        generation = employee_cache.generation
+        for start in range(0, len(missing), chunk_size):
+            chunk = missing[start:start + chunk_size]
+            cursor.execute(f"SELECT * FROM employees WHERE emp_id IN ({', '.join('?' * len(chunk))})", chunk)
+            for row in cursor.fetchall():
+                employee = found[row[0]] = employee_from_row(row, plan)
+                employee_cache.put(row[0], employee, generation)
+    return [found.get(emp_id) for emp_id in emp_ids]
+
+@instrumented('db.fetch_all_employees', rows=len)
 def fetch_all_employees():
+    cursor = db_cursor()
+    plan = current_pay_plan()
     cursor.execute('SELECT * FROM employees')
     rows = cursor.fetchall()
     employees = []
     for row in rows:
-        emp_id, name, position, department, basic_salary, doj, overtime_hours, bank_name, \
-        bank_account_number, ifsc_code, mobile_number, email = row
-        emp = Employee(emp_id, name, position, department, basic_salary, doj, overtime_hours, bank_name,
-                       bank_account_number, ifsc_code, mobile_number, email)
-        employees.append(emp)
+        employees.append(employee_from_row(row, plan))
     return employees
 
+@instrumented('db.fetch_employee_page', rows=len)
+def fetch_employee_page(after_emp_id=None, limit=EMPLOYEE_PAGE_SIZE):
+    cursor = db_cursor()
+    plan = current_pay_plan()
+    # Keyset pagination: each page is an index range scan on the primary key
+    if after_emp_id is None:
+        cursor.execute('SELECT * FROM employees ORDER BY emp_id LIMIT ?', (limit,))
+    else:
+        cursor.execute('SELECT * FROM employees WHERE emp_id > ? ORDER BY emp_id LIMIT ?', (after_emp_id, limit))
+    return [employee_from_row(row, plan) for row in cursor.fetchall()]
 
+def iter_employees(batch_size=1000):
+    after_emp_id = None
+    while True:
+        page = fetch_employee_page(after_emp_id, batch_size)
+        yield from page
+        if len(page) < batch_size:
+            return
+        after_emp_id = page[-1].emp_id
+
+def search_match_expression(query):
+    # Every word must match; only the last one, still being typed, as a prefix. Earlier words
+    # stay exact because a short prefix can expand to a very large number of index terms
+    words = re.findall(r'\w+', query)
+    return ' '.join([f'"{word}"' for word in words[:-1]] + [f'"{words[-1]}"*'])
+
+@instrumented('db.search_employees', rows=len)
+def search_employees(query, limit=EMPLOYEE_SEARCH_LIMIT):
+    cursor = db_cursor()
+    query = query.strip()
+    if not re.search(r'\w', query):
+        return []
+    plan = current_pay_plan()
+    rows = []
+    if query.isascii() and query.isdigit():
+        # An employee ID, or the start of a mobile or bank account number: one primary key lookup
+        # and two index range scans. A number too long for SQLite's 64-bit integers is no employee ID
+        upper = query[:-1] + chr(ord(query[-1]) + 1)
+        if int(query) < 2 ** 63:
+            rows.extend(cursor.execute('SELECT * FROM employees WHERE emp_id = ?', (int(query),)).fetchall())
+        for column in ('mobile_number', 'bank_account_number'):
+            cursor.execute(f'SELECT * FROM employees WHERE {column} >= ? AND {column} < ? ORDER BY {column} LIMIT ?',
+                           (query, upper, limit))
+            rows.extend(cursor.fetchall())
+    if cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'employees_fts'").fetchone() is not None:
+        cursor.execute('''
+            SELECT employees.* FROM employees_fts JOIN employees ON employees.emp_id = employees_fts.rowid
+            WHERE employees_fts MATCH ? LIMIT ?
+        ''', (search_match_expression(query), limit))
+    else:
+        pattern = f"%{query}%"
+        cursor.execute('''
+            SELECT * FROM employees
+            WHERE name LIKE ? OR email LIKE ? OR position LIKE ? OR department LIKE ? LIMIT ?
+        ''', (pattern, pattern, pattern, pattern, limit))
+    rows.extend(cursor.fetchall())
+    employees = {}
+    for row in rows:
+        if row[0] not in employees and len(employees) < limit:
+            employees[row[0]] = employee_from_row(row, plan)
+    return list(employees.values())
+
+
+def column_property(column):
+    return property(lambda row: row.table.columns[column][row.index])
+
+def coded_column_property(column):
+    return property(lambda row: row.table.vocabularies[column][row.table.columns[column][row.index]])
+
+class EmployeeRow:
+    # Lightweight view of one row of an EmployeeTable, usable wherever an Employee is read
+    __slots__ = ('table', 'index')
+
+    def __init__(self, table, index):
+        self.table = table
+        self.index = index
+
+    @property
+    def allowances(self):
+        return self.table.plan.components_for(self.emp_id, self.department, self.position, self.basic_salary)[0]
+
+    @property
+    def deductions(self):
+        return self.table.plan.components_for(self.emp_id, self.department, self.position, self.basic_salary)[1]
+
+    emp_id = column_property('emp_id')
+    name = column_property('name')
+    position = coded_column_property('position')
+    department = coded_column_property('department')
+    basic_salary = column_property('basic_salary')
+    doj = column_property('doj')
+    overtime_hours = column_property('overtime_hours')
+    bank_name = coded_column_property('bank_name')
+    bank_account_number = column_property('bank_account_number')
+    ifsc_code = column_property('ifsc_code')
+    mobile_number = column_property('mobile_number')
+    email = column_property('email')
+
+    def to_employee(self):
+        return Employee(self.emp_id, self.name, self.position, self.department, self.basic_salary, self.doj,
+                        self.overtime_hours, self.bank_name, self.bank_account_number, self.ifsc_code,
+                        self.mobile_number, self.email, self.allowances, self.deductions)
+
+class EmployeeTable:
+    # Column-oriented employee store: numbers in typed arrays, repeated text as codes into a vocabulary
+    coded_columns = ('position', 'department', 'bank_name')
+
+    def __init__(self, plan=None):
+        self.plan = plan or PayPlan.from_defaults()
+        self.columns = {
+            'emp_id': array('q'),
+            'name': [],
+            'position': array('I'),
+            'department': array('I'),
+            'basic_salary': array('d'),
+            'doj': [],
+            'overtime_hours': array('q'),
+            'bank_name': array('I'),
+            'bank_account_number': [],
+            'ifsc_code': [],
+            'mobile_number': [],
+            'email': [],
+        }
+        self.vocabularies = {column: [] for column in self.coded_columns}
+        self.codes = {column: {} for column in self.coded_columns}
+
+    def append(self, row):
+        for column, value in zip(self.columns, row):
+            if column in self.codes:
+                codes = self.codes[column]
+                code = codes.get(value)
+                if code is None:
+                    code = codes[value] = len(codes)
+                    self.vocabularies[column].append(value)
+                value = code
+            elif column == 'basic_salary':
+                value = float(value)
+            elif column == 'overtime_hours':
+                value = int(value)
+            self.columns[column].append(value)
+
+    def __len__(self):
+        return len(self.columns['emp_id'])
+
+    def __getitem__(self, index):
+        if not -len(self) <= index < len(self):
+            raise IndexError("EmployeeTable index out of range")
+        return EmployeeRow(self, index % len(self))
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield EmployeeRow(self, index)
+
+@instrumented('db.fetch_employee_table', rows=len)
+def fetch_employee_table(batch_size=10000):
+    cursor = db_cursor()
+    table = EmployeeTable(current_pay_plan())
+    cursor.execute('SELECT * FROM employees')
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            return table
+        for row in rows:
+            table.append(row)
+
+
+@instrumented('db.update_employee')
 def update_employee(emp_id, new_employee_data):
     try:
-        cursor.execute('''
-            UPDATE employees
-            SET name = ?, position = ?, department = ?, basic_salary = ?, doj = ?, overtime_hours = ?,
-            bank_name = ?, bank_account_number = ?, ifsc_code = ?, mobile_number = ?, email = ?
-            WHERE emp_id = ?
-        ''', (new_employee_data['name'], new_employee_data['position'],
-              new_employee_data['department'], new_employee_data['basic_salary'], new_employee_data['doj'],
-              new_employee_data['overtime_hours'], new_employee_data['bank_name'],
-              new_employee_data['bank_account_number'], new_employee_data['ifsc_code'],
-              new_employee_data['mobile_number'], new_employee_data['email'], emp_id))
-        conn.commit()
+        # The form's text is stored as the validated values: salary a number, overtime a whole number
+        employee = employee_from_record(new_employee_data)
+        with transaction() as cursor:
+            check_employee_duplicates(cursor, employee, emp_id)
+            cursor.execute('''
+                UPDATE employees
+                SET name = ?, position = ?, department = ?, basic_salary = ?, doj = ?, overtime_hours = ?,
+                bank_name = ?, bank_account_number = ?, ifsc_code = ?, mobile_number = ?, email = ?
+                WHERE emp_id = ?
+            ''', employee_insert_params(employee) + (emp_id,))
+        employee_cache.invalidate(emp_id)
         messagebox.showinfo("Success", "Employee data updated successfully.")
-    except sqlite3.Error as e:
+    except (sqlite3.Error, ValueError) as e:
         messagebox.showerror("Error", str(e))
 
+@instrumented('db.delete_employee')
 def delete_employee_from_db(emp_id):
     try:
-        cursor.execute('DELETE FROM employees WHERE emp_id = ?', (emp_id,))
-        conn.commit()
+        with transaction() as cursor:
+            cursor.execute('DELETE FROM employees WHERE emp_id = ?', (emp_id,))
+        employee_cache.invalidate(emp_id)
         messagebox.showinfo("Success", "Employee deleted successfully.")
     except sqlite3.Error as e:
         messagebox.showerror("Error", str(e))
 
-def calculate_net_salary(employee):
+# One row of pay_rules
+PayRule = namedtuple('PayRule', ['rule_id', 'name', 'kind', 'method', 'amount', 'slabs',
+                                 'department', 'position', 'emp_id'])
+PAY_RULE_KINDS = ('allowance', 'deduction')
+PAY_RULE_METHODS = ('fixed', 'percent_of_basic', 'slab')
+
+def parse_slabs(slabs):
+    # [[from_salary, percent], ...] -> [(lower, upper, rate), ...] with the last bracket open-ended
+    brackets = json.loads(slabs) if isinstance(slabs, str) else slabs
+    if not brackets:
+        raise ValueError("A slab rule needs at least one bracket.")
+    lowers = [float(lower) for lower, _ in brackets]
+    if lowers != sorted(lowers) or len(set(lowers)) != len(lowers) or lowers[0] < 0:
+        raise ValueError("Slab brackets must start at 0 or more and increase.")
+    uppers = lowers[1:] + [math.inf]
+    return [(lower, upper, float(percent) / 100) for lower, upper, (_, percent) in zip(lowers, uppers, brackets)]
+
+def rule_specificity(rule):
+    # An employee rule beats a department rule, which beats a position rule, which beats a global rule
+    return (rule.emp_id is not None) * 4 + (rule.department is not None) * 2 + (rule.position is not None)
+
+class PayPlan:
+    # Pay rules compiled for a payroll run: which rule wins for each component is resolved once per
+    # department/position (or employee) and the rule values are evaluated per employee, or per column
+    def __init__(self, rules):
+        self.rules = sorted(rules, key=lambda rule: rule.rule_id)
+        order = {}
+        for rule in self.rules:
+            order.setdefault((rule.kind, rule.name), len(order))
+        self.component_order = list(order)
+        self.slabs = {rule.rule_id: parse_slabs(rule.slabs) for rule in self.rules if rule.method == 'slab'}
+        self.employee_ids = frozenset(rule.emp_id for rule in self.rules if rule.emp_id is not None)
+        self.resolved = {}
+        self.shared = {}
+
+    @classmethod
+    def from_defaults(cls):
+        components = [('allowance', name, amount) for name, amount in DEFAULT_ALLOWANCES.items()] + \
+                     [('deduction', name, amount) for name, amount in DEFAULT_DEDUCTIONS.items()]
+        return cls([PayRule(rule_id, name, kind, 'fixed', float(amount), None, None, None, None)
+                    for rule_id, (kind, name, amount) in enumerate(components, 1)])
+
+    def resolve(self, emp_id, department, position):
+        key = (emp_id if emp_id in self.employee_ids else None, department, position)
+        resolved = self.resolved.get(key)
+        if resolved is None:
+            best = {}
+            for rule in self.rules:
+                if rule.emp_id not in (None, key[0]) or rule.department not in (None, department) or \
+                        rule.position not in (None, position):
+                    continue
+                component = (rule.kind, rule.name)
+                # On equal specificity the later rule wins
+                if component not in best or rule_specificity(rule) >= rule_specificity(best[component]):
+                    best[component] = rule
+            resolved = self.resolved[key] = tuple(best[component] for component in self.component_order
+                                                  if component in best)
+        return resolved
+
+    def rule_value(self, rule, basic_salary):
+        if rule.method == 'fixed':
+            return rule.amount
+        if rule.method == 'percent_of_basic':
+            return basic_salary * (rule.amount / 100)
+        amount = 0.0
+        for lower, upper, rate in self.slabs[rule.rule_id]:
+            amount += max(0.0, min(basic_salary, upper) - lower) * rate
+        return amount
+
+    def rule_values(self, rule, basic_salary):
+        # Column version of rule_value, same operation order so both give identical results
+        import numpy as np
+        if rule.method == 'percent_of_basic':
+            return basic_salary * (rule.amount / 100)
+        amount = np.zeros(len(basic_salary))
+        for lower, upper, rate in self.slabs[rule.rule_id]:
+            amount += np.maximum(0.0, np.minimum(basic_salary, upper) - lower) * rate
+        return amount
+
+    def components_for(self, emp_id, department, position, basic_salary):
+        resolved = self.resolve(emp_id, department, position)
+        shared = self.shared.get(resolved)
+        if shared is not None:
+            return shared
+        allowances = {}
+        deductions = {}
+        for rule in resolved:
+            components = allowances if rule.kind == 'allowance' else deductions
+            components[rule.name] = self.rule_value(rule, basic_salary)
+        if all(rule.method == 'fixed' for rule in resolved):
+            # Fixed amounts don't depend on the employee, so one read-only table serves the whole group
+            shared = self.shared[resolved] = (MappingProxyType(allowances), MappingProxyType(deductions))
+            return shared
+        return allowances, deductions
+
+    def component_totals(self, columns):
+        # Allowance and deduction totals for every employee in a PayrollColumns: each rule is evaluated
+        # once over the employees it wins for, so the cost is linear in employees times rules
+        import numpy as np
+        count = len(columns.emp_ids)
+        position_count = max(len(columns.positions), 1)
+        groups, group_index = np.unique(columns.department_codes * position_count + columns.position_codes,
+                                        return_inverse=True)
+        group_rules = [self.resolve(None, columns.departments[group // position_count],
+                                    columns.positions[group % position_count]) for group in groups.tolist()]
+        totals = {'allowance': np.zeros(count), 'deduction': np.zeros(count)}
+        for component in self.component_order:
+            winners = {}
+            for group, resolved in enumerate(group_rules):
+                for rule in resolved:
+                    if (rule.kind, rule.name) == component:
+                        winners.setdefault(rule, []).append(group)
+            if not winners:
+                continue
+            values = np.zeros(count)
+            for rule, rule_groups in winners.items():
+                if len(rule_groups) == len(group_rules):
+                    mask = slice(None)
+                else:
+                    group_mask = np.zeros(len(group_rules), dtype=bool)
+                    group_mask[rule_groups] = True
+                    mask = group_mask[group_index]
+                values[mask] = rule.amount if rule.method == 'fixed' else self.rule_values(rule, columns.basic_salary[mask])
+            totals[component[0]] += values
+        if self.employee_ids:
+            # Employees with rules of their own are few, they are worked out one by one
+            for index in np.flatnonzero(np.isin(columns.emp_ids, list(self.employee_ids))).tolist():
+                allowances, deductions = self.components_for(
+                    int(columns.emp_ids[index]), columns.departments[columns.department_codes[index]],
+                    columns.positions[columns.position_codes[index]], float(columns.basic_salary[index]))
+                totals['allowance'][index] = sum(allowances.values())
+                totals['deduction'][index] = sum(deductions.values())
+        return totals['allowance'], totals['deduction']
+
+    def rule_sql(self, rule):
+        if rule.method == 'fixed':
+            return '?', [rule.amount]
+        if rule.method == 'percent_of_basic':
+            return 'basic_salary * ?', [rule.amount / 100]
+        terms = []
+        params = []
+        for lower, upper, rate in self.slabs[rule.rule_id]:
+            if upper == math.inf:
+                terms.append('MAX(0.0, basic_salary - ?) * ?')
+                params.extend([lower, rate])
+            else:
+                terms.append('MAX(0.0, MIN(basic_salary, ?) - ?) * ?')
+                params.extend([upper, lower, rate])
+        return ' + '.join(terms), params
+
+    def component_sql(self):
+        # SQL expressions for the allowance and deduction totals of an employees row, with their parameters
+        expressions = {'allowance': ([], []), 'deduction': ([], [])}
+        for component in self.component_order:
+            rules = sorted((rule for rule in self.rules if (rule.kind, rule.name) == component),
+                           key=lambda rule: (rule_specificity(rule), rule.rule_id), reverse=True)
+            cases, params = expressions[component[0]]
+            whens = []
+            for rule in rules:
+                conditions = []
+                for column in ('emp_id', 'department', 'position'):
+                    if getattr(rule, column) is not None:
+                        conditions.append(f'{column} = ?')
+                        params.append(getattr(rule, column))
+                value_sql, value_params = self.rule_sql(rule)
+                whens.append(f"WHEN {' AND '.join(conditions) or '1'} THEN {value_sql}")
+                params.extend(value_params)
+            cases.append(f"(CASE {' '.join(whens)} ELSE 0.0 END)")
+        (allowance_cases, allowance_params), (deduction_cases, deduction_params) = \
+            expressions['allowance'], expressions['deduction']
+        return (' + '.join(allowance_cases) or '0.0', allowance_params,
+                ' + '.join(deduction_cases) or '0.0', deduction_params)
+
+def fetch_pay_rules():
+    cursor = db_cursor()
+    cursor.execute('''
+        SELECT rule_id, name, kind, method, amount, slabs, department, position, emp_id
+        FROM pay_rules ORDER BY rule_id
+    ''')
+    return [PayRule(*row) for row in cursor.fetchall()]
+
+# The compiled plan for the current database, recompiled when pay_rules_version moves
+pay_plan_cache = {}
+
+def current_pay_plan():
+    cursor = db_cursor()
+    try:
+        (version,) = cursor.execute('SELECT version FROM pay_rules_version').fetchone()
+    except sqlite3.OperationalError:
+        # No rule tables yet (create_employee_table() not run), the built-in components apply
+        return PayPlan.from_defaults()
+    key = (DB_PATH, version)
+    plan = pay_plan_cache.get(key)
+    if plan is None:
+        plan = PayPlan(fetch_pay_rules())
+        # Cached employees carry components from the rules they were read with
+        employee_cache.clear()
+        pay_plan_cache.clear()
+        pay_plan_cache[key] = plan
+    return plan
+
+def add_pay_rule(name, kind, method, amount=0.0, slabs=None, department=None, position=None, emp_id=None):
+    if not name:
+        raise ValueError("Pay rule name cannot be empty.")
+    if kind not in PAY_RULE_KINDS:
+        raise ValueError(f"Pay rule kind must be one of {', '.join(PAY_RULE_KINDS)}.")
+    if method not in PAY_RULE_METHODS:
+        raise ValueError(f"Pay rule method must be one of {', '.join(PAY_RULE_METHODS)}.")
+    if amount < 0:
+        raise ValueError("Pay rule amount cannot be negative.")
+    if method == 'slab':
+        slabs = json.dumps(slabs) if not isinstance(slabs, str) else slabs
+        if any(rate < 0 for _, _, rate in parse_slabs(slabs)):
+            raise ValueError("Slab percentages cannot be negative.")
+    else:
+        slabs = None
+    with transaction() as cursor:
+        cursor.execute('''
+            INSERT INTO pay_rules (name, kind, method, amount, slabs, department, position, emp_id)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (name, kind, method, float(amount), slabs, department, position, emp_id))
+        rule_id = cursor.lastrowid
+    employee_cache.clear()
+    return rule_id
+
+def remove_pay_rule(rule_id):
+    with transaction() as cursor:
+        cursor.execute('DELETE FROM pay_rules WHERE rule_id = ?', (rule_id,))
+        removed = cursor.rowcount
+    employee_cache.clear()
+    return removed > 0
+
+def bulk_update_filter(cursor, departments=None, positions=None, emp_ids=None):
+    # WHERE clause and parameters; an ID list goes through a temporary table so its size is not limited
+    conditions = []
+    params = []
+    if departments:
+        conditions.append(f"department IN ({', '.join('?' * len(departments))})")
+        params.extend(departments)
+    if positions:
+        conditions.append(f"position IN ({', '.join('?' * len(positions))})")
+        params.extend(positions)
+    if emp_ids:
+        cursor.execute('CREATE TEMP TABLE IF NOT EXISTS bulk_emp_ids (emp_id INTEGER PRIMARY KEY)')
+        cursor.execute('DELETE FROM temp.bulk_emp_ids')
+        cursor.executemany('INSERT OR IGNORE INTO temp.bulk_emp_ids (emp_id) VALUES (?)',
+                           ((int(emp_id),) for emp_id in emp_ids))
+        conditions.append('emp_id IN (SELECT emp_id FROM temp.bulk_emp_ids)')
+    return ' AND '.join(conditions) or '1', params
+
+def check_bulk_update(action, value):
+    if action not in BULK_UPDATE_ACTIONS:
+        raise ValueError(f"Unknown bulk update '{action}'.")
+    if not math.isfinite(value):
+        raise ValueError(f"The bulk update value must be a finite number, not {value}.")
+    if action == 'raise_salary' and value <= -100:
+        raise ValueError("A salary revision cannot take salaries to zero or below.")
+    if action == 'raise_salary' and value > BULK_UPDATE_MAX_RAISE_PERCENT:
+        raise ValueError(f"A salary revision cannot be more than {BULK_UPDATE_MAX_RAISE_PERCENT}%.")
+    if action == 'set_overtime' and (value < 0 or value != int(value)):
+        raise ValueError("Overtime hours must be a whole number, zero or more.")
+    if action == 'set_overtime' and value > BULK_UPDATE_MAX_OVERTIME_HOURS:
+        raise ValueError(f"Overtime hours cannot be more than {BULK_UPDATE_MAX_OVERTIME_HOURS}.")
+    return BULK_UPDATE_ACTIONS[action]
+
+def preview_bulk_update(action, value, departments=None, positions=None, emp_ids=None):
+    column, new_value_sql = check_bulk_update(action, value)
+    with transaction() as cursor:
+        where, params = bulk_update_filter(cursor, departments, positions, emp_ids)
+        rows, current_total, new_total = cursor.execute(
+            f'SELECT COUNT(*), TOTAL({column}), TOTAL({new_value_sql}) FROM employees WHERE {where}',
+            [value] + params).fetchone()
+    return {'rows': rows, 'column': column, 'current_total': current_total, 'new_total': new_total}
+
+@instrumented('db.bulk_update_employees', rows=lambda result: result['rows'])
+def bulk_update_employees(action, value, departments=None, positions=None, emp_ids=None, note=None):
+    # One set-based UPDATE in one transaction, with the before and after values kept in the audit tables
+    column, new_value_sql = check_bulk_update(action, value)
+    filters = {'departments': list(departments or []), 'positions': list(positions or []),
+               'emp_ids': [int(emp_id) for emp_id in emp_ids or []]}
+    with transaction() as cursor:
+        where, params = bulk_update_filter(cursor, departments, positions, emp_ids)
+        cursor.execute('''
+            INSERT INTO employee_audit_log (changed_at, action, value, filter, rows, note) VALUES (?, ?, ?, ?, 0, ?)
+        ''', (datetime.now().isoformat(timespec='seconds'), action, value, json.dumps(filters), note))
+        audit_id = cursor.lastrowid
+        cursor.execute(f'''
+            INSERT INTO employee_audit_changes (audit_id, emp_id, old_value, new_value)
+            SELECT ?, emp_id, {column}, {new_value_sql} FROM employees WHERE {where}
+        ''', [audit_id, value] + params)
+        rows = cursor.rowcount
+        if rows > BULK_UPDATE_REBUILD_ROWS:
+            # Cheaper to rebuild the stored payroll than to queue this many changed employees
+            cursor.execute('DELETE FROM payroll_snapshot')
+        cursor.execute(f'UPDATE employees SET {column} = {new_value_sql} WHERE {where}', [value] + params)
+        cursor.execute('UPDATE employee_audit_log SET rows = ? WHERE audit_id = ?', (rows, audit_id))
+    employee_cache.clear()
+    return {'audit_id': audit_id, 'rows': rows}
+
+def fetch_employee_groups():
+    # Department and position names for the bulk update filters
+    cursor = db_cursor()
+    departments = [name for (name,) in cursor.execute('SELECT DISTINCT department FROM employees ORDER BY department')]
+    positions = [name for (name,) in cursor.execute('SELECT DISTINCT position FROM employees ORDER BY position')]
+    return departments, positions
+
+# Overtime paid for a period: the employee's timesheet overtime when they have timesheets in the period,
+# even if it comes to no hours, else the hours entered for them. The employee row is never changed by
+# timesheets
+def payroll_overtime_sql(cursor, period=None):
+    # (SQL expression over employees, its parameters); periods without timesheets read the column alone
+    period = period or current_period()
+    if cursor.execute('SELECT 1 FROM timesheet_overtime WHERE period = ? LIMIT 1', (period,)).fetchone() is None:
+        return 'overtime_hours', []
+    return (f'IFNULL((SELECT {TIMESHEET_OVERTIME_HOURS_SQL} FROM timesheet_overtime '
+            f'WHERE period = ? AND emp_id = employees.emp_id), overtime_hours)', [period])
+
+def fetch_timesheet_overtime(period=None, emp_ids=None, chunk_size=VALIDATION_QUERY_CHUNK_SIZE):
+    # {emp_id: overtime hours} of the employees with timesheets in the period, or of those among emp_ids
+    cursor = db_cursor()
+    period = period or current_period()
+    if emp_ids is None:
+        cursor.execute(f'SELECT emp_id, {TIMESHEET_OVERTIME_HOURS_SQL} FROM timesheet_overtime WHERE period = ?',
+                       (period,))
+        return dict(cursor.fetchall())
+    emp_ids = list(emp_ids)
+    found = {}
+    for start in range(0, len(emp_ids), chunk_size):
+        chunk = emp_ids[start:start + chunk_size]
+        cursor.execute(f"SELECT emp_id, {TIMESHEET_OVERTIME_HOURS_SQL} FROM timesheet_overtime "
+                       f"WHERE period = ? AND emp_id IN ({', '.join('?' * len(chunk))})", [period] + chunk)
+        found.update(cursor.fetchall())
+    return found
+
+def paid_overtime_hours(employee, timesheet_overtime):
+    # timesheet_overtime is fetch_timesheet_overtime()'s result for the period being paid
+    return timesheet_overtime.get(employee.emp_id, employee.overtime_hours)
+
+def calculate_net_salary(employee, overtime_hours):
+    # overtime_hours is the overtime paid for the period, see paid_overtime_hours()
     total_allowances = sum(employee.allowances.values())
     total_deductions = sum(employee.deductions.values())
-    overtime_pay = employee.overtime_hours * (employee.basic_salary / 173)
+    overtime_pay = overtime_hours * (employee.basic_salary / OVERTIME_HOURS_PER_MONTH)
     net_salary = employee.basic_salary + overtime_pay + total_allowances - total_deductions
     return net_salary
 
 
-def process_payroll():
+# Column-wise payroll inputs, department/position are stored as codes into the name lists
+PayrollColumns = namedtuple('PayrollColumns', ['emp_ids', 'department_codes', 'position_codes',
+                                               'basic_salary', 'overtime_hours', 'departments', 'positions'])
+
+@instrumented('db.fetch_payroll_columns', rows=lambda columns: len(columns.emp_ids))
+def fetch_payroll_columns(batch_size=10000, period=None):
+    cursor = db_cursor()
+    overtime_sql, overtime_params = payroll_overtime_sql(cursor, period)
+    cursor.execute(f'SELECT emp_id, department, position, basic_salary, {overtime_sql} FROM employees', overtime_params)
+    return build_payroll_columns(iter(lambda: cursor.fetchmany(batch_size), []))
+
+def build_payroll_columns(batches):
+    import numpy as np
+    emp_ids = array('q')
+    department_codes = array('q')
+    position_codes = array('q')
+    basic_salary = array('d')
+    overtime_hours = array('q')
+    departments = {}
+    positions = {}
+    for rows in batches:
+        for emp_id, department, position, salary, overtime in rows:
+            emp_ids.append(emp_id)
+            department_codes.append(departments.setdefault(department, len(departments)))
+            position_codes.append(positions.setdefault(position, len(positions)))
+            basic_salary.append(float(salary))
+            overtime_hours.append(int(overtime))
+    return PayrollColumns(np.frombuffer(emp_ids, dtype=np.int64),
+                          np.frombuffer(department_codes, dtype=np.int64),
+                          np.frombuffer(position_codes, dtype=np.int64),
+                          np.frombuffer(basic_salary, dtype=np.float64),
+                          np.frombuffer(overtime_hours, dtype=np.int64),
+                          list(departments), list(positions))
+
+def calculate_net_salaries(columns, plan=None, components=None):
+    # Same operation order as calculate_net_salary so results are bit-for-bit identical; components are
+    # the (allowances, deductions) totals when the caller already has them
+    total_allowances, total_deductions = components or (plan or current_pay_plan()).component_totals(columns)
+    overtime_pay = columns.overtime_hours * (columns.basic_salary / OVERTIME_HOURS_PER_MONTH)
+    return columns.basic_salary + overtime_pay + total_allowances - total_deductions
+
+def group_salary_totals(codes, net_salaries, names):
+    import numpy as np
+    totals = np.bincount(codes, weights=net_salaries, minlength=len(names))
+    return dict(zip(names, totals.tolist()))
+
+@instrumented('payroll.batch', rows=lambda result: len(result[0]))
+def compute_payroll_batch(period=None):
+    columns = fetch_payroll_columns(period=period)
+    with span('payroll.batch.net_salaries'):
+        net_salaries = calculate_net_salaries(columns)
+    with span('payroll.batch.totals'):
+        payroll_data = dict(zip(columns.emp_ids.tolist(), net_salaries.tolist()))
+        department_wise_salary = group_salary_totals(columns.department_codes, net_salaries, columns.departments)
+        position_wise_salary = group_salary_totals(columns.position_codes, net_salaries, columns.positions)
+    return payroll_data, department_wise_salary, position_wise_salary
+
+@instrumented('payroll.employee', rows=lambda result: len(result[0]))
+def compute_payroll_by_employee():
     employees = fetch_all_employees()
+    timesheet_overtime = fetch_timesheet_overtime()
     payroll_data = {}
     department_wise_salary = {}  # To store department-wise salary totals
     position_wise_salary = {}    # To store position-wise salary totals
 
     for emp in employees:
-        net_salary = calculate_net_salary(emp)
+        net_salary = calculate_net_salary(emp, paid_overtime_hours(emp, timesheet_overtime))
         payroll_data[emp.emp_id] = net_salary
 
         # Accumulate salary based on department
@@ -163,49 +2016,721 @@ def process_payroll():
             position_wise_salary[position] += net_salary
         else:
             position_wise_salary[position] = net_salary
+    return payroll_data, department_wise_salary, position_wise_salary
 
-       # Create a single Figure with two subplots
-    fig, (ax1, ax2) = plt.subplots(1,2, figsize=(4,4))
 
-    # Create department-wise salary bar chart
-    departments = list(department_wise_salary.keys())
-    department_salaries = list(department_wise_salary.values())
+@instrumented('payroll.sql')
+def fetch_payroll_aggregates():
+    cursor = db_cursor()
+    allowances_sql, allowance_params, deductions_sql, deduction_params = current_pay_plan().component_sql()
+    overtime_sql, overtime_params = payroll_overtime_sql(cursor)
+    # One pass over the covering index, folded into department and position totals here
+    cursor.execute(f'''
+        SELECT department, position,
+               SUM(basic_salary + {overtime_sql} * (basic_salary / ?) + ({allowances_sql}) - ({deductions_sql}))
+        FROM employees
+        GROUP BY department, position
+    ''', overtime_params + [float(OVERTIME_HOURS_PER_MONTH)] + allowance_params + deduction_params)
+    department_wise_salary = {}
+    position_wise_salary = {}
+    for department, position, total in cursor.fetchall():
+        department_wise_salary[department] = department_wise_salary.get(department, 0) + total
+        position_wise_salary[position] = position_wise_salary.get(position, 0) + total
+    return department_wise_salary, position_wise_salary
 
-    ax1.bar(departments, department_salaries)
-    ax1.set_xlabel("Departments")
-    ax1.set_ylabel("Total Salary")
-    ax1.set_title("Department-wise Salary Distribution")
-    ax1.tick_params(axis='x', rotation=45)
+@instrumented('payroll.rebuild_snapshot', rows=lambda count: count)
+def rebuild_payroll_snapshot():
+    import numpy as np
+    period = current_period()
+    with transaction() as cursor:
+        columns = fetch_payroll_columns(period=period)
+        net_salaries = calculate_net_salaries(columns)
+        departments = [columns.departments[code] for code in columns.department_codes.tolist()]
+        positions = [columns.positions[code] for code in columns.position_codes.tolist()]
+        totals = []
+        for kind, codes, names in (('department', columns.department_codes, columns.departments),
+                                   ('position', columns.position_codes, columns.positions)):
+            sums = np.bincount(codes, weights=net_salaries, minlength=len(names)).tolist()
+            counts = np.bincount(codes, minlength=len(names)).tolist()
+            totals.extend(zip([kind] * len(names), names, sums, counts))
 
-    # Create position-wise salary bar chart
-    positions = list(position_wise_salary.keys())
-    position_salaries = list(position_wise_salary.values())
+        cursor.execute('DELETE FROM payroll_net_salaries')
+        cursor.execute('DELETE FROM payroll_totals')
+        cursor.execute('DELETE FROM payroll_changes')
+        cursor.executemany('INSERT INTO payroll_net_salaries (emp_id, department, position, net_salary) VALUES (?, ?, ?, ?)',
+                           zip(columns.emp_ids.tolist(), departments, positions, net_salaries.tolist()))
+        cursor.executemany('INSERT INTO payroll_totals (kind, name, total, employees) VALUES (?, ?, ?, ?)', totals)
+        cursor.execute('INSERT OR REPLACE INTO payroll_snapshot (id, built_at, period) VALUES (1, ?, ?)',
+                       (datetime.now().isoformat(timespec='seconds'), period))
+        return len(columns.emp_ids)
 
-    ax2.bar(positions, position_salaries)
-    ax2.set_xlabel("Positions")
-    ax2.set_ylabel("Total Salary")
-    ax2.set_title("Position-wise Salary Distribution")
-    ax2.tick_params(axis='x', rotation=45)
+@instrumented('payroll.apply_changes', rows=lambda count: count or 0)
+def apply_payroll_changes():
+    with transaction() as cursor:
+        row = cursor.execute('SELECT period FROM payroll_snapshot').fetchone()
+        # A new pay period brings other timesheet overtime, so the stored results are rebuilt once
+        if row is None or row[0] != current_period():
+            rebuild_payroll_snapshot()
+            return None
+        plan = current_pay_plan()
+        overtime_sql, overtime_params = payroll_overtime_sql(cursor, row[0])
+        changed_ids = [emp_id for (emp_id,) in cursor.execute('SELECT emp_id FROM payroll_changes').fetchall()]
+        deltas = {}
 
-    plt.tight_layout()
- 
+        def add_delta(kind, name, amount, employees):
+            delta = deltas.setdefault((kind, name), [0.0, 0])
+            delta[0] += amount
+            delta[1] += employees
+
+        for start in range(0, len(changed_ids), PAYROLL_CHANGE_CHUNK_SIZE):
+            chunk = changed_ids[start:start + PAYROLL_CHANGE_CHUNK_SIZE]
+            placeholders = ', '.join('?' * len(chunk))
+            # Take the previous contribution of each changed employee out of the totals ...
+            cursor.execute(f'SELECT department, position, net_salary FROM payroll_net_salaries WHERE emp_id IN ({placeholders})',
+                           chunk)
+            for department, position, net_salary in cursor.fetchall():
+                add_delta('department', department, -net_salary, -1)
+                add_delta('position', position, -net_salary, -1)
+            # ... and add the current one for those that still exist
+            cursor.execute(f'SELECT emp_id, department, position, basic_salary, {overtime_sql} FROM employees '
+                           f'WHERE emp_id IN ({placeholders})', overtime_params + chunk)
+            rows = cursor.fetchall()
+            net_salaries = calculate_net_salaries(build_payroll_columns([rows]), plan).tolist()
+            for (emp_id, department, position, _, _), net_salary in zip(rows, net_salaries):
+                add_delta('department', department, net_salary, 1)
+                add_delta('position', position, net_salary, 1)
+
+            cursor.execute(f'DELETE FROM payroll_net_salaries WHERE emp_id IN ({placeholders})', chunk)
+            cursor.executemany('INSERT INTO payroll_net_salaries (emp_id, department, position, net_salary) VALUES (?, ?, ?, ?)',
+                               [(row[0], row[1], row[2], net_salary) for row, net_salary in zip(rows, net_salaries)])
+            cursor.execute(f'DELETE FROM payroll_changes WHERE emp_id IN ({placeholders})', chunk)
+
+        cursor.executemany('''
+            INSERT INTO payroll_totals (kind, name, total, employees) VALUES (?, ?, ?, ?)
+            ON CONFLICT (kind, name) DO UPDATE SET total = total + excluded.total, employees = employees + excluded.employees
+        ''', [(kind, name, amount, employees) for (kind, name), (amount, employees) in deltas.items()])
+        cursor.execute('DELETE FROM payroll_totals WHERE employees <= 0')
+        return len(changed_ids)
+
+def fetch_payroll_totals():
+    cursor = db_cursor()
+    department_wise_salary = {}
+    position_wise_salary = {}
+    cursor.execute('SELECT kind, name, total FROM payroll_totals ORDER BY kind, name')
+    for kind, name, total in cursor.fetchall():
+        if kind == 'department':
+            department_wise_salary[name] = total
+        else:
+            position_wise_salary[name] = total
+    return department_wise_salary, position_wise_salary
+
+def fetch_payroll_net_salaries():
+    cursor = db_cursor()
+    return dict(cursor.execute('SELECT emp_id, net_salary FROM payroll_net_salaries').fetchall())
+
+def compute_payroll_incremental(per_employee=False):
+    # The stored net salaries are only read out when asked for; they match the batch path exactly
+    with transaction():
+        apply_payroll_changes()
+        payroll_data = fetch_payroll_net_salaries() if per_employee else None
+        department_wise_salary, position_wise_salary = fetch_payroll_totals()
+    return payroll_data, department_wise_salary, position_wise_salary
+
+def verify_payroll_snapshot(rel_tol=1e-9):
+    # Compares the incrementally maintained results with a full recompute; returns the differences found
+    apply_payroll_changes()
+    payroll_data, department_wise_salary, position_wise_salary = compute_payroll_batch()
+    mismatches = []
+    stored = fetch_payroll_net_salaries()
+    for emp_id in payroll_data.keys() | stored.keys():
+        if payroll_data.get(emp_id) != stored.get(emp_id):
+            mismatches.append(('employee', emp_id, stored.get(emp_id), payroll_data.get(emp_id)))
+    for kind, expected, actual in zip(('department', 'position'), (department_wise_salary, position_wise_salary),
+                                      fetch_payroll_totals()):
+        for name in expected.keys() | actual.keys():
+            if name not in expected or name not in actual or \
+                    not math.isclose(actual[name], expected[name], rel_tol=rel_tol, abs_tol=1e-6):
+                mismatches.append((kind, name, actual.get(name), expected.get(name)))
+    return mismatches
+
+def current_period():
+    return datetime.now().strftime("%Y-%m")
+
+def previous_period(period):
+    year, month = map(int, period.split('-'))
+    return f"{year - 1}-12" if month == 1 else f"{year}-{month - 1:02d}"
+
+@instrumented('payroll.record_run', rows=lambda run: run['employees'])
+def record_payroll_run(period=None):
+    # Stores this period's payroll lines in one transaction, replacing an earlier run for the same period
+    period = period or current_period()
+    datetime.strptime(period, "%Y-%m")
+    with transaction() as cursor:
+        columns = fetch_payroll_columns(period=period)
+        total_allowances, total_deductions = current_pay_plan().component_totals(columns)
+        basic_salary = columns.basic_salary
+        overtime_pay = columns.overtime_hours * (basic_salary / OVERTIME_HOURS_PER_MONTH)
+        # Same operation order as calculate_net_salary, so net matches it exactly
+        gross = basic_salary + overtime_pay + total_allowances
+        net = gross - total_deductions
+        cursor.execute('DELETE FROM payroll_lines WHERE period = ?', (period,))
+        cursor.execute('DELETE FROM payroll_runs WHERE period = ?', (period,))
+        cursor.execute('''
+            INSERT INTO payroll_runs (period, run_at, employees, total_gross, total_net)
+            VALUES (?, ?, ?, ?, ?)
+        ''', (period, datetime.now().isoformat(timespec='seconds'), len(columns.emp_ids),
+              math.fsum(gross.tolist()), math.fsum(net.tolist())))
+        run_id = cursor.lastrowid
+        cursor.executemany('''
+            INSERT INTO payroll_lines (period, emp_id, run_id, department, position, basic_salary,
+                                       overtime_pay, allowances, gross, deductions, net)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', zip([period] * len(columns.emp_ids), columns.emp_ids.tolist(), [run_id] * len(columns.emp_ids),
+                 [columns.departments[code] for code in columns.department_codes.tolist()],
+                 [columns.positions[code] for code in columns.position_codes.tolist()],
+                 basic_salary.tolist(), overtime_pay.tolist(), total_allowances.tolist(),
+                 gross.tolist(), total_deductions.tolist(), net.tolist()))
+    return {'run_id': run_id, 'period': period, 'employees': len(columns.emp_ids)}
+
+def fetch_year_to_date(year, emp_id=None):
+    periods = [f"{year}-{month:02d}" for month in range(1, 13)]
+    placeholders = ', '.join('?' * len(periods))
+    cursor = db_cursor()
+    if emp_id is not None:
+        # An IN list over the twelve periods turns into twelve primary-key lookups
+        cursor.execute(f'''
+            SELECT COUNT(*), SUM(gross), SUM(deductions), SUM(net) FROM payroll_lines
+            WHERE period IN ({placeholders}) AND emp_id = ?
+        ''', periods + [emp_id])
+        periods_paid, gross, deductions, net = cursor.fetchone()
+        return {'emp_id': emp_id, 'periods': periods_paid, 'gross': gross or 0.0,
+                'deductions': deductions or 0.0, 'net': net or 0.0}
+    cursor.execute(f'''
+        SELECT department, SUM(gross), SUM(deductions), SUM(net) FROM payroll_lines
+        WHERE period IN ({placeholders})
+        GROUP BY department
+    ''', periods)
+    return {department: {'gross': gross, 'deductions': deductions, 'net': net}
+            for department, gross, deductions, net in cursor.fetchall()}
+
+def fetch_period_over_period(period, earlier_period=None):
+    earlier_period = earlier_period or previous_period(period)
+    cursor = db_cursor()
+    cursor.execute('''
+        SELECT period, department, SUM(net), COUNT(*) FROM payroll_lines
+        WHERE period IN (?, ?)
+        GROUP BY period, department
+    ''', (period, earlier_period))
+    report = {}
+    for row_period, department, net, employees in cursor.fetchall():
+        entry = report.setdefault(department, {'current': 0.0, 'previous': 0.0, 'employees': 0, 'previous_employees': 0})
+        if row_period == period:
+            entry['current'], entry['employees'] = net, employees
+        else:
+            entry['previous'], entry['previous_employees'] = net, employees
+    for entry in report.values():
+        entry['change'] = entry['current'] - entry['previous']
+    return earlier_period, report
+
+def read_only_connection(path):
+    return sqlite3.connect(f"file:{quote(os.path.abspath(path))}?mode=ro", uri=True, timeout=DB_TIMEOUT)
+
+def payroll_shards(shards, shard_by):
+    # (WHERE clause, parameters) for each shard
+    cursor = db_cursor()
+    if shard_by == 'department':
+        # Largest departments first, each to the shard with the fewest employees so far
+        counts = cursor.execute('SELECT department, COUNT(*) FROM employees GROUP BY department ORDER BY 2 DESC').fetchall()
+        buckets = [[0, []] for _ in range(min(shards, len(counts)))]
+        for department, count in counts:
+            bucket = min(buckets, key=lambda bucket: bucket[0])
+            bucket[0] += count
+            bucket[1].append(department)
+        return [(f"department IN ({', '.join('?' * len(names))})", names) for _, names in buckets]
+    if shard_by != 'emp_id':
+        raise ValueError(f"Unknown shard key '{shard_by}'.")
+    low, high = cursor.execute('SELECT MIN(emp_id), MAX(emp_id) FROM employees').fetchone()
+    if low is None:
+        return []
+    step = -(-(high - low + 1) // shards)
+    return [('emp_id >= ? AND emp_id < ?', (start, start + step)) for start in range(low, high + 1, step)]
+
+def compute_payroll_shard(db_path, rules, overtime, condition, params, batch_size=10000):
+    # Runs in a worker process, on its own read-only connection; overtime is payroll_overtime_sql()'s result
+    overtime_sql, overtime_params = overtime
+    conn = read_only_connection(db_path)
+    try:
+        cursor = conn.execute(f'SELECT emp_id, department, position, basic_salary, {overtime_sql} FROM employees '
+                              f'WHERE {condition}', list(overtime_params) + list(params))
+        columns = build_payroll_columns(iter(lambda: cursor.fetchmany(batch_size), []))
+    finally:
+        conn.close()
+    net_salaries = calculate_net_salaries(columns, PayPlan(rules))
+    return (columns.emp_ids, net_salaries,
+            group_salary_totals(columns.department_codes, net_salaries, columns.departments),
+            group_salary_totals(columns.position_codes, net_salaries, columns.positions))
+
+@instrumented('payroll.sharded', rows=lambda result: len(result[0]))
+def compute_payroll_sharded(workers=None, shard_by=None):
+    workers = workers or PAYROLL_SHARD_WORKERS or os.cpu_count() or 1
+    shards = payroll_shards(workers, shard_by or PAYROLL_SHARD_BY)
+    # Every worker applies the same pay rules, compiled from this snapshot of them
+    rules = current_pay_plan().rules
+    overtime = payroll_overtime_sql(db_cursor())
+    payroll_data = {}
+    department_wise_salary = {}
+    position_wise_salary = {}
+    # Spawned, not forked: the service and the GUI call this with other threads running, and a forked
+    # worker could inherit a lock one of them holds
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as executor:
+        futures = [executor.submit(compute_payroll_shard, DB_PATH, rules, overtime, condition, params)
+                   for condition, params in shards]
+        for future in futures:
+            emp_ids, net_salaries, department_totals, position_totals = future.result()
+            payroll_data.update(zip(emp_ids.tolist(), net_salaries.tolist()))
+            for totals, partial in ((department_wise_salary, department_totals), (position_wise_salary, position_totals)):
+                for name, total in partial.items():
+                    totals[name] = totals.get(name, 0) + total
+    return payroll_data, dict(sorted(department_wise_salary.items())), dict(sorted(position_wise_salary.items()))
+
+# Columnar snapshot layout: per-employee numbers, and the text columns stored as one UTF-8 blob
+# plus int64 end offsets (row i is data[offsets[i]:offsets[i + 1]])
+SNAPSHOT_NUMERIC_COLUMNS = [('emp_id', 'int64'), ('department_code', 'int32'), ('position_code', 'int32'),
+                            ('basic_salary', 'float64'), ('overtime_hours', 'int64'), ('total_allowances', 'float64'),
+                            ('total_deductions', 'float64'), ('net_salary', 'float64')]
+SNAPSHOT_TEXT_COLUMNS = ['name', 'doj', 'bank_name', 'bank_account_number', 'ifsc_code', 'mobile_number', 'email']
+
+class NpySnapshotWriter:
+    # One .npy file per numeric column, filled in place through a memory map; text columns are appended
+    # to a .utf8 file with their offsets in a .npy
+    def __init__(self, directory, rows):
+        from numpy.lib.format import open_memmap
+        self.numeric = {name: open_memmap(os.path.join(directory, f"{name}.npy"), mode='w+', dtype=dtype,
+                                          shape=(rows,))
+                        for name, dtype in SNAPSHOT_NUMERIC_COLUMNS}
+        self.text = {}
+        for name in SNAPSHOT_TEXT_COLUMNS:
+            offsets = open_memmap(os.path.join(directory, f"{name}.offsets.npy"), mode='w+', dtype='int64',
+                                  shape=(rows + 1,))
+            offsets[0] = 0
+            self.text[name] = (open(os.path.join(directory, f"{name}.utf8"), 'wb'), offsets)
+        self.rows = 0
+
+    def write(self, numeric, text):
+        import numpy as np
+        start, end = self.rows, self.rows + len(numeric['emp_id'])
+        for name, values in numeric.items():
+            self.numeric[name][start:end] = values
+        for name, values in text.items():
+            data, offsets = self.text[name]
+            encoded = [value.encode('utf-8') for value in values]
+            offsets[start + 1:end + 1] = offsets[start] + np.cumsum([len(value) for value in encoded])
+            data.write(b''.join(encoded))
+        self.rows = end
+
+    def close(self):
+        for column in self.numeric.values():
+            column.flush()
+        for data, offsets in self.text.values():
+            data.close()
+            offsets.flush()
+        self.numeric = self.text = None
+
+class ArrowSnapshotWriter:
+    # The same columns as one Arrow IPC file, a record batch per chunk of employees
+    def __init__(self, directory, rows):
+        import pyarrow as pa
+        self.pa = pa
+        self.schema = pa.schema([(name, pa.from_numpy_dtype(dtype)) for name, dtype in SNAPSHOT_NUMERIC_COLUMNS] +
+                                [(name, pa.string()) for name in SNAPSHOT_TEXT_COLUMNS])
+        self.sink = pa.OSFile(os.path.join(directory, 'employees.arrow'), 'wb')
+        self.writer = pa.ipc.new_file(self.sink, self.schema)
+        self.rows = 0
+
+    def write(self, numeric, text):
+        arrays = [self.pa.array(numeric[name], type=self.schema.field(name).type) for name, _ in SNAPSHOT_NUMERIC_COLUMNS]
+        arrays += [self.pa.array(text[name], type=self.pa.string()) for name in SNAPSHOT_TEXT_COLUMNS]
+        self.writer.write_batch(self.pa.record_batch(arrays, schema=self.schema))
+        self.rows += len(numeric['emp_id'])
+
+    def close(self):
+        self.writer.close()
+        self.sink.close()
+
+@instrumented('export.payroll_snapshot', rows=lambda manifest: manifest['rows'])
+def export_payroll_snapshot(path, snapshot_format=None, batch_size=SNAPSHOT_BATCH_SIZE):
+    # Writes the employees and their computed pay to the directory path, replacing it only once complete.
+    # Arrow IPC when pyarrow is installed, else the plain NumPy layout
+    import numpy as np
+    if snapshot_format is None:
+        try:
+            import pyarrow
+            snapshot_format = 'arrow'
+        except ImportError:
+            snapshot_format = 'npy'
+    if snapshot_format not in ('arrow', 'npy'):
+        raise ValueError(f"Unknown snapshot format '{snapshot_format}'.")
+    plan = current_pay_plan()
+    part_path = path + '.part'
+    shutil.rmtree(part_path, ignore_errors=True)
+    os.makedirs(part_path)
+    departments = {}
+    positions = {}
+    try:
+        # One read transaction, so the row count and the rows come from the same version of the table
+        with read_transaction() as cursor:
+            rows = cursor.execute('SELECT COUNT(*) FROM employees').fetchone()[0]
+            writer = (ArrowSnapshotWriter if snapshot_format == 'arrow' else NpySnapshotWriter)(part_path, rows)
+            # overtime_hours is the overtime paid this period, timesheet hours included
+            overtime_sql, overtime_params = payroll_overtime_sql(cursor)
+            cursor.execute(f"SELECT emp_id, department, position, basic_salary, {overtime_sql}, "
+                           f"{', '.join(SNAPSHOT_TEXT_COLUMNS)} FROM employees ORDER BY emp_id", overtime_params)
+            for batch in iter(lambda: cursor.fetchmany(batch_size), []):
+                columns = build_payroll_columns([[row[:5] for row in batch]])
+                total_allowances, total_deductions = plan.component_totals(columns)
+                department_codes = np.array([departments.setdefault(name, len(departments))
+                                             for name in columns.departments], dtype=np.int32)
+                position_codes = np.array([positions.setdefault(name, len(positions))
+                                           for name in columns.positions], dtype=np.int32)
+                numeric = {'emp_id': columns.emp_ids,
+                           'department_code': department_codes[columns.department_codes],
+                           'position_code': position_codes[columns.position_codes],
+                           'basic_salary': columns.basic_salary, 'overtime_hours': columns.overtime_hours,
+                           'total_allowances': total_allowances, 'total_deductions': total_deductions,
+                           'net_salary': calculate_net_salaries(columns,
+                                                                components=(total_allowances, total_deductions))}
+                text = {name: [row[index] for row in batch]
+                        for index, name in enumerate(SNAPSHOT_TEXT_COLUMNS, start=5)}
+                writer.write(numeric, text)
+            writer.close()
+    except BaseException:
+        shutil.rmtree(part_path, ignore_errors=True)
+        raise
+    manifest = {'format': snapshot_format, 'rows': writer.rows, 'exported_at': datetime.now().isoformat(timespec='seconds'),
+                'database': os.path.abspath(DB_PATH), 'departments': list(departments), 'positions': list(positions),
+                'numeric_columns': dict(SNAPSHOT_NUMERIC_COLUMNS), 'text_columns': SNAPSHOT_TEXT_COLUMNS}
+    with open(os.path.join(part_path, 'manifest.json'), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    shutil.rmtree(path, ignore_errors=True)
+    os.replace(part_path, path)
+    return manifest
+
+class SnapshotText:
+    # A text column of the NumPy layout, decoded one value at a time from the memory-mapped blob
+    def __init__(self, offsets, data):
+        self.offsets = offsets
+        self.data = data
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index):
+        start, end = self.offsets[index], self.offsets[index + 1]
+        return self.data[start:end].tobytes().decode('utf-8')
+
+class PayrollSnapshot:
+    # A snapshot opened through memory maps: nothing is read until a column is used, and the
+    # numeric columns are NumPy arrays backed directly by the file
+    def __init__(self, path):
+        with open(os.path.join(path, 'manifest.json'), encoding='utf-8') as f:
+            self.manifest = json.load(f)
+        self.path = path
+        self.rows = self.manifest['rows']
+        self.departments = self.manifest['departments']
+        self.positions = self.manifest['positions']
+        self.table = None
+        if self.manifest['format'] == 'arrow':
+            import pyarrow as pa
+            self.table = pa.ipc.open_file(pa.memory_map(os.path.join(path, 'employees.arrow'))).read_all()
+        self.columns = {}
+
+    def __getitem__(self, name):
+        if name not in self.columns:
+            self.columns[name] = self.load_column(name)
+        return self.columns[name]
+
+    def load_column(self, name):
+        import numpy as np
+        if self.table is not None:
+            column = self.table.column(name)
+            if name in self.manifest['text_columns']:
+                return column
+            # Zero-copy for a single record batch; several batches are joined into one array
+            chunks = [chunk.to_numpy(zero_copy_only=True) for chunk in column.chunks]
+            return chunks[0] if len(chunks) == 1 else np.concatenate(chunks)
+        if name in self.manifest['text_columns']:
+            offsets = np.load(os.path.join(self.path, f"{name}.offsets.npy"), mmap_mode='r')
+            data_path = os.path.join(self.path, f"{name}.utf8")
+            # np.memmap cannot map an empty file
+            data = np.memmap(data_path, dtype=np.uint8, mode='r') if os.path.getsize(data_path) else np.zeros(0, np.uint8)
+            return SnapshotText(offsets, data)
+        if name not in self.manifest['numeric_columns']:
+            raise KeyError(name)
+        return np.load(os.path.join(self.path, f"{name}.npy"), mmap_mode='r')
+
+@instrumented('payroll.snapshot')
+def compute_payroll_from_snapshot(path=None, per_employee=False):
+    # Totals from an exported snapshot instead of SQLite; per-employee results stay in the snapshot unless asked for
+    snapshot = PayrollSnapshot(path or PAYROLL_SNAPSHOT_PATH)
+    net_salaries = snapshot['net_salary']
+    payroll_data = dict(zip(snapshot['emp_id'].tolist(), net_salaries.tolist())) if per_employee else None
+    return (payroll_data, group_salary_totals(snapshot['department_code'], net_salaries, snapshot.departments),
+            group_salary_totals(snapshot['position_code'], net_salaries, snapshot.positions))
+
+@instrumented('payroll.compute')
+def compute_payroll(aggregation=None, per_employee=False, cancelled=None):
+    # The first element is the {emp_id: net_salary} results, or None when the mode only keeps totals
+    # and per_employee is not asked for. cancelled, if given, is polled while SQLite works and the run
+    # stops with JobCancelled once it returns true
+    if cancelled is not None:
+        with cancellable(cancelled):
+            return compute_payroll(aggregation, per_employee)
+    aggregation = aggregation or PAYROLL_AGGREGATION
+    if aggregation == 'incremental':
+        return compute_payroll_incremental(per_employee)
+    if aggregation == 'sql':
+        if per_employee:
+            return compute_payroll_batch()
+        # Per-employee results are never pulled out of SQLite in this mode
+        department_wise_salary, position_wise_salary = fetch_payroll_aggregates()
+        return None, department_wise_salary, position_wise_salary
+    if aggregation == 'batch':
+        return compute_payroll_batch()
+    if aggregation == 'sharded':
+        return compute_payroll_sharded()
+    if aggregation == 'snapshot':
+        return compute_payroll_from_snapshot(per_employee=per_employee)
+    if aggregation == 'employee':
+        return compute_payroll_by_employee()
+    raise ValueError(f"Unknown payroll aggregation mode '{aggregation}'.")
+
+
+class JobCancelled(Exception):
+    pass
+
+@contextmanager
+def cancellable(cancelled):
+    # Queries on this thread's connection are interrupted once cancelled() is true, and the block ends
+    # with JobCancelled however far it got
+    conn = current_db()[0]
+    conn.set_progress_handler(cancelled, BACKGROUND_CANCEL_CHECK_OPS)
+    try:
+        yield
+    except sqlite3.OperationalError:
+        if cancelled():
+            raise JobCancelled() from None
+        raise
+    finally:
+        conn.set_progress_handler(None, 0)
+    if cancelled():
+        raise JobCancelled()
+
+class BackgroundJob:
+    # Handed to each background task so it can report progress and notice a cancel request
+    def __init__(self, results, on_progress=None):
+        self.results = results
+        self.on_progress = on_progress
+        self.cancel_requested = threading.Event()
+        self.last_progress = 0.0
+
+    def cancel(self):
+        self.cancel_requested.set()
+
+    def cancelled(self):
+        return self.cancel_requested.is_set()
+
+    def report_progress(self, done, total):
+        if self.cancel_requested.is_set():
+            raise JobCancelled()
+        now = time.monotonic()
+        if self.on_progress and (done == total or now - self.last_progress >= BACKGROUND_PROGRESS_INTERVAL):
+            self.last_progress = now
+            self.results.put((self.on_progress, (done, total)))
+
+class BackgroundWorker:
+    # Runs task(job) on a thread pool and hands the callbacks back to the Tk thread through a queue
+    def __init__(self, root, workers=BACKGROUND_WORKERS):
+        self.root = root
+        # Each worker thread opens its own connection on first use through current_db()
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='payroll-worker')
+        self.results = queue.Queue()
+        self.jobs = set()
+        self.poll()
+
+    def submit(self, task, on_done=None, on_error=None, on_progress=None, on_cancelled=None):
+        job = BackgroundJob(self.results, on_progress)
+        self.jobs.add(job)
+
+        def run():
+            try:
+                result = task(job)
+            except JobCancelled:
+                callback, args = on_cancelled, ()
+            except Exception as e:
+                callback, args = on_error, (e,)
+            else:
+                callback, args = on_done, (result,)
+            self.results.put((lambda *args: self.jobs.discard(job), ()))
+            if callback:
+                self.results.put((callback, args))
+
+        self.executor.submit(run)
+        return job
+
+    def poll(self):
+        # Rescheduled even when a callback raises, or every later job would never report back
+        try:
+            while True:
+                try:
+                    callback, args = self.results.get_nowait()
+                except queue.Empty:
+                    break
+                callback(*args)
+        finally:
+            self.root.after(BACKGROUND_POLL_MS, self.poll)
+
+    def shutdown(self):
+        for job in list(self.jobs):
+            job.cancel()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+background_worker = None  # created by main() once the Tk root exists
+
+def run_in_background(title, task, on_done):
+    progress_window = tk.Toplevel()
+    progress_window.title(title)
+    progress_window.configure(bg="light blue")
+    status_label = tk.Label(progress_window, text="Working...", bg="light blue")
+    status_label.pack(padx=20, pady=10)
+    progress_bar = ttk.Progressbar(progress_window, length=300, mode='indeterminate')
+    progress_bar.pack(padx=20, pady=5)
+    progress_bar.start()
+
+    def on_progress(done, total):
+        if total:
+            progress_bar.stop()
+            progress_bar.configure(mode='determinate', maximum=total, value=done)
+            status_label.config(text=f"{done} / {total}")
+
+    def finish(callback):
+        def handler(*args):
+            progress_window.destroy()
+            if callback:
+                callback(*args)
+        return handler
+
+    def on_error(error):
+        messagebox.showerror("Error", str(error))
+
+    job = background_worker.submit(task, finish(on_done), finish(on_error), on_progress, finish(None))
+    cancel_button = tk.Button(progress_window, text="Cancel", command=job.cancel, fg='BLACK', bg='red')
+    cancel_button.pack(pady=10)
+    progress_window.protocol("WM_DELETE_WINDOW", job.cancel)
+    return job
+
+@instrumented('process_payroll')
+def process_payroll(aggregation=None):
+    # Always returns the per-employee results; the totals-only modes skip them only for the chart window
+    payroll_data, department_wise_salary, position_wise_salary = compute_payroll(aggregation, per_employee=True)
+    show_payroll_charts(department_wise_salary, position_wise_salary)
+    return payroll_data
+
+def process_payroll_in_background():
+    # The payroll computation runs on a worker, only the chart window is built on the Tk thread
+    run_in_background("Payroll Analysis", lambda job: compute_payroll(cancelled=job.cancelled),
+                      lambda result: show_payroll_charts(result[1], result[2]))
+
+class PayrollChart:
+    # One matplotlib Figure (outside pyplot, so nothing accumulates in its registry) reused for every
+    # Payroll Analysis: bars are updated in place, and nothing is redrawn when the totals are unchanged
+    def __init__(self):
+        from matplotlib.figure import Figure
+        self.figure = Figure(figsize=(4, 4))
+        self.axes = self.figure.subplots(1, 2)
+        self.titles = (("Departments", "Department-wise Salary Distribution"),
+                       ("Positions", "Position-wise Salary Distribution"))
+        self.bars = [None, None]
+        self.labels = [None, None]
+        self.data_hash = None
+        self.png_cache = None
+        self.window = None
+        self.canvas = None
+
+    def update(self, department_wise_salary, position_wise_salary):
+        # Returns whether anything changed and needs drawing
+        data = (tuple(department_wise_salary.items()), tuple(position_wise_salary.items()))
+        data_hash = hash(data)
+        if data_hash == self.data_hash:
+            return False
+        self.data_hash = data_hash
+        self.png_cache = None
+        relayout = False
+        for index, (ax, totals, (xlabel, title)) in enumerate(zip(self.axes, data, self.titles)):
+            labels = [name for name, _ in totals]
+            values = [total for _, total in totals]
+            if labels == self.labels[index]:
+                for bar, value in zip(self.bars[index], values):
+                    bar.set_height(value)
+                ax.relim()
+                ax.autoscale_view()
+                continue
+            # Different departments or positions: only then are the bars rebuilt
+            ax.clear()
+            self.bars[index] = ax.bar(labels, values)
+            self.labels[index] = labels
+            ax.set_xlabel(xlabel)
+            ax.set_ylabel("Total Salary")
+            ax.set_title(title)
+            ax.tick_params(axis='x', rotation=45)
+            relayout = True
+        if relayout:
+            self.figure.tight_layout()
+        return True
+
+    def png(self):
+        if self.png_cache is None:
+            buffer = io.BytesIO()
+            self.figure.savefig(buffer, format="png")
+            self.png_cache = buffer.getvalue()
+        return self.png_cache
+
+payroll_chart = None
+
+def show_payroll_charts(department_wise_salary, position_wise_salary):
+    from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+    global payroll_chart
+    if payroll_chart is None:
+        payroll_chart = PayrollChart()
+    chart = payroll_chart
+    changed = chart.update(department_wise_salary, position_wise_salary)
+
+    if chart.window is not None and chart.window.winfo_exists():
+        # The window is hidden rather than destroyed on close, so it comes back with its canvas
+        if changed:
+            chart.canvas.draw_idle()
+        chart.window.deiconify()
+        chart.window.lift()
+        return
 
     chart_window = tk.Toplevel()
     chart_window.title("Payroll Analysis")
     chart_window.geometry("600x600")
     heading_label = tk.Label(chart_window, text="Analysis of Salary", font=("Helvetica", 16, "bold"))
     heading_label.pack(pady=10)
-    payroll_canvas = FigureCanvasTkAgg(fig, chart_window)
+    payroll_canvas = FigureCanvasTkAgg(chart.figure, chart_window)
     payroll_canvas.draw()
     payroll_canvas.get_tk_widget().pack(fill=tk.BOTH, expand=True)
-    
+    chart.window = chart_window
+    chart.canvas = payroll_canvas
+
     def close_chart_window():
-        chart_window.destroy()
-        
+        chart_window.withdraw()
+
     def save_graphs():
         file_path = filedialog.asksaveasfilename(defaultextension=".png", filetypes=[("PNG files", "*.png")])
         if file_path:
-            fig.savefig(file_path, format="png")
+            with open(file_path, 'wb') as f:
+                f.write(chart.png())
 
     # Add a Download Graphs button to the chart window
     download_button = tk.Button(chart_window, text="Download Graphs", command=save_graphs,fg='BLACK' , bg='lightgreen')
@@ -213,8 +2738,8 @@ def process_payroll():
 
     close_button = tk.Button(chart_window, text="Close", command=close_chart_window,fg='BLACK' , bg='red')
     close_button.pack(pady=10)
+    chart_window.protocol("WM_DELETE_WINDOW", close_chart_window)
 
-    return payroll_data
 def display_employee_details(employee):
     message = (
         f"Employee ID: {employee.emp_id}\n"
@@ -238,7 +2763,111 @@ def display_employee_details(employee):
         message += f"  {deduction}: {amount}\n"
     messagebox.showinfo("Employee Details", message)
 
-def display_all_employees(employee_records):
+def pdf_font():
+    # A TrueType font (embedded, only the glyphs used) so names outside Latin-1 print as written;
+    # Helvetica, which only covers cp1252, when none is found
+    from reportlab.pdfbase import pdfmetrics
+    from reportlab.pdfbase.ttfonts import TTFont
+    for path in PDF_FONT_PATHS:
+        if path and os.path.exists(path):
+            if 'ReportFont' not in pdfmetrics.getRegisteredFontNames():
+                pdfmetrics.registerFont(TTFont('ReportFont', path))
+            return 'ReportFont'
+    return 'Helvetica'
+
+@instrumented('export.employee_list_pdf')
+def write_employee_list_pdf(file_path, progress=None, batch_size=EMPLOYEE_REPORT_BATCH_SIZE):
+    from reportlab.lib.pagesizes import letter
+    from reportlab.pdfgen import canvas
+    cursor = db_cursor()
+    total = cursor.execute('SELECT COUNT(*) FROM employees').fetchone()[0]
+    # Employees are streamed from the database and each page is closed with showPage() once full. Memory
+    # is not constant: the canvas keeps every finished page until save(), about 7-8 KB a page (some 75 MB
+    # for 10,000 pages). Compression only makes the file smaller, it is applied at save()
+    c = canvas.Canvas(file_path, pagesize=letter, pageCompression=1)
+    font = pdf_font()
+    line_height = 15  # Adjust this value to change line spacing
+    top, bottom = 750, 60  # First line, and the lowest a line may go
+    lines_per_page = (top - bottom) // line_height + 1
+    pages = 0
+    page = []
+
+    def finish_page(lines):
+        nonlocal pages
+        pages += 1
+        text = c.beginText(100, top)
+        text.setFont(font, 12, line_height)
+        text.textLines(lines)
+        c.drawText(text)
+        c.setFont(font, 9)
+        c.drawString(letter[0] - 100, 30, f"Page {pages}")
+        c.showPage()
+
+    for done, emp in enumerate(iter_employees(batch_size), start=1):
+        lines = format_employee_record(emp).splitlines()
+        # A record is never split across pages
+        if page and len(page) + len(lines) > lines_per_page:
+            finish_page(page)
+            page = []
+        page.extend(lines)
+        if progress:
+            progress(done, total)
+    finish_page(page or ["No employees."])
+    c.save()
+    return pages
+
+@instrumented('export.employees')
+def export_employees(file_path, progress=None):
+    # The format follows the extension: .pdf (the printable list), .jsonl, or CSV otherwise
+    if file_path.lower().endswith('.pdf'):
+        return write_employee_list_pdf(file_path, progress)
+    total = db_cursor().execute('SELECT COUNT(*) FROM employees').fetchone()[0]
+    as_jsonl = file_path.lower().endswith(('.jsonl', '.ndjson'))
+    timesheet_overtime = fetch_timesheet_overtime()
+    with open(file_path, 'w', newline='', encoding='utf-8') as f:
+        writer = None if as_jsonl else csv.writer(f)
+        if writer:
+            writer.writerow(EXPORT_FIELDS)
+        for done, emp in enumerate(iter_employees(), start=1):
+            record = employee_record(emp, timesheet_overtime)
+            if writer:
+                writer.writerow(record.values())
+            else:
+                f.write(json.dumps(record) + '\n')
+            if progress:
+                progress(done, total)
+
+EXPORT_FIELDS = ['emp_id'] + IMPORT_FIELDS + ['net_salary']
+
+def employee_record(emp, timesheet_overtime):
+    # The fields of an exported employee, as written to JSON lines and served over HTTP
+    record = {field: getattr(emp, field) for field in EXPORT_FIELDS[:-1]}
+    record['net_salary'] = calculate_net_salary(emp, paid_overtime_hours(emp, timesheet_overtime))
+    return record
+
+def employee_records(employees):
+    # employee_record() of each employee (None stays None), with one timesheet lookup for all of them
+    timesheet_overtime = fetch_timesheet_overtime(emp_ids=[emp.emp_id for emp in employees if emp is not None])
+    return [None if emp is None else employee_record(emp, timesheet_overtime) for emp in employees]
+
+def format_employee_record(emp):
+    return (
+        f"Employee ID: {emp.emp_id}\n"
+        f"Name: {emp.name}\n"
+        f"Position: {emp.position}\n"
+        f"Department: {emp.department}\n"
+        f"Basic Salary: {emp.basic_salary}\n"
+        f"Date of Joining: {emp.doj}\n"
+        f"Overtime Hours: {emp.overtime_hours}\n"
+        f"Bank Name: {emp.bank_name}\n"
+        f"Bank Account Number: {emp.bank_account_number}\n"
+        f"IFSC Code: {emp.ifsc_code}\n"
+        f"Mobile Number: {emp.mobile_number}\n"
+        f"Email: {emp.email}\n"
+        "=======================================\n"
+    )
+
+def display_all_employees():
     custom_msgbox = tk.Toplevel()
     custom_msgbox.title("All Employees")
     custom_msgbox.configure(bg="light blue")
@@ -251,40 +2880,31 @@ def display_all_employees(employee_records):
     employee_info_text = scrolledtext.ScrolledText(custom_msgbox, wrap=tk.WORD, bg="light blue", width=50, height=20)
     employee_info_text.pack(padx=10, pady=10)
 
-    # Add content to the scrolledtext widget
-    message = ""
-
-    for emp in employee_records:
-        message += (
-            f"Employee ID: {emp.emp_id}\n"
-            f"Name: {emp.name}\n"
-            f"Position: {emp.position}\n"
-            f"Department: {emp.department}\n"
-            f"Basic Salary: {emp.basic_salary}\n"
-            f"Date of Joining: {emp.doj}\n"
-            f"Overtime Hours: {emp.overtime_hours}\n"
-            f"Bank Name: {emp.bank_name}\n"
-            f"Bank Account Number: {emp.bank_account_number}\n"
-            f"IFSC Code: {emp.ifsc_code}\n"
-            f"Mobile Number: {emp.mobile_number}\n"
-            f"Email: {emp.email}\n"
-            "=======================================\n"
-        )
-    employee_info_text.insert(tk.END, message)
+    # Only one page is rendered up front, the next one is fetched when the view nears the end
+    page_state = {'after_emp_id': None, 'exhausted': False, 'loading': False}
+
+    def load_next_page():
+        page = fetch_employee_page(page_state['after_emp_id'])
+        if page:
+            page_state['after_emp_id'] = page[-1].emp_id
+            employee_info_text.insert(tk.END, "".join(format_employee_record(emp) for emp in page))
+        page_state['exhausted'] = len(page) < EMPLOYEE_PAGE_SIZE
+        page_state['loading'] = False
+
+    def on_scroll(first, last):
+        employee_info_text.vbar.set(first, last)
+        if float(last) > 0.9 and not page_state['exhausted'] and not page_state['loading']:
+            page_state['loading'] = True
+            custom_msgbox.after_idle(load_next_page)
+
+    employee_info_text.configure(yscrollcommand=on_scroll)
+    load_next_page()
     
     def save_to_pdf():
         file_path = filedialog.asksaveasfilename(defaultextension=".pdf", filetypes=[("PDF files", "*.pdf")])
         if file_path:
-            c = canvas.Canvas(file_path, pagesize=letter)
-            c.setFont("Helvetica", 12)
-            lines = message.split('\n')
-            line_height = 15  # Adjust this value to change line spacing
-            y = 750  # Starting position for the first line
-            for line in lines:
-                c.drawString(100, y, line)
-                y -= line_height
-            c.save()
-            messagebox.showinfo("Save PDF", "list of all employee saved as PDF successfully!")
+            run_in_background("Download PDF", lambda job: write_employee_list_pdf(file_path, job.report_progress),
+                              lambda result: messagebox.showinfo("Save PDF", "list of all employee saved as PDF successfully!"))
 
 
     download_button = tk.Button(custom_msgbox, text="Download PDF", command=save_to_pdf,fg='BLACK' , bg='lightgreen')
@@ -298,36 +2918,584 @@ def display_all_employees(employee_records):
     back_button.pack(pady=10)
 
 
-def generate_payslip():
-    emp_id = simpledialog.askinteger("Enter Employee ID", "Please enter the Employee ID:")
-    if emp_id is not None:
+def build_payslip_text(employee, timesheet_overtime, current_date=None):
+    # timesheet_overtime is fetch_timesheet_overtime()'s result for the month of the payslip
+    current_date = current_date or datetime.now().strftime("%Y-%m-%d")
+    overtime_hours = paid_overtime_hours(employee, timesheet_overtime)
+    payslip = f"Pay Slip - {current_date}\n"
+    payslip += (
+        f"Employee ID: {employee.emp_id}\n"
+        f"Name: {employee.name}\n"
+        f"Position: {employee.position}\n"
+        f"Department: {employee.department}\n"
+        f"Basic Salary: {employee.basic_salary}\n"
+        f"Date of Joining: {employee.doj}\n"
+        f"Overtime Hours: {overtime_hours}\n"
+        f"Bank Name: {employee.bank_name}\n"
+        f"Bank Account Number: {employee.bank_account_number}\n"
+        f"IFSC Code: {employee.ifsc_code}\n"
+        f"Mobile Number: {employee.mobile_number}\n"
+        f"Email: {employee.email}\n"
+        "Allowances:\n"
+    )
+    for allowance, amount in employee.allowances.items():
+        payslip += f"  {allowance}: {amount}\n"
+    payslip += "Deductions:\n"
+    for deduction, amount in employee.deductions.items():
+        payslip += f"  {deduction}: {amount}\n"
+    payslip += f"\nNet Salary: {calculate_net_salary(employee, overtime_hours)}"
+    return payslip
+
+@instrumented('export.payslip_pdf')
+def write_payslip_pdf(file_path, payslip):
+    from reportlab.lib.pagesizes import letter
+    from reportlab.pdfgen import canvas
+    c = canvas.Canvas(file_path, pagesize=letter)
+    c.setFont("Helvetica", 12)
+    lines = payslip.split('\n')
+    line_height = 15  # Adjust this value to change line spacing
+    y = 750  # Starting position for the first line
+    for line in lines:
+        c.drawString(100, y, line)
+        y -= line_height
+    c.save()
+
+def render_payslip_job(file_path, payslip):
+    # Runs in a worker process; the rename makes a payslip appear only once it is complete
+    partial_path = file_path + '.part'
+    write_payslip_pdf(partial_path, payslip)
+    os.replace(partial_path, file_path)
+    return file_path
+
+def payslip_file_name(emp_id):
+    return f"payslip_{emp_id}.pdf"
+
+@instrumented('export.all_payslips', rows=lambda summary: summary['generated'])
+def generate_all_payslips(output_dir, workers=None, zip_path=None, progress=None):
+    cursor = db_cursor()
+    os.makedirs(output_dir, exist_ok=True)
+    workers = workers or os.cpu_count() or 1
+    current_date = datetime.now().strftime("%Y-%m-%d")
+    timesheet_overtime = fetch_timesheet_overtime(current_date[:7])
+    total = cursor.execute('SELECT COUNT(*) FROM employees').fetchone()[0]
+    generated = 0
+    skipped = 0
+    failed = {}
+    start = time.perf_counter()
+
+    def collect(done_futures):
+        nonlocal generated
+        for future in done_futures:
+            emp_id = pending.pop(future)
+            try:
+                future.result()
+                generated += 1
+            except Exception as e:
+                failed[emp_id] = str(e)
+            if progress:
+                progress(generated + skipped + len(failed), total)
+
+    # Keep a bounded number of payslips in flight so memory does not grow with the employee count
+    pending = {}
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for employee in iter_employees():
+            file_path = os.path.join(output_dir, payslip_file_name(employee.emp_id))
+            if os.path.exists(file_path):
+                # Resume: payslips from an earlier, interrupted run are kept
+                skipped += 1
+                continue
+            payslip = build_payslip_text(employee, timesheet_overtime, current_date)
+            future = executor.submit(render_payslip_job, file_path, payslip)
+            pending[future] = employee.emp_id
+            if len(pending) >= workers * 4:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                collect(done)
+        collect(wait(pending).done)
+
+    elapsed = time.perf_counter() - start
+    if zip_path:
+        with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_STORED) as archive:
+            for file_name in sorted(os.listdir(output_dir)):
+                if file_name.startswith('payslip_') and file_name.endswith('.pdf'):
+                    archive.write(os.path.join(output_dir, file_name), file_name)
+    return {'generated': generated, 'skipped': skipped, 'failed': failed, 'seconds': elapsed,
+            'pages_per_second': generated / elapsed if elapsed else 0.0}
+
+# Fixed-width disbursement records: (field, width) after the one-letter record type. Text is left aligned
+# and space padded, numbers (amounts in paise) right aligned and zero padded
+DISBURSEMENT_LAYOUT = {
+    'H': (('created_at', 14), ('period', 7)),
+    'B': (('batch', 6), ('bank_code', 4)),
+    'D': (('batch', 6), ('emp_id', 10), ('name', 40), ('account', 20), ('ifsc', 11), ('amount', 15)),
+    'T': (('batch', 6), ('transfers', 8), ('amount', 18), ('hash_total', 18)),
+    'F': (('batches', 6), ('transfers', 10), ('amount', 18), ('hash_total', 18)),
+}
+DISBURSEMENT_RECORD_LENGTH = 1 + max(sum(width for _, width in fields) for fields in DISBURSEMENT_LAYOUT.values())
+DISBURSEMENT_HASH_MODULUS = 10 ** 18  # account-number hash totals wrap so they fit their 18 digits
+
+class DisbursementFile:
+    # Writes header, batch and trailer records as CSV rows or fixed-width lines
+    def __init__(self, f, file_format):
+        if file_format not in ('csv', 'fixed'):
+            raise ValueError(f"Unknown disbursement format '{file_format}'.")
+        self.f = f
+        self.csv = csv.writer(f) if file_format == 'csv' else None
+
+    def record(self, kind, *values):
+        fields = DISBURSEMENT_LAYOUT[kind]
+        if self.csv:
+            self.csv.writerow([kind] + [f"{value // 100}.{value % 100:02d}" if name == 'amount' else value
+                                        for (name, _), value in zip(fields, values)])
+            return
+        line = [kind]
+        for (_, width), value in zip(fields, values):
+            line.append(str(value).rjust(width, '0') if isinstance(value, int) else str(value)[:width].ljust(width))
+        self.f.write(''.join(line).ljust(DISBURSEMENT_RECORD_LENGTH) + '\n')
+
+def disbursement_exclusion(account, ifsc_code, amount):
+    if amount <= 0:
+        return "net salary is not positive"
+    if not account.isdigit():
+        return "bank account number is not numeric"
+    if len(ifsc_code) != 11:
+        return "IFSC code is not 11 characters"
+    return None
+
+@instrumented('export.disbursement', rows=lambda summary: summary['transfers'])
+def write_disbursement_file(path, file_format='csv', period=None, batch_size=DISBURSEMENT_BATCH_SIZE,
+                            fetch_size=DISBURSEMENT_FETCH_SIZE):
+    # Salary credits grouped into batches per bank (the first four characters of the IFSC code, in index
+    # order), each closed with its transfer count, amount and account-number hash total. Employees that
+    # cannot be paid go to <path>.exceptions.csv; their amounts still count towards net_total
+    import numpy as np
+    period = period or current_period()
+    plan = current_pay_plan()
+    part_path = path + '.part'
+    exceptions_path = path + '.exceptions.csv'
+    summary = {'path': path, 'exceptions_path': exceptions_path, 'period': period, 'transfers': 0, 'batches': 0,
+               'amount_paise': 0, 'hash_total': 0, 'excluded': 0, 'excluded_paise': 0, 'net_total': 0.0}
+    batch = None  # [number, bank code, transfers, amount, hash total]
+
+    def close_batch():
+        writer.record('T', batch[0], batch[2], batch[3], batch[4])
+
+    try:
+        with read_transaction() as cursor, \
+                open(part_path, 'w', newline='', encoding='ascii' if file_format == 'fixed' else 'utf-8',
+                     errors='replace', buffering=DISBURSEMENT_WRITE_BUFFER) as f, \
+                open(exceptions_path, 'w', newline='', encoding='utf-8') as exceptions_file:
+            writer = DisbursementFile(f, file_format)
+            exceptions = csv.writer(exceptions_file)
+            exceptions.writerow(['emp_id', 'name', 'bank_account_number', 'ifsc_code', 'net_salary', 'reason'])
+            writer.record('H', datetime.now().strftime('%Y%m%d%H%M%S'), period)
+            # Walks idx_employees_bank, so the grouping needs no sort
+            overtime_sql, overtime_params = payroll_overtime_sql(cursor, period)
+            cursor.execute(f'''
+                SELECT emp_id, department, position, basic_salary, {overtime_sql},
+                       name, bank_account_number, ifsc_code, substr(ifsc_code, 1, 4)
+                FROM employees
+                ORDER BY substr(ifsc_code, 1, 4), emp_id
+            ''', overtime_params)
+            for rows in iter(lambda: cursor.fetchmany(fetch_size), []):
+                columns = build_payroll_columns([[row[:5] for row in rows]])
+                net_salaries = calculate_net_salaries(columns, plan)
+                summary['net_total'] += float(net_salaries.sum())
+                amounts = np.rint(net_salaries * 100).astype(np.int64).tolist()
+                for row, net_salary, amount in zip(rows, net_salaries.tolist(), amounts):
+                    emp_id, name, account, ifsc_code, bank_code = row[0], row[5], row[6].strip(), row[7].strip(), row[8]
+                    reason = disbursement_exclusion(account, ifsc_code, amount)
+                    if reason:
+                        exceptions.writerow([emp_id, name, account, ifsc_code, f"{net_salary:.2f}", reason])
+                        summary['excluded'] += 1
+                        summary['excluded_paise'] += amount
+                        continue
+                    if batch is None or batch[1] != bank_code or batch[2] >= batch_size:
+                        if batch is not None:
+                            close_batch()
+                        summary['batches'] += 1
+                        batch = [summary['batches'], bank_code, 0, 0, 0]
+                        writer.record('B', batch[0], bank_code)
+                    writer.record('D', batch[0], emp_id, name, account, ifsc_code, amount)
+                    account_hash = int(account) % DISBURSEMENT_HASH_MODULUS
+                    batch[2] += 1
+                    batch[3] += amount
+                    batch[4] = (batch[4] + account_hash) % DISBURSEMENT_HASH_MODULUS
+                    summary['transfers'] += 1
+                    summary['amount_paise'] += amount
+                    summary['hash_total'] = (summary['hash_total'] + account_hash) % DISBURSEMENT_HASH_MODULUS
+            if batch is not None:
+                close_batch()
+            writer.record('F', summary['batches'], summary['transfers'], summary['amount_paise'], summary['hash_total'])
+        os.replace(part_path, path)
+    except BaseException:
+        if os.path.exists(part_path):
+            os.remove(part_path)
+        raise
+    return summary
+
+def verify_disbursement(summary, aggregation=None):
+    # Checks the file's totals against a payroll run: the net total (paid plus excluded) against the payroll
+    # total, and, when the run has per-employee results, the amounts to the paisa. Another period than this
+    # one pays other timesheet overtime, so it is checked against the batch path for that period
+    if summary['period'] == current_period():
+        payroll_data, department_wise_salary, _ = compute_payroll(aggregation)
+    else:
+        payroll_data, department_wise_salary, _ = compute_payroll_batch(summary['period'])
+    payroll_total = sum(department_wise_salary.values())
+    matches = math.isclose(summary['net_total'], payroll_total, rel_tol=1e-9)
+    if payroll_data is not None:
+        expected_paise = sum(round(net_salary * 100) for net_salary in payroll_data.values())
+        matches = matches and expected_paise == summary['amount_paise'] + summary['excluded_paise']
+    return matches, payroll_total
+
+class HttpError(Exception):
+    def __init__(self, status, message=None):
+        self.status = status
+        self.message = message or HTTPStatus(status).phrase
+        super().__init__(self.message)
+
+class RequestBatcher:
+    # Requests arriving within SERVICE_BATCH_DELAY of each other are handed to run_batch as one list, on
+    # the service's DB executor; a request whose key matches one already queued or running shares its result
+    def __init__(self, service, run_batch, delay=SERVICE_BATCH_DELAY, max_size=SERVICE_BATCH_SIZE):
+        self.service = service
+        self.run_batch = run_batch
+        self.delay = delay
+        self.max_size = max_size
+        self.queue = []
+        self.futures = {}
+        self.handle = None
+
+    def submit(self, item, key=None):
+        import asyncio
+        if key is not None and key in self.futures:
+            return self.futures[key]
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        if key is not None:
+            self.futures[key] = future
+            future.add_done_callback(lambda _: self.futures.pop(key, None))
+        self.queue.append((item, future))
+        if len(self.queue) >= self.max_size:
+            self.flush()
+        elif self.handle is None:
+            self.handle = loop.call_later(self.delay, self.flush)
+        return future
+
+    def flush(self):
+        if self.handle is not None:
+            self.handle.cancel()
+            self.handle = None
+        batch, self.queue = self.queue, []
+        if batch:
+            self.service.start_task(self.run(batch))
+
+    async def run(self, batch):
+        try:
+            results = await self.service.run_db(self.run_batch, [item for item, _ in batch])
+        except Exception as e:
+            results = [e] * len(batch)
+        for (_, future), result in zip(batch, results):
+            if future.done():
+                continue
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+def employee_page_lines(after_emp_id, limit):
+    # Runs on a DB worker: one keyset page, already encoded as NDJSON
+    page = fetch_employee_page(after_emp_id, limit)
+    lines = ''.join(json.dumps(record) + '\n' for record in employee_records(page))
+    return (page[-1].emp_id if page else None), len(page), lines.encode('utf-8')
+
+def fetch_employee_records_by_ids(emp_ids):
+    # Runs on a DB worker: a batch of single-employee lookups, as the records they respond with
+    return employee_records(fetch_employees_by_ids(emp_ids))
+
+def query_int(query, name, default=None):
+    values = query.get(name)
+    if not values:
+        return default
+    try:
+        return int(values[-1])
+    except ValueError:
+        raise HttpError(400, f"'{name}' must be an integer.") from None
+
+class PayrollService:
+    # SQLite is only touched on a fixed pool of worker threads, each with its own connection; requests
+    # beyond the pool size wait on the event loop, where a disconnecting client costs nothing
+    def __init__(self, workers=SERVICE_WORKERS):
+        import asyncio
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='payroll-service')
+        self.slots = asyncio.Semaphore(workers)
+        self.inflight = {}
+        self.tasks = set()
+        self.lookups = RequestBatcher(self, fetch_employee_records_by_ids)
+        self.inserts = RequestBatcher(self, insert_employee_records)
+
+    def start_task(self, coroutine):
+        import asyncio
+        task = asyncio.ensure_future(coroutine)
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+        return task
+
+    async def run_db(self, func, *args):
+        import asyncio
+        async with self.slots:
+            return await asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+
+    async def coalesce(self, key, func, *args):
+        # Identical reads already running share one result instead of queueing again
+        import asyncio
+        task = self.inflight.get(key)
+        if task is None:
+            task = self.inflight[key] = self.start_task(self.run_db(func, *args))
+            task.add_done_callback(lambda _: self.inflight.pop(key, None))
+        return await asyncio.shield(task)
+
+    async def route(self, method, path, query, body, writer, keep_alive):
+        import asyncio
+        match = re.fullmatch(r'/employees/(\d+)', path)
+        if match:
+            if method != 'GET':
+                raise HttpError(405)
+            emp_id = int(match.group(1))
+            record = await asyncio.shield(self.lookups.submit(emp_id, key=emp_id))
+            if record is None:
+                raise HttpError(404, f"No employee {emp_id}.")
+            return self.send_json(writer, 200, record, keep_alive)
+        if path == '/employees' and method == 'GET':
+            return await self.stream_employees(query, writer, keep_alive)
+        if path == '/employees' and method == 'POST':
+            try:
+                employee = employee_from_record(json.loads(body or b'null'))
+            except (json.JSONDecodeError, UnicodeDecodeError) as e:
+                raise HttpError(400, f"Invalid JSON: {e}") from None
+            except (TypeError, ValueError) as e:
+                raise HttpError(400, str(e)) from None
+            try:
+                emp_id = await asyncio.shield(self.inserts.submit(employee))
+            except (sqlite3.IntegrityError, ValueError) as e:
+                # ValueError here is a bank account or email that already belongs to an employee
+                raise HttpError(409, str(e)) from None
+            return self.send_json(writer, 201, {'emp_id': emp_id}, keep_alive)
+        if path == '/payroll' and method == 'GET':
+            aggregation = (query.get('aggregation') or [PAYROLL_AGGREGATION])[-1]
+            if aggregation not in ('incremental', 'sql', 'batch', 'sharded', 'snapshot'):
+                raise HttpError(400, f"Unknown payroll aggregation mode '{aggregation}'.")
+            _, department_wise_salary, position_wise_salary = await self.coalesce(
+                ('payroll', aggregation), compute_payroll, aggregation)
+            return self.send_json(writer, 200, {'department_wise_salary': department_wise_salary,
+                                                'position_wise_salary': position_wise_salary}, keep_alive)
+        if path in ('/employees', '/payroll'):
+            raise HttpError(405)
+        raise HttpError(404)
+
+    async def stream_employees(self, query, writer, keep_alive):
+        # NDJSON in chunked encoding, one keyset page at a time; drain() holds the next page back
+        # until a slow client has taken the previous one
+        after_emp_id = query_int(query, 'after')
+        remaining = query_int(query, 'limit')
+        if remaining is not None and remaining < 0:
+            raise HttpError(400, "'limit' cannot be negative.")
+        self.write_head(writer, 200, 'application/x-ndjson', keep_alive, chunked=True)
+        try:
+            while remaining is None or remaining > 0:
+                size = SERVICE_PAGE_SIZE if remaining is None else min(SERVICE_PAGE_SIZE, remaining)
+                last_emp_id, count, lines = await self.coalesce(('page', after_emp_id, size),
+                                                                employee_page_lines, after_emp_id, size)
+                if lines:
+                    writer.write(b'%x\r\n%s\r\n' % (len(lines), lines))
+                    await writer.drain()
+                if count < size:
+                    break
+                after_emp_id = last_emp_id
+                if remaining is not None:
+                    remaining -= count
+        except Exception:
+            # The status line is already sent, so the only way to signal the failure is to cut the stream
+            writer.transport.abort()
+            raise ConnectionAbortedError() from None
+        writer.write(b'0\r\n\r\n')
+
+    def write_head(self, writer, status, content_type, keep_alive, length=None, chunked=False):
+        head = [f"HTTP/1.1 {status} {HTTPStatus(status).phrase}", f"Content-Type: {content_type}"]
+        if chunked:
+            head.append("Transfer-Encoding: chunked")
+        else:
+            head.append(f"Content-Length: {length}")
+        if not keep_alive:
+            head.append("Connection: close")
+        writer.write(('\r\n'.join(head) + '\r\n\r\n').encode('latin-1'))
+
+    def send_json(self, writer, status, payload, keep_alive):
+        body = json.dumps(payload).encode('utf-8')
+        self.write_head(writer, status, 'application/json', keep_alive, len(body))
+        writer.write(body)
+
+    async def read_request(self, reader):
+        line = await reader.readline()
+        if not line:
+            return None
+        try:
+            method, target, version = line.decode('latin-1').split()
+        except ValueError:
+            raise HttpError(400, "Malformed request line.") from None
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        try:
+            length = int(headers.get('content-length', 0))
+        except ValueError:
+            raise HttpError(400, "Invalid Content-Length.") from None
+        if length > SERVICE_MAX_BODY:
+            raise HttpError(413)
+        body = await reader.readexactly(length) if length else b''
+        connection = headers.get('connection', '').lower()
+        keep_alive = connection == 'keep-alive' if version == 'HTTP/1.0' else connection != 'close'
+        return method, target, body, keep_alive
+
+    async def handle_connection(self, reader, writer):
+        import asyncio
+        try:
+            while True:
+                try:
+                    request = await self.read_request(reader)
+                except HttpError as e:
+                    # The rest of the connection cannot be parsed reliably after a bad request
+                    self.send_json(writer, e.status, {'error': e.message}, False)
+                    break
+                if request is None:
+                    break
+                method, target, body, keep_alive = request
+                url = urlsplit(target)
+                try:
+                    await self.route(method, url.path, parse_qs(url.query), body, writer, keep_alive)
+                except HttpError as e:
+                    self.send_json(writer, e.status, {'error': e.message}, keep_alive)
+                except (ConnectionError, asyncio.CancelledError):
+                    raise
+                except Exception as e:
+                    self.send_json(writer, 500, {'error': str(e)}, keep_alive)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass  # client went away, or sent a line longer than the stream limit
+        finally:
+            writer.close()
+
+    async def serve(self, host=SERVICE_HOST, port=SERVICE_PORT):
+        import asyncio
+        server = await asyncio.start_server(self.handle_connection, host, port)
+        host, port = server.sockets[0].getsockname()[:2]
+        print(f"Serving payroll on http://{host}:{port} from {DB_PATH}", flush=True)
+        serving = asyncio.ensure_future(server.serve_forever())
+        # Stop cleanly on Ctrl+C or a service manager's SIGTERM, so a stand-in copy is removed
+        for signal_number in (signal.SIGINT, signal.SIGTERM):
+            try:
+                asyncio.get_running_loop().add_signal_handler(signal_number, serving.cancel)
+            except (NotImplementedError, RuntimeError):
+                pass  # not supported on Windows; Ctrl+C still raises KeyboardInterrupt there
+        async with server:
+            try:
+                await serving
+            except asyncio.CancelledError:
+                pass
+
+def copy_database(source_path, target_path):
+    # A consistent copy through SQLite's online backup, safe while other connections are writing
+    source = sqlite3.connect(source_path, timeout=DB_TIMEOUT)
+    target = sqlite3.connect(target_path)
+    try:
+        source.backup(target)
+    finally:
+        target.close()
+        source.close()
+
+def serve_payroll(host=SERVICE_HOST, port=SERVICE_PORT, workers=SERVICE_WORKERS, stand_in=False):
+    # stand_in serves a private copy of the database, so other systems can be tested against real
+    # data without their writes reaching it; the copy is deleted on exit
+    import asyncio
+    stand_in_dir = None
+    if stand_in:
+        stand_in_dir = tempfile.mkdtemp(prefix='payroll-stand-in-')
+        stand_in_path = os.path.join(stand_in_dir, os.path.basename(DB_PATH))
+        copy_database(DB_PATH, stand_in_path)
+        set_database(stand_in_path)
+    service = PayrollService(workers)
+    try:
+        asyncio.run(service.serve(host, port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.executor.shutdown(wait=True, cancel_futures=True)
+        if stand_in_dir:
+            shutil.rmtree(stand_in_dir, ignore_errors=True)
+
+def choose_employee(title, on_select):
+    # Search-as-you-type picker; on_select is called with the chosen emp_id
+    window = tk.Toplevel()
+    window.title(title)
+    window.configure(bg="light blue")
+    tk.Label(window, text="Search by name, email, position, department, mobile, account number or ID:",
+             bg="light blue").pack(padx=10, pady=(10, 0))
+    query = tk.StringVar()
+    entry = tk.Entry(window, textvariable=query, width=60)
+    entry.pack(padx=10, pady=5)
+    entry.focus_set()
+    results = tk.Listbox(window, width=90, height=EMPLOYEE_SEARCH_LIMIT)
+    results.pack(padx=10, pady=5)
+    matches = []
+    pending = []
+
+    def refresh():
+        pending.clear()
+        matches[:] = search_employees(query.get())
+        results.delete(0, tk.END)
+        for emp in matches:
+            results.insert(tk.END, f"{emp.emp_id}: {emp.name} - {emp.position}, {emp.department} "
+                                   f"({emp.email}, {emp.mobile_number})")
+        if matches:
+            results.selection_set(0)
+
+    def schedule_refresh(*_):
+        # Wait for a pause in typing rather than searching on every keystroke
+        if pending:
+            window.after_cancel(pending.pop())
+        pending.append(window.after(EMPLOYEE_SEARCH_DELAY_MS, refresh))
+
+    def select(event=None):
+        selection = results.curselection()
+        if not selection:
+            return
+        emp_id = matches[selection[0]].emp_id
+        window.destroy()
+        on_select(emp_id)
+
+    query.trace_add('write', schedule_refresh)
+    entry.bind('<Return>', select)
+    entry.bind('<Down>', lambda event: results.focus_set())
+    results.bind('<Double-Button-1>', select)
+    results.bind('<Return>', select)
+    tk.Button(window, text="Select", command=select, fg='BLACK', bg='lightgreen').pack(pady=5)
+    tk.Button(window, text="Cancel", command=window.destroy, fg='BLACK', bg='red').pack(pady=(0, 10))
+
+def generate_payslip(emp_id=None):
+    if emp_id is None:
+        choose_employee("Generate Payslip", generate_payslip)
+    else:
         employee = fetch_employee_by_id(emp_id)
         if not employee:
             messagebox.showerror("Error", "Employee not found.")
         else:
-            current_date = datetime.now().strftime("%Y-%m-%d")
-            payslip = f"Pay Slip - {current_date}\n"
-            payslip += (
-                f"Employee ID: {employee.emp_id}\n"
-                f"Name: {employee.name}\n"
-                f"Position: {employee.position}\n"
-                f"Department: {employee.department}\n"
-                f"Basic Salary: {employee.basic_salary}\n"
-                f"Date of Joining: {employee.doj}\n"
-                f"Overtime Hours: {employee.overtime_hours}\n"
-                f"Bank Name: {employee.bank_name}\n"
-                f"Bank Account Number: {employee.bank_account_number}\n"
-                f"IFSC Code: {employee.ifsc_code}\n"
-                f"Mobile Number: {employee.mobile_number}\n"
-                f"Email: {employee.email}\n"
-                "Allowances:\n"
-            )
-            for allowance, amount in employee.allowances.items():
-                payslip += f"  {allowance}: {amount}\n"
-            payslip += "Deductions:\n"
-            for deduction, amount in employee.deductions.items():
-                payslip += f"  {deduction}: {amount}\n"
-            payslip += f"\nNet Salary: {calculate_net_salary(employee)}"
+            payslip = build_payslip_text(employee, fetch_timesheet_overtime(emp_ids=[emp_id]))
             custom_msgbox = tk.Toplevel()
             custom_msgbox.title("Employee Pay Slip")
             custom_msgbox.configure(bg="light blue")
@@ -340,15 +3508,7 @@ def generate_payslip():
             def save_to_pdf():
                 file_path = filedialog.asksaveasfilename(defaultextension=".pdf", filetypes=[("PDF files", "*.pdf")])
                 if file_path:
-                    c = canvas.Canvas(file_path, pagesize=letter)
-                    c.setFont("Helvetica", 12)
-                    lines = payslip.split('\n')
-                    line_height = 15  # Adjust this value to change line spacing
-                    y = 750  # Starting position for the first line
-                    for line in lines:
-                        c.drawString(100, y, line)
-                        y -= line_height
-                    c.save()
+                    write_payslip_pdf(file_path, payslip)
                     messagebox.showinfo("Save PDF", "Payslip saved as PDF successfully!")
        
 
@@ -364,6 +3524,93 @@ def generate_payslip():
 
                 
 
+def generate_all_payslips_window():
+    output_dir = filedialog.askdirectory(title="Choose a folder for the payslips")
+    if output_dir:
+        def show_summary(summary):
+            message = (f"Generated {summary['generated']} payslips, skipped {summary['skipped']} existing "
+                       f"({summary['pages_per_second']:.1f} pages/s).")
+            if summary['failed']:
+                messagebox.showwarning("Payslips", message + f"\n{len(summary['failed'])} failed, run again to retry them.")
+            else:
+                messagebox.showinfo("Payslips", message)
+
+        run_in_background("Generate All Payslips",
+                          lambda job: generate_all_payslips(output_dir, progress=job.report_progress), show_summary)
+
+def bulk_update_window():
+    window = tk.Toplevel()
+    window.title("Bulk Update")
+    window.configure(bg="light blue")
+    tk.Label(window, text="Bulk Update", font=("Helvetica", 16, "bold"), bg="light blue").pack(pady=10)
+
+    action = tk.StringVar(value='raise_salary')
+    tk.Radiobutton(window, text="Raise basic salary by percent", variable=action, value='raise_salary',
+                   bg="light blue").pack(anchor='w', padx=10)
+    tk.Radiobutton(window, text="Set overtime hours to", variable=action, value='set_overtime',
+                   bg="light blue").pack(anchor='w', padx=10)
+    value_entry = tk.Entry(window)
+    value_entry.pack(padx=10, pady=5)
+
+    departments, positions = fetch_employee_groups()
+    lists = tk.Frame(window, bg="light blue")
+    lists.pack(padx=10, pady=5)
+    filters = []
+    for column, (title, names) in enumerate((("Departments", departments), ("Positions", positions))):
+        tk.Label(lists, text=title, bg="light blue").grid(row=0, column=column)
+        listbox = tk.Listbox(lists, selectmode=tk.MULTIPLE, exportselection=False, height=10)
+        for name in names:
+            listbox.insert(tk.END, name)
+        listbox.grid(row=1, column=column, padx=5)
+        filters.append((listbox, names))
+    tk.Label(window, text="Employee IDs (comma separated, optional):", bg="light blue").pack()
+    emp_ids_entry = tk.Entry(window, width=40)
+    emp_ids_entry.pack(padx=10, pady=5)
+    tk.Label(window, text="Note:", bg="light blue").pack()
+    note_entry = tk.Entry(window, width=40)
+    note_entry.pack(padx=10, pady=5)
+    preview_label = tk.Label(window, text="Nothing selected means every employee.", bg="light blue")
+    preview_label.pack(pady=5)
+
+    def selection():
+        # (action, value, departments, positions, emp_ids), or None after showing what is wrong
+        try:
+            value = float(value_entry.get())
+            emp_ids = [int(emp_id) for emp_id in emp_ids_entry.get().split(',') if emp_id.strip()]
+        except ValueError:
+            messagebox.showerror("Error", "Enter a number for the value and whole numbers for the IDs.")
+            return None
+        chosen = [[names[index] for index in listbox.curselection()] for listbox, names in filters]
+        return action.get(), value, chosen[0], chosen[1], emp_ids
+
+    def preview():
+        chosen = selection()
+        if chosen is None:
+            return None
+        try:
+            result = preview_bulk_update(*chosen)
+        except ValueError as e:
+            messagebox.showerror("Error", str(e))
+            return None
+        preview_label.config(text=f"{result['rows']} employees will change; total {result['column']} "
+                                  f"{result['current_total']:.2f} -> {result['new_total']:.2f}")
+        return chosen, result
+
+    def apply():
+        previewed = preview()
+        if previewed is None:
+            return
+        chosen, result = previewed
+        if not messagebox.askyesno("Confirm Bulk Update", f"Update {result['rows']} employees?"):
+            return
+        note = note_entry.get() or None
+        run_in_background("Bulk Update", lambda job: bulk_update_employees(*chosen, note=note),
+                          lambda done: messagebox.showinfo("Bulk Update", f"Updated {done['rows']} employees."))
+
+    tk.Button(window, text="Preview", command=preview, fg='BLACK', bg='lightgreen').pack(pady=5)
+    tk.Button(window, text="Apply", command=apply, fg='BLACK', bg='green').pack(pady=5)
+    tk.Button(window, text="Close", command=window.destroy, fg='BLACK', bg='red').pack(pady=(5, 10))
+
 def add_employee():
     
     def add_employee_submit():
@@ -466,9 +3713,10 @@ def add_employee():
 
 
                 
-def edit_employee():
-        emp_id = simpledialog.askinteger("Enter Employee ID", "Please enter the Employee ID:")
-        if emp_id is not None:
+def edit_employee(emp_id=None):
+        if emp_id is None:
+            choose_employee("Edit Employee", edit_employee)
+        else:
             employee = fetch_employee_by_id(emp_id)
             if not employee:
                 messagebox.showerror("Error", "Employee not found.")
@@ -571,9 +3819,10 @@ def edit_employee():
                 back_button = tk.Button(edit_employee_window, text="Back to Main Window", command=go_back_to_main_window,fg='BLACK' , bg='red')
                 back_button.pack(pady=5)
 
-def delete_employee():
-    emp_id = simpledialog.askinteger("Enter Employee ID", "Please enter the Employee ID:")
-    if emp_id is not None:
+def delete_employee(emp_id=None):
+    if emp_id is None:
+        choose_employee("Delete Employee", delete_employee)
+    else:
         employee = fetch_employee_by_id(emp_id)
         if not employee:
             messagebox.showerror("Error", "Employee not found.")
@@ -583,11 +3832,13 @@ def delete_employee():
                 delete_employee_from_db(emp_id)
 
 def main():
+    global background_worker
     create_employee_table()
 
     root = tk.Tk()
     root.title("Employee Payroll Management System")
     root.geometry("400x600")
+    background_worker = BackgroundWorker(root)
     root.configure(bg="lightblue")  # Set the background color of the window
     var = tk.StringVar()
     HEAD_font = font.Font(family="ITALICS", size=15, weight="bold" ,)
@@ -596,12 +3847,19 @@ def main():
     label.pack()
     
     button_font = font.Font(family="Helvetica", size=8, weight="bold")
+
+    menu_bar = tk.Menu(root)
+    tools_menu = tk.Menu(menu_bar, tearoff=0)
+    tools_menu.add_command(label="Generate All Payslips...", command=generate_all_payslips_window)
+    tools_menu.add_command(label="Bulk Update...", command=bulk_update_window)
+    menu_bar.add_cascade(label="Tools", menu=tools_menu)
+    root.config(menu=menu_bar)
     
     add_employee_btn = tk.Button(root, text="Add Employee", fg='BLACK' , bg='yellow' , command=add_employee, height=3, width=20,font=button_font)
     add_employee_btn.pack(pady=10)
     
     view_all_employees_btn = tk.Button(root, text="View All Employees",
-                                       command=lambda: display_all_employees(fetch_all_employees()),height=3, width=20,font=button_font,fg='BLACK' , bg='pink')
+                                       command=display_all_employees,height=3, width=20,font=button_font,fg='BLACK' , bg='pink')
     view_all_employees_btn.pack(pady=10)
 
 
@@ -616,18 +3874,291 @@ def main():
     delete_employee_btn.pack(pady=10)
    
  
-    process_payroll_btn = tk.Button(root, text="Payroll Analysis", command=process_payroll, height=3, width=20,font=button_font,fg='BLACK' , bg='grey')
+    process_payroll_btn = tk.Button(root, text="Payroll Analysis", command=process_payroll_in_background, height=3, width=20,font=button_font,fg='BLACK' , bg='grey')
     process_payroll_btn.pack(pady=10)
 
    
 
     def exit_application():
+            background_worker.shutdown()
             root.destroy()
     
+    root.protocol("WM_DELETE_WINDOW", exit_application)
     exit_button = tk.Button(root, text="Exit", command=exit_application,height=3, width=20,font=button_font, fg='BLACK' , bg='red')
     exit_button.pack(pady=10)
 
     root.mainloop()
 
+def pay_period(value):
+    # argparse type for YYYY-MM pay periods, checked before any work is done; 2024-5 becomes 2024-05
+    try:
+        return datetime.strptime(value, "%Y-%m").strftime("%Y-%m")
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"'{value}' is not a pay period, expected YYYY-MM") from None
+
+def cli_main(argv=None):
+    parser = argparse.ArgumentParser(description="Employee Payroll Management System")
+    parser.add_argument('--db', help=f"SQLite database file (default: {DB_PATH}, or set PAYROLL_DB)")
+    parser.add_argument('--metrics', metavar='FILE',
+                        help="record timings and query counts to FILE: .prom for Prometheus text, else JSON lines "
+                             "(or set PAYROLL_METRICS)")
+    parser.add_argument('--explain', action='store_true',
+                        help="also record EXPLAIN QUERY PLAN for the statements run (or set PAYROLL_EXPLAIN=1)")
+    parser.add_argument('--profile', metavar='MODES',
+                        help=f"cprofile and/or tracemalloc, comma separated; written to {PROFILE_PATH}.* "
+                             "(or set PAYROLL_PROFILE)")
+    subparsers = parser.add_subparsers(dest='command')
+
+    import_parser = subparsers.add_parser('import', help="bulk import employees from a CSV or JSONL file")
+    import_parser.add_argument('file', help="CSV file with a header row, or a .jsonl file with one object per line")
+    import_parser.add_argument('--rejects', help="where to write rejected rows (default: <file>.rejects.jsonl)")
+    import_parser.add_argument('--chunk-size', type=int, default=IMPORT_CHUNK_SIZE)
+    import_parser.add_argument('--chunks-per-transaction', type=int, default=IMPORT_CHUNKS_PER_TRANSACTION)
+
+    timesheets_parser = subparsers.add_parser('timesheets', help="ingest clock-in/clock-out events into overtime hours")
+    timesheets_subparsers = timesheets_parser.add_subparsers(dest='timesheets', required=True)
+    timesheets_import_parser = timesheets_subparsers.add_parser(
+        'import', help="append events from a CSV or JSONL file with emp_id, clock_in and clock_out")
+    timesheets_import_parser.add_argument('file')
+    timesheets_import_parser.add_argument('--rejects', help="where to write rejected events (default: <file>.rejects.jsonl)")
+    timesheets_import_parser.add_argument('--batch-size', type=int, default=TIMESHEET_BATCH_SIZE,
+                                          help="events per transaction")
+
+    run_parser = subparsers.add_parser('run', help="run payroll and print department and position totals")
+    run_parser.add_argument('--aggregation', choices=['incremental', 'sql', 'batch', 'sharded', 'snapshot', 'employee'],
+                            help=f"how totals are computed (default: {PAYROLL_AGGREGATION})")
+    run_parser.add_argument('--workers', type=int, help="worker processes for --aggregation sharded (default: all cores)")
+    run_parser.add_argument('--shard-by', choices=['emp_id', 'department'],
+                            help=f"how --aggregation sharded splits the employees (default: {PAYROLL_SHARD_BY})")
+    run_parser.add_argument('--snapshot', help=f"snapshot read by --aggregation snapshot (default: {PAYROLL_SNAPSHOT_PATH})")
+    run_parser.add_argument('--json', action='store_true', help="print the totals as JSON")
+    run_parser.add_argument('--record', action='store_true', help="store the payroll lines for the pay period")
+    run_parser.add_argument('--period', type=pay_period, help="pay period to record, YYYY-MM (default: this month)")
+
+    report_parser = subparsers.add_parser('report', help="reports over recorded payroll runs")
+    report_subparsers = report_parser.add_subparsers(dest='report', required=True)
+    ytd_parser = report_subparsers.add_parser('ytd', help="year-to-date totals by department or for one employee")
+    ytd_parser.add_argument('year', type=int)
+    ytd_parser.add_argument('--emp-id', type=int)
+    compare_parser = report_subparsers.add_parser('compare', help="department net pay against an earlier period")
+    compare_parser.add_argument('period', type=pay_period, help="YYYY-MM")
+    compare_parser.add_argument('earlier_period', nargs='?', type=pay_period, help="YYYY-MM (default: the month before)")
+
+    export_parser = subparsers.add_parser('export', help="export all employees with their net salary")
+    export_parser.add_argument('file', help="output file: .csv, .jsonl or .pdf")
+
+    snapshot_parser = subparsers.add_parser('snapshot', help="export employees and their pay as a columnar snapshot")
+    snapshot_parser.add_argument('path', nargs='?', default=PAYROLL_SNAPSHOT_PATH, help="snapshot directory")
+    snapshot_parser.add_argument('--format', choices=['arrow', 'npy'],
+                                 help="Arrow IPC or memory-mapped NumPy files (default: arrow if pyarrow is installed)")
+
+    disburse_parser = subparsers.add_parser('disburse', help="write the salary-credit file for the banks")
+    disburse_parser.add_argument('file', help="output file; employees that cannot be paid go to <file>.exceptions.csv")
+    disburse_parser.add_argument('--format', choices=['csv', 'fixed'], default='csv')
+    disburse_parser.add_argument('--period', type=pay_period, help="pay period in the file header, YYYY-MM (default: this month)")
+    disburse_parser.add_argument('--batch-size', type=int, default=DISBURSEMENT_BATCH_SIZE,
+                                 help="largest number of transfers in one bank batch")
+    disburse_parser.add_argument('--verify', action='store_true',
+                                 help="check the file's totals against a payroll run")
+
+    payslips_parser = subparsers.add_parser('payslips', help="generate a PDF payslip for every employee")
+    payslips_parser.add_argument('output_dir', help="directory for the payslip PDFs; existing payslips are kept")
+    payslips_parser.add_argument('--workers', type=int, help="worker processes (default: all cores)")
+    payslips_parser.add_argument('--zip', dest='zip_path', help="also bundle the payslips into this zip file")
+
+    verify_parser = subparsers.add_parser('verify-payroll',
+                                          help="check the incrementally maintained payroll against a full recompute")
+    verify_parser.add_argument('--repair', action='store_true', help="rebuild the stored payroll if it differs")
+
+    validate_parser = subparsers.add_parser('validate', help="check every employee's fields and find duplicate "
+                                                             "bank accounts and emails")
+    validate_parser.add_argument('--report', help="write each invalid employee with all its errors to this JSONL file")
+
+    bulk_parser = subparsers.add_parser('bulk-update', help="raise salaries or set overtime for many employees at once")
+    bulk_parser.add_argument('action', choices=['raise-salary', 'set-overtime'])
+    bulk_parser.add_argument('value', type=float, help="percentage raise, or the new overtime hours")
+    bulk_parser.add_argument('--department', action='append', help="only this department (repeatable)")
+    bulk_parser.add_argument('--position', action='append', help="only this position (repeatable)")
+    bulk_parser.add_argument('--emp-ids', help="only these employees, comma separated")
+    bulk_parser.add_argument('--all', action='store_true', help="apply to every employee when no filter is given")
+    bulk_parser.add_argument('--preview', action='store_true', help="only show how many employees would change")
+    bulk_parser.add_argument('--note', help="reason recorded in the audit log")
+
+    serve_parser = subparsers.add_parser('serve', help="serve employees and payroll totals over HTTP")
+    serve_parser.add_argument('--host', default=SERVICE_HOST)
+    serve_parser.add_argument('--port', type=int, default=SERVICE_PORT, help="0 picks a free port")
+    serve_parser.add_argument('--workers', type=int, default=SERVICE_WORKERS, help="threads running SQLite queries")
+    serve_parser.add_argument('--stand-in', action='store_true',
+                              help="serve a temporary copy of the database; writes never reach the real one")
+
+    rules_parser = subparsers.add_parser('rules', help="list, add or remove allowance and deduction rules")
+    rules_subparsers = rules_parser.add_subparsers(dest='rules', required=True)
+    rules_subparsers.add_parser('list', help="show the pay rules in the order they were added")
+    add_rule_parser = rules_subparsers.add_parser('add', help="add a pay rule; narrower rules override wider ones")
+    add_rule_parser.add_argument('name', help="component name, e.g. 'Tax'; a rule with an existing name overrides it")
+    add_rule_parser.add_argument('kind', choices=PAY_RULE_KINDS)
+    add_rule_parser.add_argument('method', choices=PAY_RULE_METHODS)
+    add_rule_parser.add_argument('--amount', type=float, default=0.0,
+                                 help="fixed amount, or percentage of basic salary for percent_of_basic")
+    add_rule_parser.add_argument('--slabs', help="slab brackets as JSON [[from_salary, percent], ...]")
+    add_rule_parser.add_argument('--department', help="only apply to this department")
+    add_rule_parser.add_argument('--position', help="only apply to this position")
+    add_rule_parser.add_argument('--emp-id', type=int, help="only apply to this employee")
+    remove_rule_parser = rules_subparsers.add_parser('remove', help="remove a pay rule")
+    remove_rule_parser.add_argument('rule_id', type=int)
+
+    args = parser.parse_args(argv)
+    if args.db:
+        set_database(args.db)
+    if args.metrics:
+        configure_metrics(args.metrics, args.explain)
+    elif args.explain and metrics is not None:
+        metrics.explain = True
+    if args.profile or os.environ.get('PAYROLL_PROFILE'):
+        try:
+            start_profiling(args.profile or os.environ['PAYROLL_PROFILE'])
+        except ValueError as e:
+            parser.error(str(e))
+    if args.command is None:
+        if tk is None:
+            parser.error("the GUI needs Tk, which is not available here; use one of the commands")
+        main()
+        return
+
+    create_employee_table()
+    if args.command == 'run':
+        if args.aggregation == 'sharded':
+            _, department_wise_salary, position_wise_salary = compute_payroll_sharded(args.workers, args.shard_by)
+        elif args.aggregation == 'snapshot':
+            _, department_wise_salary, position_wise_salary = compute_payroll_from_snapshot(args.snapshot)
+        else:
+            _, department_wise_salary, position_wise_salary = compute_payroll(args.aggregation)
+        if args.json:
+            print(json.dumps({'department_wise_salary': department_wise_salary,
+                              'position_wise_salary': position_wise_salary}, indent=2))
+        else:
+            for title, totals in (("Department", department_wise_salary), ("Position", position_wise_salary)):
+                print(f"{title:<30} {'Total Salary':>18}")
+                for name, total in totals.items():
+                    print(f"{name:<30} {total:>18.2f}")
+                print()
+        if args.record:
+            run = record_payroll_run(args.period)
+            print(f"Recorded payroll run {run['run_id']} for {run['period']} ({run['employees']} employees)")
+    elif args.command == 'report' and args.report == 'ytd':
+        if args.emp_id is not None:
+            totals = fetch_year_to_date(args.year, args.emp_id)
+            print(f"Employee {args.emp_id}, {args.year}: {totals['periods']} periods, gross {totals['gross']:.2f}, "
+                  f"deductions {totals['deductions']:.2f}, net {totals['net']:.2f}")
+        else:
+            print(f"{'Department':<30} {'Gross':>16} {'Deductions':>14} {'Net':>16}")
+            for department, totals in fetch_year_to_date(args.year).items():
+                print(f"{department:<30} {totals['gross']:>16.2f} {totals['deductions']:>14.2f} {totals['net']:>16.2f}")
+    elif args.command == 'report' and args.report == 'compare':
+        earlier_period, report = fetch_period_over_period(args.period, args.earlier_period)
+        print(f"{'Department':<30} {earlier_period:>16} {args.period:>16} {'Change':>14}")
+        for department, entry in sorted(report.items()):
+            print(f"{department:<30} {entry['previous']:>16.2f} {entry['current']:>16.2f} {entry['change']:>14.2f}")
+    elif args.command == 'export':
+        export_employees(args.file)
+        print(f"Exported employees to {args.file}")
+    elif args.command == 'disburse':
+        summary = write_disbursement_file(args.file, args.format, args.period, args.batch_size)
+        print(f"Wrote {summary['transfers']} transfers in {summary['batches']} batches to {args.file}, "
+              f"total {summary['amount_paise'] / 100:.2f}, hash total {summary['hash_total']}")
+        if summary['excluded']:
+            print(f"Excluded {summary['excluded']} employees (see {summary['exceptions_path']})")
+        if args.verify:
+            matches, payroll_total = verify_disbursement(summary)
+            print(f"Payroll total {payroll_total:.2f}, file net total {summary['net_total']:.2f}: "
+                  f"{'match' if matches else 'MISMATCH'}")
+            if not matches:
+                sys.exit(1)
+    elif args.command == 'snapshot':
+        try:
+            manifest = export_payroll_snapshot(args.path, args.format)
+        except ImportError:
+            parser.error("--format arrow needs pyarrow")
+        print(f"Exported {manifest['rows']} employees to {args.path} ({manifest['format']})")
+    elif args.command == 'import':
+        summary = import_employees(args.file, args.rejects, args.chunk_size, args.chunks_per_transaction)
+        print(f"Imported {summary['imported']} employees, rejected {summary['rejected']} "
+              f"(see {summary['reject_path']})")
+        print(f"{summary['seconds']:.2f} s, {summary['rows_per_second']:.0f} rows/s")
+    elif args.command == 'timesheets' and args.timesheets == 'import':
+        summary = import_timesheets(args.file, args.rejects, args.batch_size)
+        print(f"Imported {summary['imported']} timesheet entries, rejected {summary['rejected']} "
+              f"(see {summary['reject_path']})")
+        print(f"{summary['seconds']:.2f} s, {summary['rows_per_second']:.0f} rows/s")
+    elif args.command == 'payslips':
+        def report_progress(done, total):
+            if done % 1000 == 0 or done == total:
+                print(f"\r{done}/{total} payslips", end='', file=sys.stderr, flush=True)
+
+        summary = generate_all_payslips(args.output_dir, args.workers, args.zip_path, report_progress)
+        print(file=sys.stderr)
+        print(f"Generated {summary['generated']} payslips, skipped {summary['skipped']} existing, "
+              f"{len(summary['failed'])} failed")
+        print(f"{summary['seconds']:.2f} s, {summary['pages_per_second']:.1f} pages/s")
+        for emp_id, error in summary['failed'].items():
+            print(f"  employee {emp_id}: {error}", file=sys.stderr)
+    elif args.command == 'validate':
+        summary = validate_employees(args.report)
+        print(f"{summary['invalid']} of {summary['employees']} employees have errors ({summary['seconds']:.2f} s)")
+        for field, count in sorted(summary['errors_by_field'].items(), key=lambda item: -item[1]):
+            print(f"  {field:<22} {count}")
+        if summary['invalid']:
+            if args.report:
+                print(f"Details in {args.report}")
+            sys.exit(1)
+    elif args.command == 'bulk-update':
+        action = args.action.replace('-', '_')
+        try:
+            emp_ids = [int(emp_id) for emp_id in args.emp_ids.split(',') if emp_id.strip()] if args.emp_ids else None
+        except ValueError:
+            parser.error(f"--emp-ids must be employee IDs separated by commas, not '{args.emp_ids}'")
+        if not (args.department or args.position or emp_ids or args.all):
+            parser.error("give --department, --position or --emp-ids, or --all to change every employee")
+        try:
+            preview = preview_bulk_update(action, args.value, args.department, args.position, emp_ids)
+            print(f"{preview['rows']} employees match; total {preview['column']} "
+                  f"{preview['current_total']:.2f} -> {preview['new_total']:.2f}")
+            if not args.preview:
+                result = bulk_update_employees(action, args.value, args.department, args.position, emp_ids, args.note)
+                print(f"Updated {result['rows']} employees (audit {result['audit_id']})")
+        except ValueError as e:
+            parser.error(str(e))
+    elif args.command == 'serve':
+        serve_payroll(args.host, args.port, args.workers, args.stand_in)
+    elif args.command == 'rules' and args.rules == 'list':
+        print(f"{'ID':>5} {'Name':<24} {'Kind':<10} {'Method':<17} {'Amount / slabs':<30} Applies to")
+        for rule in fetch_pay_rules():
+            scope = ', '.join(f"{column} {getattr(rule, column)}" for column in ('department', 'position', 'emp_id')
+                              if getattr(rule, column) is not None)
+            print(f"{rule.rule_id:>5} {rule.name:<24} {rule.kind:<10} {rule.method:<17} "
+                  f"{rule.slabs if rule.method == 'slab' else rule.amount:<30} {scope or 'everyone'}")
+    elif args.command == 'rules' and args.rules == 'add':
+        try:
+            rule_id = add_pay_rule(args.name, args.kind, args.method, args.amount, args.slabs,
+                                   args.department, args.position, args.emp_id)
+        except (ValueError, TypeError) as e:
+            parser.error(str(e))
+        print(f"Added pay rule {rule_id}")
+    elif args.command == 'rules' and args.rules == 'remove':
+        if not remove_pay_rule(args.rule_id):
+            parser.error(f"no pay rule {args.rule_id}")
+        print(f"Removed pay rule {args.rule_id}")
+    elif args.command == 'verify-payroll':
+        mismatches = verify_payroll_snapshot()
+        for kind, key, stored, expected in mismatches:
+            print(f"{kind} {key}: stored {stored}, recomputed {expected}")
+        if not mismatches:
+            print("Incremental payroll matches a full recompute.")
+        elif args.repair:
+            rebuild_payroll_snapshot()
+            print(f"Rebuilt the stored payroll ({len(mismatches)} differences).")
+        else:
+            sys.exit(1)
+
 if __name__ == "__main__":
-    main()
+    cli_main()
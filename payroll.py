@@ -0,0 +1,9 @@
+# Command-line entry point for the payroll batch jobs, e.g.
+#   python payroll.py run
+#   python payroll.py export employees.csv
+#   python payroll.py payslips payslips/ --zip payslips.zip
+from final1 import cli_main
+
+
+if __name__ == "__main__":
+    cli_main()